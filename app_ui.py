@@ -6,10 +6,17 @@ from tkinter import filedialog
 import os
 import threading  # ¡Importante para no congelar la UI!
 import webbrowser # Para abrir la presentación en el navegador
+from pathlib import Path
 
 # Importamos nuestras clases de lógica
 from pdf_processor import PDFProcessor
-from slide_generator import SlideGenerator
+from slide_generator import SlideGenerator, MAX_PROMPT_CHARS, MAX_PUNTOS_CLAVE
+from pipeline import build_autoslides_pipeline, PipelineError, PipelineCancelled
+import incremental
+import metrics
+import pptx_writer
+from job_queue import JobQueue, JobCancelled, EN_CURSO, COMPLETADO, ERROR, ESTADOS_FINALES
+from progress_channel import ProgressChannel
 
 # --- Nuestra paleta de colores personalizada ---
 COLOR_PRINCIPAL_OSCURO = "#0B0B0B" # Casi negro para el fondo
@@ -19,6 +26,80 @@ COLOR_TEXTO = "#E0E0E0"
 COLOR_ACENTO_MORADO = "#8E44AD"        # Morado principal
 COLOR_ACENTO_MORADO_HOVER = "#9B59B6" # Morado más claro al pasar el ratón
 
+# Mensajes de la barra de estado al empezar cada etapa del proceso
+MENSAJES_ETAPA = {
+    "extract": "Extrayendo texto del PDF...",
+    "authenticate": "Autenticando con Google...",
+    "create_shell": "Creando presentación...",
+    "generate": "Generando con IA (Gemini)...",
+    "fill": "Añadiendo diapositivas...",
+    "write_pptx": "Guardando archivo .pptx...",
+    "extract_figures": "Extrayendo figuras del PDF...",
+    "record_deck": "Guardando el estado de la presentación...",
+    "update": "Actualizando presentación...",
+}
+
+# Progreso de un trabajo (0..1) al terminar cada etapa
+PROGRESO_ETAPA = {
+    "extract": 0.15,
+    "authenticate": 0.25,
+    "create_shell": 0.35,
+    "generate": 0.9,
+    "fill": 1.0,
+    "write_pptx": 1.0,
+}
+
+# Progreso al empezar cada paso de una actualización incremental
+PROGRESO_ACTUALIZACION = {
+    "extract": 0.05,
+    "generate": 0.25,
+    "update": 0.9,
+}
+
+# Número de PDFs que se procesan a la vez
+MAX_TRABAJOS_SIMULTANEOS = 3
+
+# Cada cuánto se vuelcan en pantalla las actualizaciones de los hilos de
+# trabajo (ver ProgressChannel): entre dos tics solo cuenta la última
+INTERVALO_REFRESCO_MS = 50
+
+# Nombres cortos de las etapas para el desglose de tiempos
+ETIQUETAS_ETAPA = {
+    "extract": "texto",
+    "authenticate": "auth",
+    "create_shell": "crear",
+    "generate": "IA",
+    "fill": "diapositivas",
+    "write_pptx": "pptx",
+    "extract_figures": "figuras",
+    "record_deck": "registro",
+}
+
+
+def formatear_desglose(resumen):
+    """Resume en una línea las métricas de una ejecución (ver metrics.RunMetrics.summary)."""
+    spans, counters = resumen["spans"], resumen["counters"]
+    partes = [
+        f"{etiqueta} {spans[f'stage.{etapa}']['ms'] / 1000:.1f} s"
+        for etapa, etiqueta in ETIQUETAS_ETAPA.items() if f"stage.{etapa}" in spans
+    ]
+    detalles = []
+    if "pdf.pages_extracted" in counters:
+        detalles.append(f"{counters['pdf.pages_extracted']} págs.")
+    categorias = [n.split(".", 2)[2] for n in counters if n.startswith("vertex.tier.")]
+    if categorias:
+        detalles.append(f"modelo {'+'.join(sorted(categorias))}")
+    if "vertex.prompt_chars" in counters:
+        detalles.append(f"{counters['vertex.prompt_chars']} car. al prompt")
+    if "vertex.response_tokens" in counters:
+        detalles.append(f"{counters['vertex.response_tokens']} tokens")
+    if "slides.batch_update" in spans:
+        detalles.append(f"{spans['slides.batch_update']['count']} lotes Slides")
+    if "vertex.retries" in counters:
+        detalles.append(f"{counters['vertex.retries']} reintentos")
+    texto = " · ".join(partes)
+    return f"{texto} ({', '.join(detalles)})" if detalles else texto
+
 # Para que CustomTkinter funcione con TkinterDnD, necesitamos esta clase "envoltorio".
 # Fuente: https://github.com/TomSchimansky/CustomTkinter/wiki/Drag-and-Drop
 class CTkDnD(ctk.CTk, TkinterDnD.DnDWrapper):
@@ -34,9 +115,9 @@ class AppUI(CTkDnD):
 
         # --- Configuración de la Ventana Principal ---
         self.title("AutoSlides")
-        self.geometry("700x500")
+        self.geometry("760x720")
         self.configure(fg_color=COLOR_PRINCIPAL_OSCURO)
-        self.minsize(600, 450)
+        self.minsize(640, 620)
 
         # Hacemos que el frame principal se expanda
         self.grid_rowconfigure(0, weight=1)
@@ -44,11 +125,20 @@ class AppUI(CTkDnD):
 
         # --- Inicialización de Clases de Lógica ---
         # Ahora esto es súper rápido, no se autentica
-        self.pdf_processor = PDFProcessor()
-        self.slide_generator = SlideGenerator()
+        self.pdf_processor = PDFProcessor(cache=PDFProcessor.default_text_cache())
+        self.slide_generator = SlideGenerator(response_cache=SlideGenerator.default_response_cache())
+        # Estado de las presentaciones ya generadas (para actualizarlas)
+        self.deck_store = incremental.DeckStore()
         
-        self.processing_thread = None
-        self.archivo_pdf = None
+        # Cola de trabajos: varios PDFs a la vez, cada uno en su hilo del pool
+        self.job_queue = JobQueue(self.ejecutar_trabajo, workers=MAX_TRABAJOS_SIMULTANEOS,
+                                  on_update=self.on_trabajo_actualizado)
+        self.archivos_pdf = []    # PDFs seleccionados, pendientes de generar
+        self.filas_trabajo = {}   # job.id -> widgets de su fila en la lista
+        self.lote_actual = []     # Trabajos que cuenta la barra de progreso general
+        # Los hilos de trabajo publican aquí; la UI lo vacía en cada tic
+        self.canal_progreso = ProgressChannel()
+        self.tic_pendiente = None
 
         # --- Creación de Widgets ---
         
@@ -66,7 +156,7 @@ class AppUI(CTkDnD):
 
         # 2. Subtítulo
         self.subtitle_label = ctk.CTkLabel(self.main_frame, 
-                                           text="Arrastra un PDF para convertirlo en una presentación",
+                                           text="Arrastra uno o varios PDFs para convertirlos en presentaciones",
                                            font=ctk.CTkFont(size=16),
                                            text_color=COLOR_TEXTO)
         self.subtitle_label.grid(row=1, column=0, pady=(0, 25))
@@ -93,7 +183,7 @@ class AppUI(CTkDnD):
         self.drop_icon.pack()
 
         self.drop_label = ctk.CTkLabel(self.drop_content_frame, 
-                                       text="Arrastra y suelta tu archivo PDF aquí",
+                                       text="Arrastra y suelta tus archivos PDF aquí",
                                        font=ctk.CTkFont(size=14),
                                        text_color=COLOR_TEXTO)
         self.drop_label.pack(pady=5)
@@ -124,7 +214,80 @@ class AppUI(CTkDnD):
             state="disabled", # Deshabilitado hasta que se cargue un PDF
             command=self.iniciar_procesamiento
         )
-        self.generate_button.grid(row=4, column=0, pady=(0, 20), ipady=10, ipadx=20)
+        self.generate_button.grid(row=4, column=0, pady=(0, 10), ipady=10, ipadx=20)
+
+        # 5b. Opción para ignorar la caché de respuestas de la IA
+        self.regenerar_var = ctk.BooleanVar(value=False)
+        self.regenerar_checkbox = ctk.CTkCheckBox(
+            self.main_frame,
+            text="Regenerar con IA (ignorar caché)",
+            font=ctk.CTkFont(size=12),
+            text_color=COLOR_TEXTO,
+            fg_color=COLOR_ACENTO_MORADO,
+            hover_color=COLOR_ACENTO_MORADO_HOVER,
+            variable=self.regenerar_var
+        )
+        self.regenerar_checkbox.grid(row=5, column=0, pady=(0, 10))
+
+        # 5c. Opción para resumir el documento completo (modo map-reduce)
+        self.documento_largo_var = ctk.BooleanVar(value=False)
+        self.documento_largo_checkbox = ctk.CTkCheckBox(
+            self.main_frame,
+            text="Documento largo (resumir completo por partes)",
+            font=ctk.CTkFont(size=12),
+            text_color=COLOR_TEXTO,
+            fg_color=COLOR_ACENTO_MORADO,
+            hover_color=COLOR_ACENTO_MORADO_HOVER,
+            variable=self.documento_largo_var
+        )
+        self.documento_largo_checkbox.grid(row=6, column=0, pady=(0, 10))
+
+        # 5d. Opción para guardar un archivo .pptx local en lugar de usar Google Slides
+        self.pptx_var = ctk.BooleanVar(value=False)
+        self.pptx_checkbox = ctk.CTkCheckBox(
+            self.main_frame,
+            text="Guardar como archivo .pptx (sin Google Slides)",
+            font=ctk.CTkFont(size=12),
+            text_color=COLOR_TEXTO,
+            fg_color=COLOR_ACENTO_MORADO,
+            hover_color=COLOR_ACENTO_MORADO_HOVER,
+            variable=self.pptx_var
+        )
+        self.pptx_checkbox.grid(row=7, column=0, pady=(0, 10))
+
+        # 5e. Opción para actualizar la presentación anterior del mismo PDF
+        self.incremental_var = ctk.BooleanVar(value=False)
+        self.incremental_checkbox = ctk.CTkCheckBox(
+            self.main_frame,
+            text="Actualizar la presentación anterior (solo páginas cambiadas)",
+            font=ctk.CTkFont(size=12),
+            text_color=COLOR_TEXTO,
+            fg_color=COLOR_ACENTO_MORADO,
+            hover_color=COLOR_ACENTO_MORADO_HOVER,
+            variable=self.incremental_var
+        )
+        self.incremental_checkbox.grid(row=8, column=0, pady=(0, 10))
+
+        # 5f. Opción para poner en las diapositivas las figuras del PDF
+        self.figuras_var = ctk.BooleanVar(value=False)
+        self.figuras_checkbox = ctk.CTkCheckBox(
+            self.main_frame,
+            text="Incluir las figuras del PDF (en el archivo .pptx)",
+            font=ctk.CTkFont(size=12),
+            text_color=COLOR_TEXTO,
+            fg_color=COLOR_ACENTO_MORADO,
+            hover_color=COLOR_ACENTO_MORADO_HOVER,
+            variable=self.figuras_var
+        )
+        self.figuras_checkbox.grid(row=9, column=0, pady=(0, 10))
+
+        # 5g. Lista de trabajos (uno por PDF) con su estado y progreso
+        self.jobs_frame = ctk.CTkScrollableFrame(self.main_frame,
+                                                 fg_color=COLOR_PRINCIPAL_OSCURO,
+                                                 label_text="Trabajos",
+                                                 label_text_color=COLOR_TEXTO,
+                                                 height=140)
+        self.jobs_frame.grid(row=10, column=0, sticky="ew")
         
         # 6. Barra de Estado (fuera del main_frame, pegada abajo)
         self.status_bar = ctk.CTkLabel(self, text="  Esperando archivo...", 
@@ -135,6 +298,13 @@ class AppUI(CTkDnD):
                                        anchor="w") # Texto alineado a la izquierda
         self.status_bar.grid(row=1, column=0, sticky="sew")
 
+        # 7. Barra de progreso general (de todos los trabajos en curso)
+        self.barra_progreso = ctk.CTkProgressBar(self, mode="determinate", height=4, corner_radius=0,
+                                                 fg_color=COLOR_SECUNDARIO_OSCURO,
+                                                 progress_color=COLOR_ACENTO_MORADO)
+        self.barra_progreso.set(0)
+        self.barra_progreso.grid(row=2, column=0, sticky="ew")
+
 
         # --- Configuración de Drag and Drop ---
         # Habilitamos la zona de drop para recibir archivos
@@ -144,159 +314,314 @@ class AppUI(CTkDnD):
         self.drop_target_register(DND_FILES) 
         self.dnd_bind('<<Drop>>', self.on_drop)
 
+        # Al cerrar la ventana, cancelar los trabajos pendientes
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Cargar en segundo plano las bibliotecas pesadas una vez que la
+        # ventana ya está visible (así el primer PDF no espera por ellas)
+        self.after(200, lambda: threading.Thread(target=self.precargar_bibliotecas, daemon=True).start())
+
+        # Volcado periódico de las actualizaciones de los hilos de trabajo
+        self.tic_pendiente = self.after(INTERVALO_REFRESCO_MS, self.tic_progreso)
+
     # --- Métodos de la Interfaz ---
 
+    def precargar_bibliotecas(self):
+        """Importa PyMuPDF y las bibliotecas de Google. ¡Se ejecuta en un hilo separado!"""
+        try:
+            import fitz  # noqa: F401
+            import requests  # noqa: F401
+            import googleapiclient.discovery  # noqa: F401
+            import google.auth.transport.requests  # noqa: F401
+        except ImportError as e:
+            print(f"Aviso: no se pudo precargar una dependencia: {e}")
+
     def on_browse_click(self):
         """Maneja el clic en el botón 'Examinar'."""
-        if self.processing_thread and self.processing_thread.is_alive():
-            return # No hacer nada si está procesando
-
-        path = filedialog.askopenfilename(
-            title="Selecciona un archivo PDF",
+        paths = filedialog.askopenfilenames(
+            title="Selecciona uno o varios archivos PDF",
             filetypes=[("Archivos PDF", "*.pdf")]
         )
-        if path:
-            self.manejar_archivo_seleccionado(path)
+        if paths:
+            self.manejar_archivos_seleccionados(list(paths))
 
     def on_drop(self, event):
-        """Maneja el evento de soltar un archivo."""
-        if self.processing_thread and self.processing_thread.is_alive():
-            return # No hacer nada si está procesando
-
+        """Maneja el evento de soltar uno o varios archivos."""
         # El evento.data contiene una lista de rutas de archivos
-        # Nos quedamos solo con el primer archivo que sea un PDF
+        # Nos quedamos con todos los que sean PDF
         try:
-            # Limpiamos las llaves {} que a veces añade Windows
-            archivos = self.tk.splitlist(event.data.replace("{", "").replace("}", ""))
-            pdf_path = None
-            for f in archivos:
-                if f.lower().endswith('.pdf'):
-                    pdf_path = f
-                    break
+            # splitlist separa las rutas y quita las llaves {} que Tk añade
+            # a las que tienen espacios
+            archivos = self.tk.splitlist(event.data)
+            pdf_paths = [f for f in archivos if f.lower().endswith('.pdf')]
             
-            if pdf_path:
-                self.manejar_archivo_seleccionado(pdf_path)
+            if pdf_paths:
+                self.manejar_archivos_seleccionados(pdf_paths)
             else:
-                self.actualizar_estado("Error: El archivo no es un PDF.", error=True)
+                self.actualizar_estado("Error: Ninguno de los archivos es un PDF.", error=True)
         except Exception as e:
             self.actualizar_estado(f"Error al soltar archivo: {e}", error=True)
 
-    def manejar_archivo_seleccionado(self, path):
-        """Actualiza la UI una vez que se selecciona un PDF."""
-        self.archivo_pdf = path
-        filename = os.path.basename(path)
-        self.drop_label.configure(text=f"Archivo: {filename}")
+    def manejar_archivos_seleccionados(self, paths):
+        """Actualiza la UI una vez que se seleccionan uno o varios PDFs."""
+        # Se acumulan con los ya seleccionados (sin repetir)
+        for path in paths:
+            if path not in self.archivos_pdf:
+                self.archivos_pdf.append(path)
+        if len(self.archivos_pdf) == 1:
+            texto = f"Archivo: {os.path.basename(self.archivos_pdf[0])}"
+        else:
+            texto = f"{len(self.archivos_pdf)} archivos seleccionados"
+        self.drop_label.configure(text=texto)
         self.drop_icon.configure(text="✅")
         self.generate_button.configure(state="normal") # Habilitar botón
-        self.actualizar_estado(f"Archivo '{filename}' cargado. Listo para generar.")
+        self.actualizar_estado(f"{texto}. Listo para generar.")
 
     def actualizar_estado(self, mensaje, error=False):
-        """Actualiza el texto y color de la barra de estado."""
-        # Usamos 'after' para asegurarnos de que se actualiza desde el hilo principal
-        def do_update():
-            self.status_bar.configure(text=f"  {mensaje}")
-            if error:
-                self.status_bar.configure(text_color="tomato") # Rojo para errores
-            else:
-                self.status_bar.configure(text_color=COLOR_TEXTO)
-        
-        self.after(0, do_update)
-
-    def bloquear_ui(self, bloqueado=True):
-        """Bloquea o desbloquea los botones durante el procesamiento."""
-        def do_update():
-            estado = "disabled" if bloqueado else "normal"
-            # El botón de generar siempre se deshabilita al procesar
-            self.generate_button.configure(
-                state="disabled", 
-                text="Generando..." if bloqueado else "Generar Presentación"
-            )
-            
-            # El botón de examinar solo se reactiva si NO hay un archivo ya cargado
-            if not bloqueado and not self.archivo_pdf:
-                self.browse_button.configure(state="normal")
-            elif bloqueado:
-                self.browse_button.configure(state="disabled")
-            else:
-                self.browse_button.configure(state="normal")
-        
-        self.after(0, do_update)
+        """Actualiza el texto y color de la barra de estado (se puede llamar desde cualquier hilo)."""
+        # Se publica en el canal: el siguiente tic lo pinta desde el hilo
+        # principal, y si antes llega otro mensaje, solo se ve el último
+        self.canal_progreso.publish("estado", (mensaje, error))
 
+    def pintar_estado(self, mensaje, error):
+        """Pinta la barra de estado. Solo en el hilo principal."""
+        self.status_bar.configure(text=f"  {mensaje}",
+                                  text_color="tomato" if error else COLOR_TEXTO)  # Rojo para errores
+
+    def tic_progreso(self):
+        """
+        Vuelca en pantalla lo publicado en el canal de progreso desde el
+        tic anterior (el último valor de cada clave) y programa el siguiente.
+        """
+        try:
+            for clave, valor in self.canal_progreso.drain():
+                if clave == "estado":
+                    self.pintar_estado(*valor)
+                else:
+                    self.refrescar_fila_trabajo(valor)
+            self.refrescar_progreso_general()
+        finally:
+            # Aunque falle un pintado, los siguientes tics tienen que llegar
+            self.tic_pendiente = self.after(INTERVALO_REFRESCO_MS, self.tic_progreso)
+
+    def refrescar_progreso_general(self):
+        """La barra general es la media del lote actual (los terminados cuentan como completos)."""
+        if not self.lote_actual:
+            return
+        jobs = [self.job_queue.jobs[job_id] for job_id in self.lote_actual]
+        progreso = sum(1.0 if job.state in ESTADOS_FINALES else job.progress for job in jobs) / len(jobs)
+        self.barra_progreso.set(progreso)
 
     def iniciar_procesamiento(self):
-        """Inicia el hilo de procesamiento para no bloquear la UI."""
-        if not self.archivo_pdf:
+        """Añade los PDFs seleccionados a la cola de trabajos."""
+        if not self.archivos_pdf:
             self.actualizar_estado("Error: No hay ningún archivo PDF seleccionado.", error=True)
             return
-        
-        # Bloquear la UI
-        self.bloquear_ui(bloqueado=True)
-
-        # Creamos un hilo para ejecutar el trabajo pesado
-        # Esto evita que la aplicación se "congele"
-        # 'daemon=True' hace que el hilo se cierre si cerramos la app
-        self.processing_thread = threading.Thread(target=self.proceso_completo, daemon=True)
-        self.processing_thread.start()
+        if self.figuras_var.get() and not self.pptx_var.get():
+            # createImage de Slides necesita una URL pública para cada figura
+            self.actualizar_estado("Error: Las figuras solo se pueden incluir guardando como archivo .pptx.",
+                                   error=True)
+            return
 
-    def proceso_completo(self):
+        # Leemos las opciones aquí (hilo principal): Tk no es seguro entre hilos
+        opciones = {
+            "use_cache": not self.regenerar_var.get(),
+            "map_reduce": self.documento_largo_var.get(),
+            "pptx": self.pptx_var.get(),
+            "incremental": self.incremental_var.get(),
+            "figuras": self.figuras_var.get(),
+            # Con un solo PDF se abre la presentación al terminar, como siempre;
+            # con varios, cada fila tiene su botón "Abrir"
+            "abrir_al_terminar": len(self.archivos_pdf) == 1,
+        }
+        # Si ya terminó todo lo anterior, la barra general empieza de cero
+        if all(self.job_queue.jobs[job_id].state in ESTADOS_FINALES for job_id in self.lote_actual):
+            self.lote_actual = []
+        for path in self.archivos_pdf:
+            job = self.job_queue.submit(path, **opciones)
+            self.lote_actual.append(job.id)
+            self.crear_fila_trabajo(job)
+        self.actualizar_estado(f"{len(self.archivos_pdf)} PDF(s) añadidos a la cola.")
+
+        # Resetear la selección para los próximos archivos
+        self.archivos_pdf = []
+        self.drop_label.configure(text="Arrastra y suelta tus archivos PDF aquí")
+        self.drop_icon.configure(text="📄")
+        self.generate_button.configure(state="disabled")
+
+    # --- Lista de trabajos ---
+
+    def crear_fila_trabajo(self, job):
+        """Añade a la lista la fila de un trabajo (nombre, estado, progreso y botón)."""
+        fila = ctk.CTkFrame(self.jobs_frame, fg_color=COLOR_SECUNDARIO_OSCURO)
+        fila.pack(fill="x", pady=2)
+        fila.grid_columnconfigure(0, weight=1)
+
+        nombre = ctk.CTkLabel(fila, text=os.path.basename(job.pdf_path), anchor="w",
+                              font=ctk.CTkFont(size=12), text_color=COLOR_TEXTO)
+        nombre.grid(row=0, column=0, sticky="w", padx=(8, 4))
+        estado = ctk.CTkLabel(fila, text="En cola", width=170, anchor="w",
+                              font=ctk.CTkFont(size=12), text_color=COLOR_TEXTO)
+        estado.grid(row=0, column=1, padx=4)
+        barra = ctk.CTkProgressBar(fila, width=120, progress_color=COLOR_ACENTO_MORADO)
+        barra.set(0)
+        barra.grid(row=0, column=2, padx=4)
+        boton = ctk.CTkButton(fila, text="Cancelar", width=80,
+                              fg_color="transparent", border_width=1,
+                              border_color=COLOR_ACENTO_MORADO, text_color=COLOR_ACENTO_MORADO,
+                              hover_color=COLOR_BORDE,
+                              command=lambda: self.job_queue.cancel(job.id))
+        boton.grid(row=0, column=3, padx=(4, 8), pady=4)
+
+        self.filas_trabajo[job.id] = {"estado": estado, "barra": barra, "boton": boton}
+
+    def on_trabajo_actualizado(self, job):
+        """Lo llama la cola (desde el hilo del trabajo) al cambiar un trabajo."""
+        # La fila lee el estado del Job al pintarse: basta con el último aviso
+        self.canal_progreso.publish(("trabajo", job.id), job)
+
+    def refrescar_fila_trabajo(self, job):
+        """Refleja en su fila el estado actual de un trabajo. Solo en el hilo principal."""
+        fila = self.filas_trabajo.get(job.id)
+        if fila is None:
+            return
+        if job.state == EN_CURSO:
+            texto = MENSAJES_ETAPA.get(job.stage, "En curso...")
+        elif job.state == ERROR:
+            texto = f"Error: {job.error}"
+        else:
+            texto = job.state.capitalize()
+        fila["estado"].configure(text=texto[:40], text_color="tomato" if job.state == ERROR else COLOR_TEXTO)
+        fila["barra"].set(job.progress)
+
+        if job.state == COMPLETADO:
+            fila["boton"].configure(text="Abrir", command=lambda: webbrowser.open(job.result))
+        elif job.state in ESTADOS_FINALES:
+            fila["boton"].configure(state="disabled")
+
+    def on_close(self):
+        """Cancela los trabajos pendientes al cerrar la ventana."""
+        if self.tic_pendiente is not None:
+            self.after_cancel(self.tic_pendiente)
+        self.job_queue.shutdown(cancel_pending=True)
+        stats = self.canal_progreso.stats()
+        print(f"Actualizaciones de progreso: {stats['published']} publicadas, "
+              f"{stats['coalesced']} descartadas por obsoletas.")
+        self.destroy()
+
+    # --- Proceso de conversión (en los hilos de la cola) ---
+
+    def ejecutar_trabajo(self, job):
         """
-        El proceso real de conversión.
-        ¡Se ejecuta en un hilo separado!
+        El proceso real de conversión de un PDF.
+        ¡Se ejecuta en un hilo del pool de la cola de trabajos!
+
+        Devuelve la URL de la presentación (o del archivo .pptx); los
+        errores se lanzan como excepción para que la cola marque el trabajo
+        como fallido.
         """
+        if job.options.get("incremental") and not job.options.get("pptx"):
+            return self.actualizar_presentacion(job)
+
+        def avanzar(progreso, stage=None):
+            # Las etapas paralelas terminan en cualquier orden: la barra nunca retrocede
+            if progreso is not None:
+                progreso = max(job.progress, progreso)
+            self.job_queue.update(job, stage=stage, progress=progreso)
+
+        def on_etapa(etapa, evento, segundos):
+            if evento == "start":
+                self.job_queue.update(job, stage=etapa)
+            elif evento == "end":
+                avanzar(PROGRESO_ETAPA.get(etapa))
+
+        def on_slide(n):
+            # Cada diapositiva añadida (título + puntos clave) avanza la
+            # barra entre el final de 'create_shell' y el de 'fill'
+            inicio, fin = PROGRESO_ETAPA["create_shell"], PROGRESO_ETAPA["fill"]
+            avanzar(inicio + (fin - inicio) * min(n / (MAX_PUNTOS_CLAVE + 1), 1.0), stage="fill")
+
+        # Pasos 1 a 4, con las etapas independientes en paralelo:
+        # Extraer texto || Autenticar (puede abrir un navegador la primera vez);
+        # después, crear la presentación vacía || generar con IA (streaming),
+        # y cada diapositiva se añade en cuanto llega su punto clave
+        # (o, con la opción .pptx, se guarda el archivo junto al PDF al terminar la IA)
+        map_reduce = job.options.get("map_reduce", False)
+        pptx_path = pptx_writer.default_output_path(job.pdf_path) if job.options.get("pptx") else None
+        pipeline = build_autoslides_pipeline(
+            self.pdf_processor, self.slide_generator, job.pdf_path,
+            # En modo map-reduce hace falta el documento completo;
+            # si no, solo extraemos lo que cabe en el prompt de la IA
+            max_chars=None if map_reduce else MAX_PROMPT_CHARS,
+            use_cache=job.options.get("use_cache", True), map_reduce=map_reduce,
+            on_event=on_etapa,
+            on_slide=on_slide,
+            should_cancel=lambda: job.cancelled,
+            pptx_path=pptx_path,
+            figures=job.options.get("figuras", False),
+            # Se guarda el estado de cada presentación de Slides para poder
+            # actualizarla después con la opción incremental
+            deck_store=self.deck_store
+        )
         try:
-            # --- Paso 1: Extraer Texto ---
-            self.actualizar_estado("Paso 1/5: Extrayendo texto del PDF...")
-            texto_pdf = self.pdf_processor.extract_text(self.archivo_pdf)
-            if not texto_pdf or texto_pdf.isspace():
-                self.actualizar_estado("Error: No se pudo extraer texto del PDF. ¿Está vacío o es una imagen?", error=True)
-                self.bloquear_ui(bloqueado=False)
-                return
-
-            # --- Paso 2: Autenticar con Google ---
-            # Esto puede abrir un navegador si es la primera vez
-            self.actualizar_estado("Paso 2/5: Autenticando con Google...")
-            if not self.slide_generator.authenticate():
-                # El error ya se imprimió en la consola
-                self.actualizar_estado(f"Error de autenticación. Revisa la terminal.", error=True)
-                self.bloquear_ui(bloqueado=False)
-                return
-
-            # --- Paso 3: Generar Contenido con IA ---
-            self.actualizar_estado("Paso 3/5: Generando contenido con IA (Gemini)... (Esto puede tardar)")
-            contenido_json = self.slide_generator.get_presentation_content(texto_pdf)
-            if not contenido_json:
-                self.actualizar_estado("Error: La API de IA no devolvió contenido.", error=True)
-                self.bloquear_ui(bloqueado=False)
-                return
-
-            # --- Paso 4: Crear la Presentación ---
-            self.actualizar_estado("Paso 4/5: Creando presentación en Google Slides...")
-            presentacion = self.slide_generator.create_presentation(contenido_json)
-            if not presentacion:
-                self.actualizar_estado("Error: No se pudo crear la presentación en Google Slides.", error=True)
-                self.bloquear_ui(bloqueado=False)
-                return
-            
+            with metrics.run(os.path.basename(job.pdf_path), job=job.id) as run_metrics:
+                resultados = pipeline.run()
+        except PipelineCancelled:
+            raise JobCancelled()
+        except PipelineError as e:
+            # El detalle ya se imprimió en la consola
+            raise RuntimeError(e.error)
+        print(f"Tiempos por etapa (s) de '{job.pdf_path}': {pipeline.timings}")
+
+        if pptx_path:
+            ruta, _ = resultados["write_pptx"]
+            url_presentacion = Path(ruta).as_uri()
+        else:
+            presentacion, _ = resultados["fill"]
             url_presentacion = presentacion.get('presentationUrl')
-            
-            # --- Paso 5: ¡Éxito! ---
-            self.actualizar_estado(f"¡Listo! Abriendo presentación...")
-            print(f"Presentación disponible en: {url_presentacion}")
-            
-            # Abrir el enlace en el navegador
+        print(f"Presentación disponible en: {url_presentacion}")
+        # Desglose de la última ejecución: dónde se fue el tiempo
+        desglose = formatear_desglose(run_metrics.summary())
+        print(f"Métricas de '{job.pdf_path}': {desglose}")
+        self.actualizar_estado(f"¡Listo! {os.path.basename(job.pdf_path)}: {desglose}")
+
+        if job.options.get("abrir_al_terminar"):
+            # Abrir el enlace en el navegador (o el .pptx con su aplicación)
             webbrowser.open(url_presentacion)
+        return url_presentacion
 
-            # Resetear la UI para el próximo archivo
-            self.archivo_pdf = None
-            self.after(0, lambda: self.drop_label.configure(text="Arrastra y suelta tu archivo PDF aquí"))
-            self.after(0, lambda: self.drop_icon.configure(text="📄"))
-            self.bloquear_ui(bloqueado=False)
-            self.after(0, lambda: self.generate_button.configure(state="disabled")) # Deshabilitado
-
-        except Exception as e:
-            # Captura cualquier error inesperado
-            self.actualizar_estado(f"Error en el proceso: {e}", error=True)
-            print(f"Error en proceso_completo: {e}")
-            import traceback
-            traceback.print_exc() # Imprime el error detallado en consola
-            self.bloquear_ui(bloqueado=False)
\ No newline at end of file
+    def actualizar_presentacion(self, job):
+        """
+        Variante incremental de ejecutar_trabajo: si el PDF ya se convirtió
+        antes, solo se procesan las páginas cambiadas y se actualiza la
+        presentación existente (ver incremental.update_deck).
+        """
+        def on_paso(paso):
+            if job.cancelled:
+                raise JobCancelled()
+            self.job_queue.update(job, stage=paso, progress=PROGRESO_ACTUALIZACION.get(paso))
+
+        self.job_queue.update(job, stage="authenticate")
+        if not self.slide_generator.authenticate():
+            raise RuntimeError("Error de autenticación. Revisa la terminal.")
+        with metrics.run(os.path.basename(job.pdf_path), job=job.id) as run_metrics:
+            resultado = incremental.update_deck(
+                job.pdf_path, self.pdf_processor, self.slide_generator, self.deck_store,
+                use_cache=job.options.get("use_cache", True),
+                map_reduce=job.options.get("map_reduce", False), on_stage=on_paso
+            )
+        if not resultado:
+            # El detalle ya se imprimió en la consola
+            raise RuntimeError("No se pudo generar o actualizar la presentación.")
+
+        url_presentacion = resultado["presentation"].get("presentationUrl")
+        if resultado["created"]:
+            resumen = "presentación nueva"
+        else:
+            resumen = f"{resultado['changed_pages']} de {resultado['pages']} páginas cambiadas"
+        print(f"Métricas de '{job.pdf_path}': {formatear_desglose(run_metrics.summary())}")
+        self.actualizar_estado(f"¡Listo! {os.path.basename(job.pdf_path)}: {resumen}")
+
+        if job.options.get("abrir_al_terminar"):
+            webbrowser.open(url_presentacion)
+        return url_presentacion
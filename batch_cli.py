@@ -0,0 +1,338 @@
+"""
+Modo lote (sin interfaz gráfica): convierte muchos PDFs en presentaciones.
+
+Uso:
+    python batch_cli.py carpeta_con_pdfs/ "otros/*.pdf" --workers 4
+
+Se autentica una sola vez y reparte los PDFs entre un pool de hilos. Al
+terminar escribe un manifiesto JSON con, para cada archivo, la URL de la
+presentación, los tiempos de cada etapa y el error (si lo hubo).
+
+Con --pptx CARPETA no se usa Google Slides: cada presentación se guarda
+como archivo .pptx en esa carpeta (y su ruta va en "pptx_path").
+
+Con --incremental, si un PDF ya se convirtió antes, solo se vuelven a
+procesar sus páginas cambiadas y se actualiza la presentación existente
+(ver incremental.update_deck). Con --record-decks se guarda también el
+estado de las presentaciones creadas sin --incremental, para poder
+actualizarlas después (lee otra vez cada PDF entero, así que es opcional).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import incremental
+import metrics
+import pptx_writer
+from pdf_processor import PDFProcessor
+from slide_generator import SlideGenerator, MAX_PROMPT_CHARS
+
+DEFAULT_WORKERS = 4
+DEFAULT_MANIFEST = "autoslides_manifest.json"
+
+
+def collect_pdfs(inputs, recursive=False):
+    """
+    Expande la lista de entradas (carpetas, archivos o patrones glob) en
+    una lista ordenada y sin duplicados de rutas a PDFs.
+    """
+    paths = []
+    for entry in inputs:
+        if os.path.isdir(entry):
+            pattern = os.path.join(entry, "**", "*.pdf") if recursive else os.path.join(entry, "*.pdf")
+            paths.extend(glob.glob(pattern, recursive=recursive))
+        else:
+            paths.extend(glob.glob(entry, recursive=recursive))
+    pdfs = {os.path.abspath(p) for p in paths if p.lower().endswith(".pdf") and os.path.isfile(p)}
+    return sorted(pdfs)
+
+
+def procesar_pdf(pdf_path, pdf_processor, slide_generator, use_cache=True, map_reduce=False, create=True,
+                 pptx_dir=None, deck_store=None, figures=False, update_existing=False):
+    """
+    Ejecuta extracción → generación → creación para un PDF.
+    El SlideGenerator debe estar ya autenticado.
+
+    Con create=False se detiene tras la IA y deja su contenido en
+    resultado["content"], para crear después todas las presentaciones
+    juntas (ver crear_presentaciones_en_lote). Con 'pptx_dir' la
+    presentación se guarda como .pptx en esa carpeta, sin Google Slides.
+    Con 'deck_store' (un incremental.DeckStore) se guarda el estado de
+    cada presentación creada en Slides y, con update_existing=True, la de
+    un PDF ya convertido se actualiza solo con lo que cambió. Con figures=True
+    y 'pptx_dir' se ponen en las diapositivas las figuras del PDF (en
+    Slides no se puede: createImage solo acepta URLs públicas).
+
+    Returns:
+        Un diccionario con el resultado, apto para el manifiesto (con el
+        desglose de métricas de la ejecución en "metrics").
+    """
+    with metrics.run(os.path.basename(pdf_path)) as run_metrics:
+        if update_existing and deck_store is not None:
+            resultado = _actualizar_pdf(pdf_path, pdf_processor, slide_generator, use_cache, map_reduce,
+                                        deck_store)
+        else:
+            resultado = _procesar_pdf(pdf_path, pdf_processor, slide_generator, use_cache, map_reduce, create,
+                                      pptx_dir, figures, deck_store)
+    resultado["metrics"] = run_metrics.summary()
+    return resultado
+
+
+def _procesar_pdf(pdf_path, pdf_processor, slide_generator, use_cache, map_reduce, create, pptx_dir, figures,
+                  deck_store):
+    resultado = {"file": pdf_path, "presentation_url": None, "timings": {}, "error": None}
+    timings = resultado["timings"]
+
+    # --- Paso 1: Extraer Texto ---
+    inicio = time.perf_counter()
+    if map_reduce:
+        texto_pdf = pdf_processor.extract_text(pdf_path, parallel=True)
+    else:
+        texto_pdf = pdf_processor.extract_salient_text(pdf_path, max_chars=MAX_PROMPT_CHARS)
+    timings["extract"] = round(time.perf_counter() - inicio, 3)
+    if not texto_pdf or texto_pdf.isspace():
+        resultado["error"] = "No se pudo extraer texto del PDF."
+        return resultado
+
+    # --- Paso 2: Generar Contenido con IA ---
+    inicio = time.perf_counter()
+    contenido_json = slide_generator.get_presentation_content(
+        texto_pdf, use_cache=use_cache, map_reduce=map_reduce
+    )
+    timings["generate"] = round(time.perf_counter() - inicio, 3)
+    if not contenido_json:
+        resultado["error"] = "La API de IA no devolvió contenido."
+        return resultado
+    if not create:
+        resultado["content"] = contenido_json
+        return resultado
+
+    # --- Paso 3: Crear la Presentación ---
+    figuras = None
+    if figures and pptx_dir:
+        inicio = time.perf_counter()
+        figuras = pdf_processor.extract_figures(pdf_path)
+        timings["figures"] = round(time.perf_counter() - inicio, 3)
+        resultado["figures"] = len(figuras)
+
+    inicio = time.perf_counter()
+    if pptx_dir:
+        resultado["pptx_path"] = pptx_writer.write_presentation(
+            contenido_json, pptx_writer.default_output_path(pdf_path, pptx_dir), figuras
+        )
+        timings["create"] = round(time.perf_counter() - inicio, 3)
+        if not resultado["pptx_path"]:
+            resultado["error"] = "No se pudo guardar el archivo .pptx."
+        return resultado
+
+    presentacion = slide_generator.create_presentation(contenido_json)
+    timings["create"] = round(time.perf_counter() - inicio, 3)
+    if not presentacion:
+        resultado["error"] = "No se pudo crear la presentación en Google Slides."
+        return resultado
+
+    resultado["presentation_url"] = presentacion.get("presentationUrl")
+    if deck_store is not None:
+        _registrar(resultado, pdf_processor, deck_store, presentacion, contenido_json)
+    return resultado
+
+
+def _registrar(resultado, pdf_processor, deck_store, presentacion, contenido_json):
+    """Guarda el estado de una presentación nueva para poder actualizarla después (--incremental)."""
+    inicio = time.perf_counter()
+    if not incremental.record_new_deck(resultado["file"], pdf_processor, deck_store, presentacion, contenido_json):
+        print(f"Aviso: No se guardó el estado de '{resultado['file']}'; no se podrá actualizar.")
+    resultado["timings"]["record"] = round(time.perf_counter() - inicio, 3)
+
+
+def _actualizar_pdf(pdf_path, pdf_processor, slide_generator, use_cache, map_reduce, deck_store):
+    resultado = {"file": pdf_path, "presentation_url": None, "timings": {}, "error": None}
+    inicio = time.perf_counter()
+    actualizado = incremental.update_deck(pdf_path, pdf_processor, slide_generator, deck_store,
+                                          use_cache=use_cache, map_reduce=map_reduce)
+    resultado["timings"]["update"] = round(time.perf_counter() - inicio, 3)
+    if not actualizado:
+        resultado["error"] = "No se pudo generar o actualizar la presentación."
+        return resultado
+
+    resultado["presentation_url"] = actualizado["presentation"].get("presentationUrl")
+    resultado["incremental"] = {
+        "pages": actualizado["pages"],
+        "changed_pages": actualizado["changed_pages"],
+        "requests": actualizado["requests"],
+        "created": actualizado["created"],
+    }
+    return resultado
+
+
+def crear_presentaciones_en_lote(resultados, slide_generator, pdf_processor=None, deck_store=None):
+    """
+    Crea de una vez las presentaciones de todos los resultados que traen
+    contenido (ver procesar_pdf con create=False), agrupando las llamadas
+    a Slides en peticiones HTTP 'batch', y completa cada resultado con su
+    URL o su error. Con 'deck_store' (y 'pdf_processor') se guarda además
+    el estado de cada presentación creada.
+    """
+    pendientes = [r for r in resultados if r.get("content") is not None]
+    if not pendientes:
+        return
+    contenidos = [r.pop("content") for r in pendientes]
+    inicio = time.perf_counter()
+    creadas = slide_generator.create_presentations_batch(contenidos)
+    segundos = round(time.perf_counter() - inicio, 3)
+    for resultado, contenido, (presentacion, error) in zip(pendientes, contenidos, creadas):
+        # Tiempo de la creación conjunta (compartido por todo el lote)
+        resultado["timings"]["create_batch"] = segundos
+        if presentacion:
+            resultado["presentation_url"] = presentacion.get("presentationUrl")
+            if deck_store is not None:
+                _registrar(resultado, pdf_processor, deck_store, presentacion, contenido)
+        resultado["error"] = error
+
+
+def ejecutar_lote(pdfs, workers=DEFAULT_WORKERS, use_cache=True, map_reduce=False,
+                  pdf_processor=None, slide_generator=None, batch_slides=False, pptx_dir=None,
+                  deck_store=None, figures=False, update_existing=False):
+    """
+    Procesa todos los PDFs con un pool de 'workers' hilos, reutilizando un
+    único SlideGenerator autenticado.
+
+    Con batch_slides=True, los hilos solo extraen y generan el contenido;
+    las presentaciones se crean al final todas juntas con peticiones HTTP
+    'batch' a Slides (ver crear_presentaciones_en_lote). Con 'pptx_dir'
+    se guardan archivos .pptx en esa carpeta en lugar de usar Slides. Con
+    'deck_store' se guarda el estado de cada presentación creada y, con
+    update_existing=True, se actualizan las de los PDFs ya convertidos.
+    Con figures=True y 'pptx_dir' se incluyen las figuras de cada PDF (ver procesar_pdf).
+
+    Returns:
+        El manifiesto (diccionario), o None si la autenticación falla.
+    """
+    pdf_processor = pdf_processor or PDFProcessor(cache=PDFProcessor.default_text_cache())
+    slide_generator = slide_generator or SlideGenerator(response_cache=SlideGenerator.default_response_cache())
+
+    inicio_lote = time.perf_counter()
+    inicio = time.perf_counter()
+    if not slide_generator.authenticate():
+        print("Error de autenticación. No se procesará ningún archivo.", file=sys.stderr)
+        return None
+    tiempo_auth = round(time.perf_counter() - inicio, 3)
+
+    # Por posición: un mismo archivo puede aparecer varias veces en la lista
+    resultados = [None] * len(pdfs)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futuros = {
+            pool.submit(procesar_pdf, pdf, pdf_processor, slide_generator, use_cache, map_reduce,
+                        not batch_slides, pptx_dir, deck_store, figures, update_existing): n
+            for n, pdf in enumerate(pdfs)
+        }
+        for i, futuro in enumerate(as_completed(futuros), start=1):
+            n = futuros[futuro]
+            pdf = pdfs[n]
+            try:
+                resultado = futuro.result()
+            except Exception as e:
+                # Un fallo inesperado en un archivo no debe parar el lote
+                resultado = {"file": pdf, "presentation_url": None, "timings": {}, "error": f"Error inesperado: {e}"}
+            resultados[n] = resultado
+            estado = "OK" if not resultado["error"] else f"ERROR: {resultado['error']}"
+            print(f"[{i}/{len(pdfs)}] {os.path.basename(pdf)}: {estado}")
+
+    if batch_slides:
+        crear_presentaciones_en_lote(resultados, slide_generator, pdf_processor, deck_store)
+    return {
+        "total": len(resultados),
+        "succeeded": sum(1 for r in resultados if not r["error"]),
+        "failed": sum(1 for r in resultados if r["error"]),
+        "workers": workers,
+        "batch_slides": batch_slides,
+        "pptx_dir": pptx_dir,
+        "incremental": update_existing,
+        "figures": figures,
+        "authenticate_seconds": tiempo_auth,
+        "wall_seconds": round(time.perf_counter() - inicio_lote, 3),
+        # Límites de ritmo al terminar (p. ej. si se redujeron por 429)
+        "rate_limits": slide_generator.rate_limits(),
+        "results": resultados,
+    }
+
+
+def escribir_manifiesto(manifiesto, path):
+    """Escribe el manifiesto de forma atómica (temporal + rename)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convierte en lote PDFs en presentaciones de Google Slides (sin interfaz gráfica)."
+    )
+    parser.add_argument("inputs", nargs="+", help="Carpetas, archivos PDF o patrones glob.")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Número de PDFs procesados a la vez (por defecto {DEFAULT_WORKERS}).")
+    parser.add_argument("-m", "--manifest", default=DEFAULT_MANIFEST,
+                        help=f"Ruta del manifiesto JSON de resultados (por defecto {DEFAULT_MANIFEST}).")
+    parser.add_argument("-r", "--recursive", action="store_true",
+                        help="Buscar PDFs también en subcarpetas.")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help="Resumir los documentos completos por partes (documentos largos).")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Ignorar la caché de respuestas de la IA.")
+    parser.add_argument("--batch-slides", action="store_true",
+                        help="Crear todas las presentaciones al final, agrupando las llamadas "
+                             "a Slides en peticiones HTTP 'batch'.")
+    parser.add_argument("--pptx", metavar="CARPETA",
+                        help="Guardar archivos .pptx en esta carpeta en lugar de crear "
+                             "presentaciones en Google Slides.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Si un PDF ya se convirtió antes, actualizar su presentación solo "
+                             "con las páginas que cambiaron.")
+    parser.add_argument("--record-decks", action="store_true",
+                        help="Guardar el estado de cada presentación creada para poder actualizarla "
+                             "después con --incremental.")
+    parser.add_argument("--figures", action="store_true",
+                        help="Incluir las figuras del PDF en las diapositivas (con --pptx).")
+    parser.add_argument("--metrics", metavar="ARCHIVO",
+                        help="Añadir las métricas (spans y contadores) a este archivo JSON lines.")
+    args = parser.parse_args(argv)
+    if args.pptx and args.batch_slides:
+        parser.error("--batch-slides no se puede usar junto con --pptx.")
+    if args.incremental and (args.pptx or args.batch_slides):
+        parser.error("--incremental no se puede usar junto con --pptx ni --batch-slides.")
+    if args.record_decks and args.pptx:
+        parser.error("--record-decks solo tiene sentido con Google Slides (sin --pptx).")
+    if args.figures and not args.pptx:
+        # createImage de Slides necesita una URL pública para cada figura
+        parser.error("--figures solo se puede usar junto con --pptx.")
+
+    pdfs = collect_pdfs(args.inputs, recursive=args.recursive)
+    if not pdfs:
+        print("Error: No se encontró ningún PDF en las entradas indicadas.", file=sys.stderr)
+        return 2
+
+    if args.metrics:
+        metrics.add_sink(metrics.JsonLinesSink(args.metrics))
+
+    print(f"Procesando {len(pdfs)} PDFs con {args.workers} hilos...")
+    manifiesto = ejecutar_lote(pdfs, workers=args.workers, use_cache=not args.no_cache,
+                               map_reduce=args.map_reduce, batch_slides=args.batch_slides,
+                               pptx_dir=args.pptx,
+                               deck_store=incremental.DeckStore() if args.incremental or args.record_decks else None,
+                               figures=args.figures, update_existing=args.incremental)
+    if manifiesto is None:
+        return 1
+
+    escribir_manifiesto(manifiesto, args.manifest)
+    print(f"Completados: {manifiesto['succeeded']}/{manifiesto['total']} "
+          f"en {manifiesto['wall_seconds']} s. Manifiesto: {args.manifest}")
+    return 0 if manifiesto["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,536 @@
+"""
+Benchmark del proceso completo de AutoSlides sin conexión.
+
+Genera PDFs sintéticos (distinto número de páginas y densidad de texto) y
+los procesa con PDFProcessor y SlideGenerator contra un servidor local que
+imita a Vertex AI (generateContent / streamGenerateContent) y a Google
+Slides (presentations.create / batchUpdate), con latencia configurable e
+inyección de errores. No hace falta token.json, .env ni conexión.
+
+Para cada escenario (páginas × densidad) mide:
+  - la latencia de cada etapa del pipeline y la total (p50, p90, p99);
+  - el pico de memoria (tracemalloc) durante sus ejecuciones;
+y para el lote completo, el rendimiento (PDFs por segundo) con varios
+hilos, como en batch_cli.
+
+Los resultados se guardan en JSON (con el commit actual) para comparar
+entre versiones; con --baseline se imprime la diferencia de las medianas
+respecto a un resultado anterior.
+
+Uso:
+    python bench_pipeline.py [--pages 1,20,100] [--density baja,alta]
+        [--repeat 5] [--workers 4] [--vertex-latency-ms 800]
+        [--slides-latency-ms 150] [--error-rate 0.05]
+        [--output resultados.json] [--baseline anterior.json]
+"""
+import argparse
+import collections
+import contextlib
+import email
+import io
+import json
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import slide_generator
+from batch_cli import ejecutar_lote
+from pdf_processor import PDFProcessor
+from pipeline import build_autoslides_pipeline, PipelineError
+from slide_generator import SlideGenerator, MAX_PROMPT_CHARS
+
+# Palabras por página de cada densidad de texto
+DENSIDADES = {
+    "baja": 80,
+    "media": 300,
+    "alta": 700,
+}
+
+STAGES = ["extract", "authenticate", "create_shell", "generate", "fill"]
+
+VOCABULARIO = (
+    "análisis datos modelo proceso resultado sistema método estudio red "
+    "energía mercado sector capital inversión riesgo control calidad valor "
+    "diseño prueba medida error tiempo coste empresa cliente producto "
+    "servicio proyecto objetivo estrategia informe tabla figura sección"
+).split()
+
+
+def generar_pdf_sintetico(path, pages, words_per_page, seed=0):
+    """Crea un PDF de 'pages' páginas con 'words_per_page' palabras aleatorias cada una."""
+    import fitz  # PyMuPDF
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for n in range(pages):
+        page = doc.new_page()
+        palabras = [rng.choice(VOCABULARIO) for _ in range(words_per_page)]
+        texto = f"Sección {n + 1}\n" + " ".join(palabras)
+        page.insert_textbox(page.rect + (36, 36, -36, -36), texto, fontsize=8)
+    doc.save(path)
+    doc.close()
+
+
+def percentil(valores, p):
+    """Percentil 'p' (0-100) con interpolación lineal."""
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    k = (len(ordenados) - 1) * p / 100
+    i = int(k)
+    j = min(i + 1, len(ordenados) - 1)
+    return ordenados[i] + (ordenados[j] - ordenados[i]) * (k - i)
+
+
+def resumir(valores):
+    """p50/p90/p99, mínimo y máximo (en milisegundos) de una lista de segundos."""
+    if not valores:
+        return None
+    ms = [v * 1000 for v in valores]
+    return {
+        "n": len(ms),
+        "p50_ms": round(percentil(ms, 50), 2),
+        "p90_ms": round(percentil(ms, 90), 2),
+        "p99_ms": round(percentil(ms, 99), 2),
+        "min_ms": round(min(ms), 2),
+        "max_ms": round(max(ms), 2),
+    }
+
+
+class FakeGoogleServer:
+    """
+    Servidor HTTP local que responde como Vertex AI y Google Slides.
+
+    Cada petición espera la latencia configurada (con un ±20 % aleatorio) y,
+    con probabilidad 'error_rate', falla: Vertex responde 503 con
+    Retry-After (SlideGenerator reintenta) y Slides 500 (la presentación
+    falla, como ocurriría de verdad sin reintentos).
+
+    Con 'vertex_quota_per_minute' / 'slides_quota_per_minute' se emula la
+    cuota de cada API: pasadas esas llamadas en QUOTA_WINDOW segundos, se
+    responde 429 con Retry-After hasta que la ventana deje sitio.
+    """
+
+    # Ventana de la cuota emulada (se puede acortar para pruebas rápidas)
+    QUOTA_WINDOW = 60.0
+
+    def __init__(self, vertex_latency=0.8, slides_latency=0.15, error_rate=0.0,
+                 retry_after=0.05, stream_chunks=8, seed=0,
+                 vertex_quota_per_minute=None, slides_quota_per_minute=None):
+        self.vertex_latency = vertex_latency
+        self.slides_latency = slides_latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stream_chunks = stream_chunks
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._ids = 0
+        self.quotas = {"vertex": vertex_quota_per_minute, "slides": slides_quota_per_minute}
+        self._calls = {"vertex": collections.deque(), "slides": collections.deque()}
+        self.stats = {"vertex": 0, "vertex_stream": 0, "slides_create": 0, "slides_batch": 0,
+                      "slides_batch_requests": 0, "http_batch": 0, "injected_errors": 0,
+                      "throttled_429": 0, "models": {}}
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como las APIs reales
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (ConnectionResetError, BrokenPipeError):
+                    pass  # El cliente cerró la conexión (p. ej. al cancelar)
+
+            def do_POST(self):
+                servidor._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _sleep(self, latency):
+        time.sleep(latency * (0.8 + 0.4 * self._random()))
+
+    def _quota_exceeded(self, api):
+        """
+        Registra una llamada a 'api' si cabe en su cuota. Si no cabe,
+        devuelve los segundos hasta que la ventana deje sitio (Retry-After).
+        """
+        cuota = self.quotas[api]
+        if not cuota:
+            return None
+        with self._lock:
+            ahora = time.monotonic()
+            llamadas = self._calls[api]
+            while llamadas and ahora - llamadas[0] >= self.QUOTA_WINDOW:
+                llamadas.popleft()
+            if len(llamadas) < cuota:
+                llamadas.append(ahora)
+                return None
+            self.stats["throttled_429"] += 1
+            return max(0.001, self.QUOTA_WINDOW - (ahora - llamadas[0]))
+
+    @staticmethod
+    def _error_429(retry_after):
+        cabeceras = {"Retry-After": f"{retry_after:.3f}"}
+        return 429, {"error": {"code": 429, "message": "Cuota simulada agotada",
+                               "status": "RESOURCE_EXHAUSTED"}}, cabeceras
+
+    def _handle(self, handler):
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw = handler.rfile.read(length)
+        path = handler.path.split("?", 1)[0]
+        if path == "/batch":
+            return self._handle_batch(handler, raw)
+        body = json.loads(raw or b"{}")
+
+        if path.endswith(":generateContent") or path.endswith(":streamGenerateContent"):
+            stream = path.endswith(":streamGenerateContent")
+            self._count("vertex_stream" if stream else "vertex")
+            modelo = path.rsplit("/models/", 1)[-1].split(":", 1)[0]
+            with self._lock:
+                self.stats["models"][modelo] = self.stats["models"].get(modelo, 0) + 1
+            espera = self._quota_exceeded("vertex")
+            if espera is not None:
+                return self._send_json(handler, *self._error_429(espera))
+            if self._random() < self.error_rate:
+                self._count("injected_errors")
+                self._sleep(self.vertex_latency / 10)
+                return self._send_json(handler, 503, {"error": {"code": 503, "message": "Simulado"}},
+                                       {"Retry-After": str(self.retry_after)})
+            texto = self._respuesta_ia(body)
+            if stream:
+                return self._send_stream(handler, body, texto)
+            self._sleep(self.vertex_latency)
+            return self._send_json(handler, 200, {"candidates": [{"content": {"parts": [{"text": texto}]}}],
+                                                  "usageMetadata": self._uso(body, texto)})
+
+        self._sleep(self.slides_latency)
+        self._send_json(handler, *self._slides(path, body))
+
+    def _slides(self, path, body):
+        """Responde a una llamada a la API de Slides. Devuelve (estado, JSON, cabeceras)."""
+        espera = self._quota_exceeded("slides")
+        if espera is not None:
+            return self._error_429(espera)
+        status, data = self._slides_call(path, body)
+        return status, data, {}
+
+    def _slides_call(self, path, body):
+        if self._random() < self.error_rate:
+            self._count("injected_errors")
+            return 500, {"error": {"code": 500, "message": "Simulado"}}
+
+        if path.rstrip("/").endswith("/v1/presentations"):
+            self._count("slides_create")
+            with self._lock:
+                self._ids += 1
+                presentation_id = f"bench-{self._ids}"
+            return 200, {
+                "presentationId": presentation_id,
+                "presentationUrl": f"{self.url}/presentation/d/{presentation_id}/edit",
+                "title": body.get("title"),
+            }
+
+        if re.search(r"/v1/presentations/[^/]+:batchUpdate$", path):
+            peticiones = body.get("requests", [])
+            self._count("slides_batch")
+            self._count("slides_batch_requests", len(peticiones))
+            return 200, {"replies": [{} for _ in peticiones]}
+
+        return 404, {"error": {"code": 404, "message": f"Ruta desconocida: {path}"}}
+
+    def _handle_batch(self, handler, raw):
+        """
+        Petición HTTP 'batch' de Google (multipart/mixed con una llamada
+        por parte): responde todas las llamadas con una sola latencia.
+        """
+        self._count("http_batch")
+        mensaje = email.message_from_bytes(
+            b"Content-Type: " + handler.headers["Content-Type"].encode() + b"\r\n\r\n" + raw
+        )
+        boundary = "batch_bench"
+        partes = []
+        for parte in mensaje.get_payload():
+            peticion = parte.get_payload()
+            cabecera, _, cuerpo = peticion.replace("\r\n", "\n").partition("\n\n")
+            path = cabecera.split()[1].split("?", 1)[0]
+            status, data, cabeceras = self._slides(path, json.loads(cuerpo or "{}"))
+            content_id = parte["Content-ID"].strip("<>")
+            extra = "".join(f"{nombre}: {valor}\r\n" for nombre, valor in cabeceras.items())
+            partes.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json\r\n{extra}\r\n{json.dumps(data)}\r\n"
+            )
+        self._sleep(self.slides_latency)
+        payload = ("".join(partes) + f"--{boundary}--\r\n").encode("utf-8")
+        handler.send_response(200)
+        handler.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _respuesta_ia(self, body):
+        """Texto que devolvería Gemini: JSON de diapositivas o resumen en texto plano."""
+        config = body.get("generationConfig", {})
+        if config.get("responseMimeType") != "application/json":
+            return "Resumen sintético del bloque. " * 20
+        puntos = [
+            {"titulo_diapositiva": f"Punto clave {n}",
+             "contenido_diapositiva": "Contenido sintético de la diapositiva. " * 4}
+            for n in range(1, 6)
+        ]
+        return json.dumps({"titulo_presentacion": "Presentación de prueba", "puntos_clave": puntos},
+                          ensure_ascii=False)
+
+    def _uso(self, body, texto):
+        """'usageMetadata' aproximado (~4 caracteres por token), como el de Vertex AI."""
+        prompt = body.get("contents", [{}])[0].get("parts", [{}])[0].get("text", "")
+        return {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(texto) // 4}
+
+    def _send_json(self, handler, status, data, headers=None):
+        payload = json.dumps(data).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for nombre, valor in (headers or {}).items():
+            handler.send_header(nombre, valor)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _send_stream(self, handler, body, texto):
+        """Envía 'texto' como Server-Sent Events, repartiendo la latencia entre los trozos."""
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        trozo = -(-len(texto) // self.stream_chunks)
+        for i in range(0, len(texto), trozo):
+            self._sleep(self.vertex_latency / self.stream_chunks)
+            evento = {"candidates": [{"content": {"parts": [{"text": texto[i:i + trozo]}]}}],
+                      "usageMetadata": self._uso(body, texto[:i + trozo])}
+            handler.wfile.write(f"data: {json.dumps(evento)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+        handler.close_connection = True
+
+
+def crear_slide_generator(server_url, slides_rpm=None, vertex_rpm=None):
+    """
+    SlideGenerator ya 'autenticado' que habla con el servidor falso: token
+    sin caducidad, servicio de Slides apuntando a server_url y endpoints de
+    Vertex AI redirigidos. Sin caché de respuestas, para medir cada llamada.
+    Por defecto sin cuotas (el servidor falso no las tiene salvo que se
+    le indiquen).
+    """
+    from google.oauth2.credentials import Credentials
+    from googleapiclient.discovery import build_from_document
+
+    slide_generator.TU_PROJECT_ID = "benchmark"
+    slide_generator.VERTEX_MODELS_URL = f"{server_url}/v1/projects/benchmark/locations/global/publishers/google/models"
+
+    generador = SlideGenerator(response_cache=None, slides_rpm=slides_rpm, vertex_rpm=vertex_rpm)
+    generador.creds = Credentials(token="benchmark")
+    # rootUrl también determina la URL de las peticiones 'batch'
+    documento = dict(slide_generator.load_slides_discovery_document(), rootUrl=f"{server_url}/")
+    generador.slides_service = build_from_document(
+        documento,
+        credentials=generador.creds,
+        client_options={"api_endpoint": f"{server_url}/"},
+    )
+    return generador
+
+
+def medir_escenario(pdf_path, repeat, pdf_processor, generador, map_reduce=False):
+    """Ejecuta el pipeline 'repeat' veces sobre un PDF y devuelve sus métricas."""
+    muestras = {stage: [] for stage in STAGES + ["total"]}
+    fallos = []
+    tracemalloc.start()
+    for _ in range(repeat):
+        pipeline = build_autoslides_pipeline(
+            pdf_processor, generador, pdf_path,
+            max_chars=None if map_reduce else MAX_PROMPT_CHARS, map_reduce=map_reduce
+        )
+        inicio = time.perf_counter()
+        try:
+            pipeline.run()
+        except PipelineError as e:
+            fallos.append(str(e))
+            continue
+        muestras["total"].append(time.perf_counter() - inicio)
+        for stage, t in pipeline.timings.items():
+            muestras[stage].append(t["end"] - t["start"])
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "stages": {stage: resumir(valores) for stage, valores in muestras.items()},
+        "failures": len(fallos),
+        "errors": sorted(set(fallos)),
+        "peak_traced_mib": round(pico / 2 ** 20, 2),
+    }
+
+
+def comparar(resultados, baseline):
+    """Imprime la variación de las medianas respecto a un resultado anterior."""
+    print(f"\nComparación con {baseline.get('commit') or 'la referencia'} (p50):")
+    for nombre, escenario in resultados["scenarios"].items():
+        anterior = baseline.get("scenarios", {}).get(nombre)
+        if not anterior:
+            continue
+        for stage, actual in escenario["stages"].items():
+            previo = (anterior["stages"].get(stage) or {}).get("p50_ms")
+            if actual and previo:
+                cambio = (actual["p50_ms"] - previo) / previo * 100
+                print(f"  {nombre:<14} {stage:<13} {previo:>9.1f} → {actual['p50_ms']:>9.1f} ms ({cambio:+.1f} %)")
+    previo = baseline.get("throughput", {}).get("pdfs_per_second")
+    if previo:
+        actual = resultados["throughput"]["pdfs_per_second"]
+        print(f"  rendimiento del lote {previo:.2f} → {actual:.2f} PDFs/s ({(actual - previo) / previo * 100:+.1f} %)")
+
+
+def commit_actual():
+    """Hash del commit actual, o None si no estamos en un repositorio git."""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark sin conexión del proceso PDF → presentación.")
+    parser.add_argument("--pages", default="1,20,100", help="Páginas de los PDFs sintéticos (por defecto 1,20,100).")
+    parser.add_argument("--density", default="baja,alta",
+                        help=f"Densidades de texto: {', '.join(DENSIDADES)} (por defecto baja,alta).")
+    parser.add_argument("--repeat", type=int, default=5, help="Ejecuciones por escenario (por defecto 5).")
+    parser.add_argument("--workers", type=int, default=4, help="Hilos para la medida de rendimiento del lote.")
+    parser.add_argument("--vertex-latency-ms", type=float, default=800, help="Latencia simulada de Vertex AI.")
+    parser.add_argument("--slides-latency-ms", type=float, default=150, help="Latencia simulada de Slides.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de error por petición (0-1).")
+    parser.add_argument("--map-reduce", action="store_true", help="Usar el modo map-reduce (documentos largos).")
+    parser.add_argument("--batch-slides", action="store_true",
+                        help="En el lote, crear las presentaciones con peticiones HTTP 'batch'.")
+    parser.add_argument("--vertex-quota", type=int,
+                        help="Cuota emulada de Vertex AI (peticiones/min); al pasarla responde 429.")
+    parser.add_argument("--slides-quota", type=int,
+                        help="Cuota emulada de Slides (llamadas/min); al pasarla responde 429.")
+    parser.add_argument("--vertex-rpm", type=int, help="Límite de ritmo del cliente para Vertex AI.")
+    parser.add_argument("--slides-rpm", type=int, help="Límite de ritmo del cliente para Slides.")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de los PDFs y de los errores simulados.")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados.")
+    parser.add_argument("--baseline", help="Resultado anterior (JSON) con el que comparar.")
+    parser.add_argument("--verbose", action="store_true", help="Mostrar la salida de AutoSlides.")
+    args = parser.parse_args(argv)
+
+    paginas = [int(p) for p in args.pages.split(",")]
+    densidades = args.density.split(",")
+    for d in densidades:
+        if d not in DENSIDADES:
+            parser.error(f"Densidad desconocida: {d}")
+
+    server = FakeGoogleServer(args.vertex_latency_ms / 1000, args.slides_latency_ms / 1000,
+                              args.error_rate, seed=args.seed,
+                              vertex_quota_per_minute=args.vertex_quota,
+                              slides_quota_per_minute=args.slides_quota)
+    server_url = server.start()
+    resultados = {
+        "commit": commit_actual(),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "verbose")},
+        "scenarios": {},
+    }
+
+    salida = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with tempfile.TemporaryDirectory(prefix="autoslides_bench_") as tmp:
+        pdfs = []
+        for pages in paginas:
+            for densidad in densidades:
+                nombre = f"{pages}p-{densidad}"
+                path = os.path.join(tmp, f"{nombre}.pdf")
+                generar_pdf_sintetico(path, pages, DENSIDADES[densidad], seed=args.seed)
+                pdfs.append((nombre, path))
+
+        pdf_processor = PDFProcessor()  # Sin caché de texto: se mide cada extracción
+        generador = crear_slide_generator(server_url, slides_rpm=args.slides_rpm, vertex_rpm=args.vertex_rpm)
+        try:
+            for nombre, path in pdfs:
+                with salida:
+                    escenario = medir_escenario(path, args.repeat, pdf_processor, generador, args.map_reduce)
+                escenario["file_bytes"] = os.path.getsize(path)
+                resultados["scenarios"][nombre] = escenario
+                total = escenario["stages"]["total"]
+                p50 = f"{total['p50_ms']:.1f} ms" if total else "-"
+                print(f"{nombre:<14} total p50 {p50:>11}  pico {escenario['peak_traced_mib']:>7.2f} MiB"
+                      f"  fallos {escenario['failures']}/{args.repeat}")
+
+            lote = [path for _, path in pdfs] * args.repeat
+            with salida:
+                manifiesto = ejecutar_lote(lote, workers=args.workers, map_reduce=args.map_reduce,
+                                           pdf_processor=pdf_processor, slide_generator=generador,
+                                           batch_slides=args.batch_slides)
+        finally:
+            server.stop()
+
+    resultados["throughput"] = {
+        "pdfs": manifiesto["total"],
+        "succeeded": manifiesto["succeeded"],
+        "workers": args.workers,
+        "wall_seconds": manifiesto["wall_seconds"],
+        "pdfs_per_second": round(manifiesto["total"] / manifiesto["wall_seconds"], 3),
+    }
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    resultados["peak_rss_mib"] = round(maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 2)
+    resultados["server"] = server.stats
+    resultados["rate_limits"] = generador.rate_limits()
+    print(f"Lote: {manifiesto['total']} PDFs con {args.workers} hilos en {manifiesto['wall_seconds']:.2f} s"
+          f" ({resultados['throughput']['pdfs_per_second']:.2f} PDFs/s)")
+    print(f"Memoria máxima del proceso: {resultados['peak_rss_mib']:.1f} MiB")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparar(resultados, json.load(f))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark de arranque de AutoSlides.
+
+Mide, cada vez en un intérprete nuevo (para que no influyan los módulos ya
+cargados):
+  - el tiempo de importar los módulos de lógica que carga app_ui
+    (pdf_processor, slide_generator, pipeline) y qué bibliotecas pesadas
+    arrastran consigo;
+  - el tiempo de importar cada biblioteca pesada por separado (lo que
+    ahora se paga en el primer uso, no al abrir la ventana);
+  - el tiempo de construir el servicio de Slides con build() frente a
+    hacerlo desde el documento de descubrimiento en caché.
+
+Uso:
+    python bench_startup.py [--repeat 5] [--output resultados.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = [
+    "fitz",
+    "requests",
+    "googleapiclient.discovery",
+    "google_auth_oauthlib.flow",
+    "google.auth.transport.requests",
+]
+
+IMPORT_SNIPPET = """
+import json, sys, time
+t = time.perf_counter()
+import {modules}
+ms = (time.perf_counter() - t) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"ms": ms, "heavy_loaded": heavy}}))
+"""
+
+BUILD_SNIPPET = """
+import json, time
+from googleapiclient.discovery import build, build_from_document
+import slide_generator
+t = time.perf_counter()
+build("slides", "v1", developerKey="benchmark", cache_discovery=False)
+build_ms = (time.perf_counter() - t) * 1000
+slide_generator.load_slides_discovery_document()  # Asegura la caché en disco
+slide_generator._slides_discovery_doc = None       # Fuerza la lectura desde disco
+t = time.perf_counter()
+build_from_document(slide_generator.load_slides_discovery_document(), developerKey="benchmark")
+cached_ms = (time.perf_counter() - t) * 1000
+print(json.dumps({"build_ms": build_ms, "cached_build_ms": cached_ms}))
+"""
+
+
+def run_snippet(code):
+    """Ejecuta 'code' en un intérprete nuevo y devuelve el JSON que imprime."""
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    return {
+        "median_ms": round(statistics.median(values), 2),
+        "min_ms": round(min(values), 2),
+        "max_ms": round(max(values), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de AutoSlides.")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medida (por defecto 5).")
+    parser.add_argument("--output", help="Archivo JSON donde guardar los resultados.")
+    args = parser.parse_args(argv)
+
+    resultados = {"python": sys.version.split()[0], "repeat": args.repeat, "imports": {}}
+
+    medidas = [
+        ("app_logic", "pdf_processor, slide_generator, pipeline"),
+    ] + [(m, m) for m in HEAVY_MODULES]
+    for nombre, modulos in medidas:
+        tiempos = []
+        cargados = []
+        for _ in range(args.repeat):
+            r = run_snippet(IMPORT_SNIPPET.format(modules=modulos, heavy=HEAVY_MODULES))
+            tiempos.append(r["ms"])
+            cargados = r["heavy_loaded"]
+        resultados["imports"][nombre] = dict(summarize(tiempos), heavy_loaded=cargados)
+        print(f"import {nombre:<32} {resultados['imports'][nombre]['median_ms']:>8.1f} ms")
+
+    build_ms, cached_ms = [], []
+    for _ in range(args.repeat):
+        r = run_snippet(BUILD_SNIPPET)
+        build_ms.append(r["build_ms"])
+        cached_ms.append(r["cached_build_ms"])
+    resultados["slides_service"] = {"build": summarize(build_ms), "cached_document": summarize(cached_ms)}
+    print(f"build('slides', 'v1')                   {resultados['slides_service']['build']['median_ms']:>8.1f} ms")
+    print(f"build_from_document (caché)             {resultados['slides_service']['cached_document']['median_ms']:>8.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
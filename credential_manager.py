@@ -0,0 +1,131 @@
+import datetime
+import os
+import sys
+import tempfile
+import threading
+
+# Margen con el que se refresca el token antes de que caduque
+REFRESH_MARGIN_SECONDS = 5 * 60
+# Espera antes de reintentar si un refresco en segundo plano falla
+REFRESH_RETRY_SECONDS = 30
+# Cada cuánto se revisa si las credenciales no indican caducidad
+REFRESH_POLL_SECONDS = 5 * 60
+
+
+def save_token(creds, token_file):
+    """
+    Guarda las credenciales en 'token_file' de forma atómica (archivo
+    temporal en la misma carpeta + rename), para que un corte a mitad de
+    escritura nunca deje un token.json corrupto.
+    """
+    directory = os.path.dirname(os.path.abspath(token_file))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as token:
+            token.write(creds.to_json())
+        os.replace(tmp_path, token_file)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CredentialManager:
+    """
+    Mantiene vigentes unas credenciales OAuth en procesos de larga duración.
+
+    Un hilo en segundo plano refresca el token REFRESH_MARGIN_SECONDS antes
+    de que caduque, así que los hilos que piden cabeceras con headers()
+    casi nunca esperan. Solo si el token ya ha caducado (p. ej. falló el
+    refresco en segundo plano) se refresca de forma síncrona. Los refrescos
+    van protegidos por un cerrojo: si varios hilos lo necesitan a la vez,
+    solo uno llama a Google y el resto reutiliza el resultado.
+    """
+
+    def __init__(self, creds, token_file=None, refresh_margin=REFRESH_MARGIN_SECONDS):
+        self.creds = creds
+        self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._headers = self._build_headers()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Arranca el hilo de refresco en segundo plano (si no está ya en marcha)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="credential-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el hilo de refresco."""
+        self._stop_event.set()
+
+    def headers(self):
+        """Devuelve las cabeceras HTTP con el token vigente."""
+        restante = self._seconds_to_expiry()
+        if restante is not None and restante <= 0:
+            self.refresh()
+        return self._headers
+
+    def refresh(self, force=False):
+        """
+        Refresca el token si está dentro del margen de caducidad (o siempre,
+        con force=True). Devuelve True si las credenciales quedan vigentes.
+        """
+        with self._lock:
+            # Otro hilo puede haberlo refrescado mientras esperábamos el cerrojo
+            restante = self._seconds_to_expiry()
+            if not force and restante is not None and restante > self.refresh_margin:
+                return True
+            if not self.creds.refresh_token:
+                print("Error: Las credenciales no tienen refresh_token; no se pueden renovar.", file=sys.stderr)
+                return False
+            try:
+                # Importación diferida: google.auth tarda en cargarse
+                from google.auth.transport.requests import Request
+                print("Refrescando token de acceso...")
+                self.creds.refresh(Request())
+            except Exception as e:
+                print(f"Error al refrescar el token: {e}", file=sys.stderr)
+                return False
+
+            self._headers = self._build_headers()
+            if self.token_file:
+                try:
+                    save_token(self.creds, self.token_file)
+                except Exception as e:
+                    print(f"Aviso: no se pudo guardar {self.token_file}: {e}", file=sys.stderr)
+            return True
+
+    def _run(self):
+        """Bucle del hilo de refresco: duerme hasta el margen y refresca."""
+        while not self._stop_event.is_set():
+            restante = self._seconds_to_expiry()
+            if restante is None:
+                espera = REFRESH_POLL_SECONDS
+            else:
+                espera = max(0.0, restante - self.refresh_margin)
+            if espera > 0 and self._stop_event.wait(espera):
+                break
+            if restante is not None and not self.refresh():
+                # No saturar a Google si el refresco falla: reintentar más tarde
+                if self._stop_event.wait(REFRESH_RETRY_SECONDS):
+                    break
+
+    def _seconds_to_expiry(self):
+        """Segundos hasta que caduca el token, o None si no se conoce."""
+        expiry = self.creds.expiry
+        if expiry is None:
+            return None
+        # google-auth guarda 'expiry' como datetime UTC sin zona horaria
+        ahora = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return (expiry - ahora).total_seconds()
+
+    def _build_headers(self):
+        return {
+            "Authorization": f"Bearer {self.creds.token}",
+            "Content-Type": "application/json"
+        }
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+# Carpeta base donde se guardan las cachés persistentes de la aplicación
+CACHE_ROOT = ".autoslides_cache"
+
+
+def file_hash(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Calcula el SHA-256 del contenido de un archivo, leyéndolo por bloques
+    para no cargarlo entero en memoria.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """
+    Construye una clave estable a partir de cualquier combinación de valores
+    serializables en JSON (los diccionarios se ordenan por clave).
+    """
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Caché clave → texto guardada en disco, un archivo comprimido con zlib
+    por entrada. Tiene un tamaño máximo y, al superarlo, borra las entradas
+    usadas hace más tiempo (LRU, usando la fecha de modificación del
+    archivo como marca de último uso). Opcionalmente, las entradas caducan
+    'ttl' segundos después de haberse escrito.
+
+    Cualquier fallo de la caché se imprime y se trata como un 'miss':
+    nunca debe romper el proceso que la usa.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int, ttl: float = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def get(self, key: str):
+        """Devuelve el texto guardado para 'key', o None si no está o ha caducado."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                # Cada entrada es "<timestamp de creación>\n<texto>"
+                created, data = zlib.decompress(f.read()).decode("utf-8").split("\n", 1)
+            if self.ttl is not None and time.time() - float(created) > self.ttl:
+                self.delete(key)
+                return None
+            os.utime(path)  # Marcar como usado recientemente
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Aviso: entrada de caché ilegible en '{path}': {e}", file=sys.stderr)
+            return None
+
+    def put(self, key: str, text: str):
+        """Guarda 'text' bajo 'key' y aplica el límite de tamaño."""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            data = zlib.compress(f"{time.time()}\n{text}".encode("utf-8"), 6)
+            # Escritura atómica: archivo temporal + rename
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            self._evict()
+        except Exception as e:
+            print(f"Aviso: no se pudo escribir en la caché '{self.cache_dir}': {e}", file=sys.stderr)
+
+    def delete(self, key: str):
+        """Elimina la entrada 'key' si existe."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.z")
+
+    def _evict(self):
+        """Borra las entradas menos usadas hasta quedar por debajo de max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".z"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()  # Las más antiguas primero
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
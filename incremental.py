@@ -0,0 +1,281 @@
+"""
+Regeneración incremental de una presentación cuando su PDF cambia.
+
+Con cada presentación generada se guarda (en DeckStore) la huella de cada
+página del PDF, el texto extraído de cada página, los resúmenes por
+secciones (modo map-reduce) y el contenido de la IA. Al volver a
+procesar el PDF:
+
+- Si ninguna huella cambió, no se hace nada.
+- Solo se vuelven a extraer las páginas cambiadas (el resto se toma de
+  lo guardado) y, en modo map-reduce, solo se vuelven a resumir las
+  secciones que contienen alguna de ellas.
+- La presentación existente se actualiza en su sitio con las peticiones
+  mínimas de batchUpdate (ver SlideGenerator.deck_diff_requests), en
+  lugar de crear otra nueva.
+
+El registro lo guarda update_deck y también record_new_deck, que usan los
+procesos normales (sin modo incremental) cuando se les pide (la interfaz
+siempre; batch_cli y server.py con --record-decks) después de crear la
+presentación en Google Slides, para poder actualizarla más tarde. Esos
+registros no tienen resúmenes por secciones: la primera actualización en
+modo map-reduce las resume todas.
+"""
+import json
+import os
+
+import metrics
+from disk_cache import CACHE_ROOT, DiskCache, make_key
+from pdf_processor import EXTRACTOR_VERSION, SALIENCE_MAX_PAGES, select_text, split_passages
+from slide_generator import MAX_MAP_CHUNKS, MAX_PROMPT_CHARS
+
+# Estado guardado de cada presentación (sin caducidad: si se pierde, la
+# siguiente ejecución simplemente genera una presentación nueva).
+# Incrementar DECK_STATE_VERSION si cambia el formato del registro.
+DECK_STATE_DIR = os.path.join(CACHE_ROOT, "decks")
+DECK_STATE_MAX_BYTES = 200 * 1024 * 1024
+DECK_STATE_VERSION = 1
+
+# Páginas por sección en modo map-reduce (como mínimo; en documentos muy
+# largos se agrupan más para no pasar de MAX_MAP_CHUNKS secciones). El
+# tamaño se guarda con el registro y se mantiene entre versiones del PDF
+# para que las secciones sin cambios conserven su resumen.
+SECTION_PAGES = 8
+
+
+class DeckStore:
+    """Registros de las presentaciones generadas, por PDF (o por la clave que se indique)."""
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = cache or DiskCache(DECK_STATE_DIR, DECK_STATE_MAX_BYTES)
+
+    def get(self, deck_key):
+        """El registro guardado para 'deck_key', o None si no hay uno válido."""
+        data = self.cache.get(self._key(deck_key))
+        if data is None:
+            return None
+        try:
+            record = json.loads(data)
+        except json.JSONDecodeError:
+            return None
+        if record.get("version") != DECK_STATE_VERSION or record.get("extractor") != EXTRACTOR_VERSION:
+            return None
+        return record
+
+    def put(self, deck_key, record):
+        record = dict(record, version=DECK_STATE_VERSION, extractor=EXTRACTOR_VERSION)
+        self.cache.put(self._key(deck_key), json.dumps(record, ensure_ascii=False))
+
+    def delete(self, deck_key):
+        self.cache.delete(self._key(deck_key))
+
+    @staticmethod
+    def _key(deck_key):
+        return make_key("deck", deck_key)
+
+
+def section_pages(page_count):
+    """Páginas por sección para un documento de 'page_count' páginas."""
+    return max(SECTION_PAGES, -(-page_count // MAX_MAP_CHUNKS))
+
+
+def changed_pages(old_fingerprints, new_fingerprints):
+    """Índices de las páginas nuevas o cuya huella cambió."""
+    return [
+        i for i, huella in enumerate(new_fingerprints)
+        if i >= len(old_fingerprints) or old_fingerprints[i] != huella
+    ]
+
+
+def read_deck_pages(pdf_path, pdf_processor):
+    """
+    La parte del registro que sale del PDF: huellas, encabezados/pies
+    descartados y bloques de texto de cada página. Devuelve None (con el
+    detalle en la consola) si no se puede leer.
+    """
+    try:
+        huellas, boilerplate, bloques = pdf_processor.read_page_states(pdf_path)
+    except Exception as e:
+        print(f"Error al leer las páginas de '{pdf_path}': {e}")
+        return None
+    return {
+        "fingerprints": huellas,
+        "strip_boilerplate": pdf_processor.strip_boilerplate,
+        "boilerplate": sorted(list(f) for f in boilerplate),
+        "pages": [bloques[i] for i in range(len(huellas))],
+    }
+
+
+def record_deck(store, deck_key, paginas, presentation, ai_data, sections=None, section_size=None):
+    """Guarda el registro de una presentación ('paginas' es lo de read_deck_pages)."""
+    store.put(deck_key, dict(
+        paginas,
+        presentation={"presentationId": presentation.get("presentationId"),
+                      "presentationUrl": presentation.get("presentationUrl")},
+        section_pages=section_size,
+        sections=sections,
+        ai_data=ai_data,
+    ))
+
+
+def record_new_deck(pdf_path, pdf_processor, store, presentation, ai_data, deck_key=None):
+    """
+    Guarda el registro de una presentación recién creada sin modo
+    incremental, para poder actualizarla después con update_deck.
+    Devuelve True si se guardó.
+    """
+    paginas = read_deck_pages(pdf_path, pdf_processor)
+    if paginas is None:
+        return False
+    record_deck(store, deck_key or os.path.abspath(pdf_path), paginas, presentation, ai_data)
+    return True
+
+
+def _blocks_text(bloques):
+    return " ".join(texto for lineas in bloques for texto, _ in lineas)
+
+
+def update_deck(pdf_path, pdf_processor, slide_generator, store, use_cache=True, map_reduce=False,
+                deck_key=None, on_stage=None):
+    """
+    Genera la presentación de un PDF o, si ya se generó una antes,
+    la actualiza con solo lo que cambió. El SlideGenerator debe estar ya
+    autenticado.
+
+    Args:
+        store: DeckStore donde se guarda el estado de cada presentación.
+        deck_key: Clave del registro (por defecto, la ruta absoluta del
+            PDF); sirve para asociar una revisión con otro nombre de
+            archivo a la presentación anterior.
+        on_stage: Función opcional llamada con el nombre de cada paso
+            ("extract", "generate", "update").
+
+    Returns:
+        Un diccionario con "presentation" (id y URL), "ai_data",
+        "pages", "changed_pages", "requests" (peticiones de Slides
+        enviadas) y "created" (True si se creó una presentación nueva),
+        o None si algo falla.
+    """
+    deck_key = deck_key or os.path.abspath(pdf_path)
+    etapa = on_stage or (lambda nombre: None)
+
+    with metrics.span("deck.update") as attrs:
+        etapa("extract")
+        try:
+            huellas = pdf_processor.page_fingerprints(pdf_path)
+        except Exception as e:
+            print(f"Error al leer el PDF '{pdf_path}': {e}")
+            return None
+        record = store.get(deck_key)
+        if record and record.get("strip_boilerplate") != pdf_processor.strip_boilerplate:
+            record = None
+
+        if record and record["fingerprints"] == huellas:
+            print("El PDF no ha cambiado desde la última presentación.")
+            attrs.update(pages=len(huellas), changed_pages=0)
+            return {"presentation": record["presentation"], "ai_data": record["ai_data"],
+                    "pages": len(huellas), "changed_pages": 0, "requests": 0, "created": False}
+
+        # --- Paso 1: Extraer solo las páginas cambiadas ---
+        cambiadas = changed_pages(record["fingerprints"], huellas) if record else None
+        try:
+            boilerplate, nuevas = pdf_processor.extract_page_blocks(pdf_path, cambiadas)
+            firmas = sorted(list(f) for f in boilerplate)
+            if record and firmas != record["boilerplate"]:
+                # Con otros encabezados/pies, lo guardado ya no es comparable
+                print("Los encabezados o pies repetidos han cambiado: se extrae todo el documento.")
+                boilerplate, nuevas = pdf_processor.extract_page_blocks(pdf_path)
+        except Exception as e:
+            print(f"Error al extraer el texto de '{pdf_path}': {e}")
+            return None
+        paginas = [nuevas[i] if i in nuevas else record["pages"][i] for i in range(len(huellas))]
+        print(f"Páginas cambiadas: {len(nuevas)} de {len(huellas)}.")
+        attrs.update(pages=len(huellas), changed_pages=len(nuevas))
+
+        # --- Paso 2: Generar el contenido (resumiendo solo las secciones cambiadas) ---
+        etapa("generate")
+        textos = [_blocks_text(bloques) for bloques in paginas]
+        total_chars = sum(len(t) + 1 for t in textos)
+        secciones, tamano = None, None
+        if map_reduce and total_chars > MAX_PROMPT_CHARS:
+            tamano = (record or {}).get("section_pages") or section_pages(len(paginas))
+            secciones = _summarize_sections(slide_generator, textos, huellas, tamano,
+                                            (record or {}).get("sections") or [], use_cache)
+            if secciones is None:
+                return None
+            ai_data = slide_generator.get_content_from_summaries(
+                [s["summary"] for s in secciones], use_cache=use_cache
+            )
+        else:
+            todos = [b for bloques in paginas[:SALIENCE_MAX_PAGES] for b in bloques]
+            texto = select_text(split_passages(todos), MAX_PROMPT_CHARS)
+            if not texto:
+                print("Error: No se pudo extraer texto del PDF.")
+                return None
+            ai_data = slide_generator.get_presentation_content(texto, use_cache=use_cache)
+        if not ai_data:
+            return None
+
+        # --- Paso 3: Actualizar la presentación existente (o crear una) ---
+        etapa("update")
+        presentacion, enviadas = None, None
+        if record:
+            presentacion = record["presentation"]
+            enviadas = slide_generator.update_presentation(
+                presentacion["presentationId"], record["ai_data"], ai_data
+            )
+            if enviadas is None:
+                # Borrada o modificada a mano: no se puede aplicar el diff
+                print("No se pudo actualizar la presentación anterior; se crea una nueva.")
+        creada = enviadas is None
+        if creada:
+            nueva = slide_generator.create_presentation(ai_data)
+            if not nueva:
+                store.delete(deck_key)
+                return None
+            presentacion = {"presentationId": nueva.get("presentationId"),
+                            "presentationUrl": nueva.get("presentationUrl")}
+        attrs.update(requests=enviadas, created=creada)
+
+        record_deck(store, deck_key, {
+            "fingerprints": huellas,
+            "strip_boilerplate": pdf_processor.strip_boilerplate,
+            "boilerplate": sorted(list(f) for f in boilerplate),
+            "pages": paginas,
+        }, presentacion, ai_data, secciones, tamano)
+        return {"presentation": presentacion, "ai_data": ai_data, "pages": len(huellas),
+                "changed_pages": len(nuevas), "requests": enviadas, "created": creada}
+
+
+def _summarize_sections(slide_generator, textos, huellas, tamano, anteriores, use_cache):
+    """
+    Resúmenes por secciones de 'tamano' páginas, reutilizando los de
+    'anteriores' cuyas páginas no cambiaron. Devuelve la lista de
+    secciones ({"fingerprints", "summary"}) o None si falla alguna.
+    """
+    secciones = []
+    pendientes = []
+    for numero, inicio in enumerate(range(0, len(textos), tamano)):
+        seccion = {"fingerprints": huellas[inicio:inicio + tamano], "summary": None}
+        texto = " ".join(textos[inicio:inicio + tamano]).strip()
+        if numero < len(anteriores) and anteriores[numero]["fingerprints"] == seccion["fingerprints"]:
+            seccion["summary"] = anteriores[numero]["summary"]
+        elif not texto:
+            seccion["summary"] = ""  # Páginas sin texto: nada que resumir
+        else:
+            pendientes.append((numero, texto))
+        secciones.append(seccion)
+
+    print(f"Resumiendo {len(pendientes)} de {len(secciones)} secciones "
+          f"(el resto no ha cambiado)...")
+    metrics.count("deck.sections_summarized", len(pendientes))
+    resumenes = slide_generator.summarize_sections(
+        [texto for _, texto in pendientes], use_cache,
+        numbers=[numero + 1 for numero, _ in pendientes], total=len(secciones)
+    )
+    for (numero, _), resumen in zip(pendientes, resumenes):
+        if resumen is None:
+            print(f"Error: No se pudo resumir la sección {numero + 1}.")
+            return None
+        secciones[numero]["summary"] = resumen
+    return secciones
@@ -0,0 +1,202 @@
+"""
+Cola de trabajos (un trabajo = un PDF a convertir) atendida por un pool
+acotado de hilos, con estado y progreso por trabajo y cancelación.
+
+No depende de la interfaz: AppUI la usa para procesar varios PDFs a la vez,
+pero sirve igual para cualquier otro punto de entrada.
+"""
+import itertools
+import queue
+import threading
+import time
+
+# Estados posibles de un trabajo
+EN_COLA = "en cola"
+EN_CURSO = "en curso"
+COMPLETADO = "completado"
+ERROR = "error"
+CANCELADO = "cancelado"
+ESTADOS_FINALES = (COMPLETADO, ERROR, CANCELADO)
+
+
+class JobCancelled(Exception):
+    """La función del trabajo la lanza si detecta que se ha cancelado."""
+
+
+class Job:
+    """Un PDF en la cola, con su estado, etapa actual, progreso y resultado."""
+
+    def __init__(self, job_id, pdf_path, options=None):
+        self.id = job_id
+        self.pdf_path = pdf_path
+        self.options = options or {}
+        self.state = EN_COLA
+        self.stage = None
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_dict(self):
+        """Representación serializable en JSON (para manifiestos o APIs)."""
+        return {
+            "id": self.id,
+            "file": self.pdf_path,
+            "state": self.state,
+            "stage": self.stage,
+            "progress": round(self.progress, 3),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    Cola FIFO de trabajos con como mucho 'workers' en ejecución a la vez.
+
+    'run_job' es la función que hace el trabajo: recibe el Job, puede ir
+    actualizando su progreso con queue.update(job, stage=..., progress=...)
+    y consultar job.cancelled (lanzando JobCancelled para abandonar).
+    Devuelve el resultado (se guarda en job.result); cualquier otra
+    excepción deja el trabajo en estado de error.
+
+    'on_update' se llama (desde el hilo del trabajo) cada vez que un
+    trabajo cambia de estado o de progreso.
+
+    Con 'retention' (segundos), los trabajos terminados hace más de ese
+    tiempo se olvidan (al añadir uno nuevo y al terminar cualquiera), y
+    'on_evict' se llama con cada uno para que se liberen sus archivos.
+    Sin ella se guardan todos (p. ej. en la interfaz, que los muestra).
+
+    Los hilos de la cola son 'daemon': al cerrar el programa no se espera
+    a los trabajos en curso (se cancelan con shutdown()).
+    """
+
+    def __init__(self, run_job, workers=2, on_update=None, retention=None, on_evict=None):
+        self.run_job = run_job
+        self.on_update = on_update
+        self.retention = retention
+        self.on_evict = on_evict
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = queue.Queue()
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"autoslides-job-{n}", daemon=True)
+            for n in range(1, workers + 1)
+        ]
+        for hilo in self._workers:
+            hilo.start()
+
+    def submit(self, pdf_path, **options):
+        """Añade un PDF a la cola y devuelve su Job."""
+        self.prune()
+        with self._lock:
+            job = Job(next(self._ids), pdf_path, options)
+            self.jobs[job.id] = job
+        self._notify(job)
+        self._pending.put(job)
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancela un trabajo. Si aún está en cola no llegará a ejecutarse; si
+        está en curso, se marca y la función del trabajo lo abandona en el
+        siguiente punto de control. Devuelve False si ya había terminado.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.state in ESTADOS_FINALES:
+            return False
+        job.cancel_event.set()
+        if job.state == EN_COLA:
+            self._finish(job, CANCELADO)
+        return True
+
+    def update(self, job, stage=None, progress=None):
+        """Actualiza la etapa y/o el progreso (0..1) de un trabajo en curso."""
+        if stage is not None:
+            job.stage = stage
+        if progress is not None:
+            job.progress = max(job.progress, min(1.0, progress))
+        self._notify(job)
+
+    def prune(self):
+        """Olvida los trabajos terminados hace más de 'retention' segundos. Devuelve cuántos."""
+        if self.retention is None:
+            return 0
+        limite = time.time() - self.retention
+        with self._lock:
+            caducados = [job for job in self.jobs.values()
+                         if job.state in ESTADOS_FINALES and job.finished_at < limite]
+            for job in caducados:
+                del self.jobs[job.id]
+        for job in caducados:
+            if self.on_evict:
+                try:
+                    self.on_evict(job)
+                except Exception as e:
+                    print(f"Error en on_evict del trabajo {job.id}: {e}")
+        return len(caducados)
+
+    def shutdown(self, cancel_pending=True):
+        """
+        Cancela lo pendiente y lo que está en curso (opcional) y detiene los
+        hilos sin esperar: los trabajos en curso lo abandonan en su siguiente
+        punto de control, y si el programa termina antes no lo retienen.
+        """
+        if cancel_pending:
+            for job in list(self.jobs.values()):
+                self.cancel(job.id)
+        for _ in self._workers:
+            self._pending.put(None)
+
+    def _worker(self):
+        while True:
+            job = self._pending.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _run(self, job):
+        with self._lock:
+            if job.cancelled or job.state != EN_COLA:
+                return
+            job.state = EN_CURSO
+            job.started_at = time.time()
+        self._notify(job)
+        try:
+            job.result = self.run_job(job)
+        except JobCancelled:
+            self._finish(job, CANCELADO)
+        except Exception as e:
+            job.error = str(e)
+            self._finish(job, CANCELADO if job.cancelled else ERROR)
+        else:
+            job.progress = 1.0
+            self._finish(job, CANCELADO if job.cancelled and job.result is None else COMPLETADO)
+
+    def _finish(self, job, state):
+        with self._lock:
+            if job.state in ESTADOS_FINALES:
+                return
+            job.state = state
+            job.finished_at = time.time()
+        self._notify(job)
+        self.prune()
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"Error en on_update del trabajo {job.id}: {e}")
@@ -0,0 +1,255 @@
+import json
+import re
+
+# Claves de cada punto clave (diapositiva) del JSON de la presentación
+CLAVES_PUNTO = ("titulo_diapositiva", "contenido_diapositiva")
+
+# Cada escape (barra invertida + carácter); los válidos en JSON se dejan
+# como están y en los demás (p. ej. "\q") se duplica la barra
+_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+_ESCAPES_VALIDOS = '"\\/bfnrtu'
+
+
+def _escape_literal(match):
+    return match.group(0) if match.group(1) in _ESCAPES_VALIDOS else "\\" + match.group(0)
+
+
+def loads_lenient(texto):
+    """
+    json.loads que tolera escapes no válidos (la barra se toma literal,
+    como haría la IA al escribir una ruta o una fórmula). Devuelve None si
+    aun así no se puede decodificar.
+    """
+    try:
+        return json.loads(texto)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_ESCAPE.sub(_escape_literal, texto))
+    except json.JSONDecodeError:
+        return None
+
+
+def strip_code_fences(text):
+    """Quita las vallas de Markdown (```json ... ```) que a veces rodean el JSON."""
+    texto = text.strip()
+    if texto.startswith("```"):
+        # La primera línea es ``` o ```json
+        texto = texto[texto.find("\n") + 1:] if "\n" in texto else ""
+    if texto.endswith("```"):
+        texto = texto[:-3]
+    return texto.strip()
+
+
+def valid_point(punto):
+    """El punto clave normalizado, o None si no es un objeto con título y contenido."""
+    if not isinstance(punto, dict):
+        return None
+    valores = [punto.get(clave) for clave in CLAVES_PUNTO]
+    if not all(isinstance(v, str) and v.strip() for v in valores):
+        return None
+    return dict(zip(CLAVES_PUNTO, (v.strip() for v in valores)))
+
+
+def validate_presentation(data):
+    """
+    Comprueba la estructura {"titulo_presentacion", "puntos_clave"} y la
+    normaliza: descarta los puntos clave sin título o sin contenido (o que
+    no son objetos) y quita los espacios sobrantes. Sin título, se usa el
+    de la primera diapositiva.
+
+    Returns:
+        (ai_data, problemas): ai_data normalizado (None si no es un
+        objeto o no tiene ni título ni puntos válidos) y la lista de
+        problemas encontrados (vacía si todo era correcto).
+    """
+    if not isinstance(data, dict):
+        return None, ["la respuesta no es un objeto JSON"]
+    problemas = []
+    puntos = data.get("puntos_clave")
+    if not isinstance(puntos, list):
+        problemas.append("falta la lista 'puntos_clave'")
+        puntos = []
+    validos = []
+    for i, punto in enumerate(puntos, start=1):
+        normalizado = valid_point(punto)
+        if normalizado is None:
+            problemas.append(f"el punto clave {i} no tiene título y contenido")
+        else:
+            validos.append(normalizado)
+
+    titulo = data.get("titulo_presentacion")
+    if not isinstance(titulo, str) or not titulo.strip():
+        problemas.append("falta 'titulo_presentacion'")
+        titulo = validos[0]["titulo_diapositiva"] if validos else None
+    if titulo is None:
+        return None, problemas
+    return {"titulo_presentacion": titulo.strip(), "puntos_clave": validos}, problemas
+
+
+def load_presentation(text):
+    """
+    Decodifica el JSON de la presentación (sin vallas de Markdown ni texto
+    alrededor del objeto) y valida su estructura. Sirve como 'parse' de
+    SlideGenerator._generate: lanza ValueError si el JSON está cortado o
+    mal formado, o si le falta algo (ver validate_presentation).
+    """
+    texto = strip_code_fences(text)
+    data = loads_lenient(texto)
+    if data is None:
+        # Texto antes o después del objeto ("Aquí tienes el JSON: {...}")
+        inicio, fin = texto.find("{"), texto.rfind("}")
+        if inicio >= 0 and fin > inicio and not (inicio == 0 and fin == len(texto) - 1):
+            data = loads_lenient(texto[inicio:fin + 1])
+        if data is None:
+            raise ValueError("La respuesta no es un JSON válido (cortada o mal formada).")
+    ai_data, problemas = validate_presentation(data)
+    if problemas or not ai_data["puntos_clave"]:
+        raise ValueError("JSON con formato inesperado: " + ("; ".join(problemas) or "sin puntos clave"))
+    return ai_data
+
+
+def salvage_presentation(text):
+    """
+    Recupera lo aprovechable de una respuesta cortada o mal formada: el
+    título y todos los puntos clave completos y válidos.
+
+    Returns:
+        (ai_data, cortada): ai_data (None si no se recuperó ni el título;
+        puede tener la lista de puntos vacía) y si la respuesta quedó a
+        medias (objeto o cadena sin cerrar).
+    """
+    parser = IncrementalSlidesParser()
+    parser.feed(strip_code_fences(text))
+    return parser.salvaged(), parser.truncated
+
+
+def salvage_points(text):
+    """Los puntos clave completos y válidos de una respuesta {"puntos_clave": [...]}."""
+    parser = IncrementalSlidesParser()
+    parser.feed(strip_code_fences(text))
+    return parser.puntos
+
+
+class IncrementalSlidesParser:
+    """
+    Parser incremental para el JSON de la presentación que genera la IA:
+
+        {"titulo_presentacion": "...", "puntos_clave": [{...}, {...}]}
+
+    Se le va pasando el texto a trozos, tal y como llega en streaming, con
+    feed(). Cada llamada devuelve los eventos que se han completado con ese
+    trozo, en orden:
+
+        ("titulo", "Título de la presentación")
+        ("punto", {"titulo_diapositiva": ..., "contenido_diapositiva": ...})
+
+    Así cada diapositiva puede crearse en cuanto su objeto JSON está
+    completo, sin esperar al final de la respuesta.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.titulo = None
+        self.puntos = []
+        self._pos = 0              # Siguiente carácter de buffer por analizar
+        self._depth = 0            # Nivel de anidamiento de {} y []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._expect_key = False   # En el objeto raíz: ¿la próxima cadena es una clave?
+        self._key = None           # Última clave del objeto raíz
+        self._in_points = False    # Dentro del array 'puntos_clave'
+        self._object_start = None  # Inicio del punto clave en curso
+
+    def feed(self, chunk):
+        """Añade texto y devuelve la lista de eventos completados."""
+        self.buffer += chunk
+        eventos = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            c = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    self._on_string_end(i, eventos)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+            elif c in "{[":
+                self._depth += 1
+                if self._depth == 1 and c == "{":
+                    self._expect_key = True
+                elif self._depth == 2 and c == "[" and self._key == "puntos_clave":
+                    self._in_points = True
+                elif self._depth == 3 and c == "{" and self._in_points:
+                    self._object_start = i
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 2 and c == "}" and self._object_start is not None:
+                    self._on_point_end(i, eventos)
+                elif self._depth == 1 and c == "]":
+                    self._in_points = False
+            elif self._depth == 1:
+                if c == ",":
+                    self._expect_key = True
+                elif c == ":":
+                    self._expect_key = False
+        self._pos = len(buffer)
+        return eventos
+
+    @property
+    def truncated(self):
+        """True si el texto recibido termina a medias (objeto o cadena sin cerrar)."""
+        return self._depth > 0 or self._in_string
+
+    def complete(self):
+        """True si el texto recibido es la presentación entera y válida."""
+        try:
+            load_presentation(self.buffer)
+            return True
+        except ValueError:
+            return False
+
+    def salvaged(self):
+        """Título y puntos clave válidos recuperados hasta ahora (ver salvage_presentation)."""
+        return validate_presentation({"titulo_presentacion": self.titulo, "puntos_clave": self.puntos})[0]
+
+    def result(self):
+        """
+        Devuelve la presentación completa. Si el JSON entero es válido se
+        usa tal cual; si no (p. ej. respuesta cortada), lo recuperado hasta
+        ahora, o None si no se llegó a completar nada.
+        """
+        try:
+            return load_presentation(self.buffer)
+        except ValueError:
+            return self.salvaged()
+
+    def _on_string_end(self, end, eventos):
+        if self._depth != 1:
+            return
+        texto = loads_lenient(self.buffer[self._string_start:end + 1])
+        if texto is None:
+            # Cadena irrecuperable: se ignora (sin título se usa el de la primera diapositiva)
+            return
+        if self._expect_key:
+            self._key = texto
+        elif self._key == "titulo_presentacion" and self.titulo is None and texto.strip():
+            self.titulo = texto
+            eventos.append(("titulo", texto))
+
+    def _on_point_end(self, end, eventos):
+        punto = loads_lenient(self.buffer[self._object_start:end + 1])
+        self._object_start = None
+        # Solo se emiten diapositivas con título y contenido
+        punto = valid_point(punto)
+        if punto is not None:
+            self.puntos.append(punto)
+            eventos.append(("punto", punto))
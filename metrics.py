@@ -0,0 +1,187 @@
+"""
+Instrumentación de AutoSlides: tramos de tiempo (spans) y contadores.
+
+Los módulos de lógica marcan sus pasos con span() y count():
+
+    with metrics.span("vertex.generate", prompt_chars=len(prompt)) as attrs:
+        ...
+        attrs["response_tokens"] = tokens
+
+Cada registro se envía a los sinks configurados (p. ej. un archivo JSON
+lines con JsonLinesSink, o cualquier función que reciba un diccionario) y,
+si hay una ejecución en curso (ver run()), se acumula en ella para poder
+mostrar su desglose al terminar.
+
+La ejecución en curso viaja en un contextvars.ContextVar: los pools de
+hilos no lo heredan, así que las funciones que se lanzan en otro hilo
+deben envolverse con bind().
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Si está definida, los registros se añaden a este archivo JSON lines
+METRICS_FILE_ENV = "AUTOSLIDES_METRICS_FILE"
+
+_current_run = contextvars.ContextVar("autoslides_run", default=None)
+_sinks = []
+_sinks_lock = threading.Lock()
+_run_ids = itertools.count(1)
+
+
+class JsonLinesSink:
+    """Sink que añade cada registro como una línea JSON a un archivo."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def add_sink(sink):
+    """Registra un sink: cualquier función que reciba el diccionario del registro."""
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def _emit(record):
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception as e:
+            # La instrumentación nunca debe romper el proceso
+            print(f"Aviso: error en un sink de métricas: {e}")
+
+
+class RunMetrics:
+    """Spans y contadores acumulados de una ejecución (p. ej. un PDF)."""
+
+    def __init__(self, name, run_id=None):
+        self.name = name
+        self.run_id = run_id or f"run-{next(_run_ids)}"
+        self.started_at = time.time()
+        self.duration = None
+        self.spans = {}      # nombre → {"count", "seconds"}
+        self.counters = {}   # nombre → valor acumulado
+        self._lock = threading.Lock()
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            s = self.spans.setdefault(name, {"count": 0, "seconds": 0.0})
+            s["count"] += 1
+            s["seconds"] += seconds
+
+    def add(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def seconds(self, name):
+        """Segundos acumulados en los spans 'name' (0 si no hubo ninguno)."""
+        return self.spans.get(name, {}).get("seconds", 0.0)
+
+    def summary(self):
+        """Desglose serializable en JSON (para manifiestos o la interfaz)."""
+        with self._lock:
+            return {
+                "run": self.run_id,
+                "name": self.name,
+                "duration_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+                "spans": {n: {"count": s["count"], "ms": round(s["seconds"] * 1000, 1)}
+                          for n, s in self.spans.items()},
+                "counters": dict(self.counters),
+            }
+
+
+def current_run():
+    """La ejecución en curso en este contexto, o None."""
+    return _current_run.get()
+
+
+@contextmanager
+def run(name, **attrs):
+    """
+    Abre una ejecución: los spans y contadores registrados dentro (en este
+    hilo o en funciones envueltas con bind()) se acumulan en el RunMetrics
+    que devuelve. Al cerrar se emite un registro "run" con su resumen.
+    """
+    metrics = RunMetrics(name)
+    token = _current_run.set(metrics)
+    inicio = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.duration = time.perf_counter() - inicio
+        _current_run.reset(token)
+        _emit(dict(metrics.summary(), type="run", ts=metrics.started_at, **attrs))
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Mide el bloque y emite un registro "span" con su duración y 'attrs'.
+    El diccionario que devuelve se puede completar dentro del bloque con
+    datos que solo se conocen al final (caracteres, tokens, estado HTTP...).
+    """
+    metrics = _current_run.get()
+    ts = time.time()
+    inicio = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as e:
+        attrs["error"] = type(e).__name__
+        raise
+    finally:
+        segundos = time.perf_counter() - inicio
+        record = {"type": "span", "name": name, "ts": ts, "duration_ms": round(segundos * 1000, 2)}
+        if metrics is not None:
+            metrics.add_span(name, segundos)
+            record["run"] = metrics.run_id
+        record.update(attrs)
+        _emit(record)
+
+
+def count(name, value=1, **attrs):
+    """Suma 'value' al contador 'name' de la ejecución en curso y lo emite."""
+    metrics = _current_run.get()
+    record = {"type": "metric", "name": name, "ts": time.time(), "value": value}
+    if metrics is not None:
+        metrics.add(name, value)
+        record["run"] = metrics.run_id
+    record.update(attrs)
+    _emit(record)
+
+
+def bind(func):
+    """
+    Envuelve 'func' para que se ejecute en el contexto actual (y, con él,
+    en la ejecución en curso) aunque se llame desde otro hilo. Cada llamada
+    usa su propia copia del contexto, así que se puede pasar a pool.map().
+    """
+    contexto = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return contexto.copy().run(func, *args, **kwargs)
+    return bound
+
+
+if os.getenv(METRICS_FILE_ENV):
+    add_sink(JsonLinesSink(os.environ[METRICS_FILE_ENV]))
@@ -1,54 +1,753 @@
-import fitz  # PyMuPDF
+import hashlib
+import os
+import re
 import sys
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+import salience
+from disk_cache import CACHE_ROOT, DiskCache, file_hash, make_key
+
+# PyMuPDF ('fitz') se importa dentro de las funciones que lo usan: cargarlo
+# cuesta ~100 ms y no hace falta hasta extraer el primer PDF.
+
+# Aproximación usada para convertir un presupuesto de tokens en caracteres
+# (para los modelos Gemini, ~4 caracteres por token en texto latino).
+CHARS_PER_TOKEN = 4
+
+# Por debajo de este número de páginas, arrancar un pool de procesos
+# cuesta más de lo que ahorra: se usa siempre la extracción en serie.
+PARALLEL_MIN_PAGES = 64
+
+# Caché persistente del texto extraído (clave: hash del contenido del PDF
+# + opciones de extracción). Incrementar EXTRACTOR_VERSION si cambia la
+# forma de extraer o normalizar, para invalidar las entradas antiguas.
+TEXT_CACHE_DIR = os.path.join(CACHE_ROOT, "text")
+TEXT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+EXTRACTOR_VERSION = 2
+
+# Detección de encabezados, pies de página y avisos legales repetidos: se
+# comparan los bloques de texto de hasta BOILERPLATE_SAMPLE_PAGES páginas
+# repartidas por el documento. Un bloque (por zona de la página y, en
+# encabezados y pies, con los números normalizados para que "Página 3" y
+# "Página 4" coincidan) que
+# aparece en al menos BOILERPLATE_MIN_RATIO de ellas, y como mínimo en
+# BOILERPLATE_MIN_PAGES, se descarta en todas las páginas.
+BOILERPLATE_SAMPLE_PAGES = 16
+BOILERPLATE_MIN_PAGES = 3
+BOILERPLATE_MIN_RATIO = 0.5
+# Fracción superior/inferior de la página que se considera encabezado/pie
+BOILERPLATE_EDGE = 0.15
+
+# Selección por relevancia (extract_salient_text): una línea cuya letra es
+# al menos HEADING_SIZE_RATIO veces el tamaño del cuerpo del texto, y no
+# más larga que HEADING_MAX_CHARS, se trata como título. Solo se analizan
+# las primeras SALIENCE_MAX_PAGES páginas, para acotar el coste en
+# documentos enormes.
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 150
+SALIENCE_MAX_PAGES = 300
+# Las "frases" más largas que esto (texto sin puntuación, tablas...) se
+# parten en trozos para que sigan siendo seleccionables
+PASSAGE_MAX_CHARS = 400
+
+# Figuras (extract_figures): imágenes incrustadas de al menos
+# FIGURE_MIN_SIDE píxeles de lado (los iconos y adornos se ignoran), sin
+# repetir (por xref y por contenido) y, con strip_boilerplate, sin las que
+# aparecen en muchas páginas como los logotipos (mismo criterio que los
+# encabezados: BOILERPLATE_MIN_PAGES y BOILERPLATE_MIN_RATIO). Se reducen a
+# FIGURE_MAX_SIDE píxeles en el lado mayor y se recodifican (JPEG, o PNG si
+# tienen transparencia) en un pool de procesos a partir de
+# FIGURE_PARALLEL_MIN figuras. Las imágenes de más de FIGURE_MAX_PIXELS
+# píxeles no se decodifican enteras: se renderiza su zona de la página ya
+# a tamaño final, para acotar la memoria.
+FIGURE_MIN_SIDE = 100
+FIGURE_MAX_SIDE = 1280
+FIGURE_MAX_PIXELS = 16_000_000
+FIGURE_JPEG_QUALITY = 80
+FIGURE_MAX_COUNT = 10
+FIGURE_PARALLEL_MIN = 4
+# Figuras por tarea del pool (se abre el documento una vez por tarea)
+FIGURE_BATCH_SIZE = 2
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+(?=[\"“¿¡(A-ZÁÉÍÓÚÑ0-9])")
+
+# PyMuPDF no admite usar documentos desde varios hilos a la vez: todo el
+# trabajo con fitz de este proceso se serializa con este cerrojo. Los
+# procesos del modo paralelo tienen su propia copia de fitz, así que no lo
+# toman (solo la lectura previa del documento en este proceso).
+_fitz_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Colapsa cualquier secuencia de espacios en blanco en un único espacio."""
+    return ' '.join(text.split())
+
+
+def _text_blocks(page) -> list:
+    """Bloques de texto no vacíos de una página (sin los de imagen)."""
+    return [b for b in page.get_text("blocks") if b[6] == 0 and b[4].strip()]
+
+
+def _block_signature(block, page_height: float) -> tuple:
+    """
+    Firma de un bloque para compararlo entre páginas: su zona (encabezado,
+    cuerpo o pie) y su texto normalizado, en minúsculas. En encabezados y
+    pies los números se sustituyen por '#' (números de página, fechas); en
+    el cuerpo solo cuentan los bloques idénticos, para no confundir con
+    repeticiones párrafos que solo difieren en las cifras.
+    """
+    centro = (block[1] + block[3]) / 2 / (page_height or 1)
+    if centro < BOILERPLATE_EDGE:
+        zona = "top"
+    elif centro > 1 - BOILERPLATE_EDGE:
+        zona = "bottom"
+    else:
+        zona = "body"
+    texto = normalize_text(block[4]).lower()
+    if zona != "body":
+        texto = re.sub(r"\d+", "#", texto)
+    return zona, texto
+
+
+def detect_boilerplate(doc) -> frozenset:
+    """
+    Devuelve las firmas (ver _block_signature) de los bloques que se
+    repiten en muchas páginas del documento: encabezados, pies, números
+    de página, avisos legales... Vacío si el documento es muy corto.
+    """
+    page_count = len(doc)
+    if page_count < BOILERPLATE_MIN_PAGES:
+        return frozenset()
+    muestras = min(page_count, BOILERPLATE_SAMPLE_PAGES)
+    # Páginas repartidas por todo el documento (incluidas la primera y la última)
+    indices = sorted({round(i * (page_count - 1) / (muestras - 1)) for i in range(muestras)})
+
+    conteo = Counter()
+    for i in indices:
+        page = doc[i]
+        conteo.update({_block_signature(b, page.rect.height) for b in _text_blocks(page)})
+    minimo = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_RATIO * len(indices))
+    return frozenset(firma for firma, veces in conteo.items() if veces >= minimo)
+
+
+def page_text(page, boilerplate: frozenset = frozenset()) -> str:
+    """
+    Texto normalizado de una página, sin los bloques cuya firma esté en
+    'boilerplate' (ver detect_boilerplate).
+    """
+    if not boilerplate:
+        return normalize_text(page.get_text())
+    altura = page.rect.height
+    return normalize_text(" ".join(
+        b[4] for b in _text_blocks(page) if _block_signature(b, altura) not in boilerplate
+    ))
+
+
+def _page_lines(page, boilerplate: frozenset = frozenset()) -> list:
+    """
+    Bloques de texto de una página como listas de líneas (texto
+    normalizado, tamaño de letra), sin los bloques repetidos de
+    'boilerplate'. Usa get_text("dict"), que conserva el tamaño de cada span.
+    """
+    altura = page.rect.height
+    bloques = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        lineas = []
+        for line in block["lines"]:
+            spans = [sp for sp in line["spans"] if sp["text"].strip()]
+            if spans:
+                texto = normalize_text("".join(sp["text"] for sp in line["spans"]))
+                lineas.append((texto, max(sp["size"] for sp in spans)))
+        if not lineas:
+            continue
+        if boilerplate:
+            firma = _block_signature((*block["bbox"], " ".join(t for t, _ in lineas)), altura)
+            if firma in boilerplate:
+                continue
+        bloques.append(lineas)
+    return bloques
+
+
+def split_passages(bloques: list) -> list:
+    """
+    Convierte los bloques de un documento (ver _page_lines) en pasajes
+    (texto, es_titulo): los títulos se reconocen por su tamaño de letra
+    respecto al del cuerpo (el más usado, contando caracteres) y el resto
+    del texto se divide en frases.
+    """
+    tamanos = Counter()
+    for lineas in bloques:
+        for texto, size in lineas:
+            tamanos[round(size * 2) / 2] += len(texto)
+    if not tamanos:
+        return []
+    cuerpo = tamanos.most_common(1)[0][0]
+
+    pasajes = []
+    for lineas in bloques:
+        parrafo = []
+        titulo = []
+        for texto, size in lineas:
+            es_titulo = size >= cuerpo * HEADING_SIZE_RATIO and len(texto) <= HEADING_MAX_CHARS
+            if es_titulo:
+                titulo.append(texto)
+                continue
+            if titulo:
+                pasajes.append((" ".join(titulo), True))
+                titulo = []
+            parrafo.append(texto)
+        if parrafo:
+            for frase in _SENTENCE_END_RE.split(" ".join(parrafo)):
+                pasajes.extend((trozo, False) for trozo in _split_long(frase))
+        if titulo:
+            pasajes.append((" ".join(titulo), True))
+    return pasajes
+
+
+def _split_long(texto: str) -> list:
+    """Parte un texto en trozos de como mucho PASSAGE_MAX_CHARS, sin cortar palabras."""
+    trozos = []
+    while len(texto) > PASSAGE_MAX_CHARS:
+        corte = texto.rfind(" ", 0, PASSAGE_MAX_CHARS)
+        if corte <= 0:
+            corte = PASSAGE_MAX_CHARS
+        trozos.append(texto[:corte])
+        texto = texto[corte:].lstrip()
+    if texto:
+        trozos.append(texto)
+    return trozos
+
+
+def page_fingerprint(page) -> str:
+    """
+    Huella de una página para saber si cambió entre dos versiones de un
+    PDF sin extraer su texto: el hash de su tamaño, su flujo de contenido
+    y el de los formularios XObject que dibuja (donde algunos PDFs ponen
+    el texto). Las imágenes no cuentan: no cambian el texto extraído.
+    """
+    digest = hashlib.sha256(repr(tuple(page.rect)).encode())
+    digest.update(page.read_contents())
+    for xref, *_ in page.get_xobjects():
+        digest.update(page.parent.xref_stream_raw(xref) or b"")
+    return digest.hexdigest()
+
+
+def select_text(pasajes: list, budget: int) -> str:
+    """
+    Texto del prompt a partir de los pasajes (texto, es_titulo) de un
+    documento: entero si cabe en 'budget', o los más relevantes si no
+    (ver salience.select_passages).
+    """
+    if sum(len(t) + 1 for t, _ in pasajes) <= budget:
+        # Cabe entero: no hay nada que seleccionar
+        return " ".join(t for t, _ in pasajes)
+    return salience.select_passages(pasajes, budget)
+
+
+def _extract_page_range(pdf_path: str, start: int, stop: int, boilerplate: frozenset = frozenset()) -> list:
+    """
+    Trabajo de un proceso del pool: abre su propia copia del documento
+    (los objetos de fitz no se pueden compartir entre procesos) y devuelve
+    el texto normalizado de las páginas [start, stop).
+    """
+    import fitz  # PyMuPDF
+    with fitz.open(pdf_path) as doc:
+        return [page_text(doc[i], boilerplate) for i in range(start, stop)]
+
+
+def _encode_figure(doc, candidato) -> dict:
+    """
+    Decodifica una imagen del PDF, la reduce a FIGURE_MAX_SIDE y la
+    recodifica. Devuelve la figura (ver extract_figures), o None si la
+    imagen no se puede convertir.
+    """
+    import fitz  # PyMuPDF
+    if candidato["width"] * candidato["height"] > FIGURE_MAX_PIXELS:
+        # MuPDF decodifica a menor resolución al renderizar a escala reducida
+        page = doc[candidato["page"]]
+        rects = page.get_image_rects(candidato["xref"])
+        if not rects or rects[0].is_empty:
+            return None
+        zoom = FIGURE_MAX_SIDE / max(rects[0].width, rects[0].height)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=rects[0])
+    else:
+        pix = fitz.Pixmap(doc, candidato["xref"])
+        if candidato["smask"]:
+            try:
+                pix = fitz.Pixmap(pix, fitz.Pixmap(doc, candidato["smask"]))
+            except (RuntimeError, ValueError):
+                pass  # Máscara incompatible: la imagen sin transparencia
+        if pix.colorspace is None or pix.colorspace.n not in (1, 3):
+            pix = fitz.Pixmap(fitz.csRGB, pix)  # CMYK, indexadas...
+        lado = max(pix.width, pix.height)
+        if lado > FIGURE_MAX_SIDE:
+            escala = FIGURE_MAX_SIDE / lado
+            pix = fitz.Pixmap(pix, max(1, round(pix.width * escala)), max(1, round(pix.height * escala)))
+
+    if pix.alpha:
+        data, mime = pix.tobytes("png"), "image/png"
+    else:
+        data, mime = pix.tobytes("jpeg", jpg_quality=FIGURE_JPEG_QUALITY), "image/jpeg"
+    return {"page": candidato["page"], "xref": candidato["xref"], "hash": candidato["hash"],
+            "width": pix.width, "height": pix.height, "mime": mime, "data": data}
+
+
+def _encode_figures(pdf_path: str, candidatos: list) -> list:
+    """
+    Trabajo de un proceso del pool: abre su propia copia del documento y
+    recodifica las figuras 'candidatos' (None en las que fallan).
+    """
+    import fitz  # PyMuPDF
+    figuras = []
+    with fitz.open(pdf_path) as doc:
+        for candidato in candidatos:
+            try:
+                figuras.append(_encode_figure(doc, candidato))
+            except (RuntimeError, ValueError):
+                figuras.append(None)
+    return figuras
+
 
 class PDFProcessor:
     """
     Clase dedicada a manejar la lógica de extracción de texto
     de archivos PDF.
     """
-    
-    def __init__(self):
-        # Podríamos inicializar configuraciones aquí si fuera necesario
-        pass
 
-    def extract_text(self, pdf_path: str) -> str:
+    def __init__(self, cache: DiskCache = None, strip_boilerplate: bool = True):
         """
-        Abre un archivo PDF y extrae todo el texto de sus páginas.
-        
+        Args:
+            cache: Caché opcional donde guardar y buscar el texto extraído
+                (ver default_text_cache). Sin caché, siempre se abre el PDF.
+            strip_boilerplate: Si es True, se descartan los encabezados,
+                pies y avisos repetidos en muchas páginas (ver
+                detect_boilerplate), que solo gastan espacio del prompt.
+        """
+        self.cache = cache
+        self.strip_boilerplate = strip_boilerplate
+
+    @staticmethod
+    def default_text_cache() -> DiskCache:
+        """Crea la caché de texto en disco con la configuración por defecto."""
+        return DiskCache(TEXT_CACHE_DIR, TEXT_CACHE_MAX_BYTES)
+
+    def iter_pages(self, pdf_path: str, max_chars: int = None, max_tokens: int = None):
+        """
+        Generador que abre un PDF y produce el texto normalizado de cada
+        página, de una en una. Si se indica un presupuesto (en caracteres
+        o en tokens), la extracción se detiene en cuanto se alcanza, sin
+        llegar a leer el resto de páginas.
+
+        El presupuesto cuenta también el espacio que separa una página de
+        la siguiente, de modo que ' '.join() de lo producido nunca lo supera.
+
         Args:
             pdf_path: La ruta al archivo PDF.
+            max_chars: Máximo de caracteres a producir (None = sin límite).
+            max_tokens: Máximo aproximado de tokens (None = sin límite).
+
+        Yields:
+            El texto normalizado de cada página no vacía (la última puede
+            ir recortada para respetar el presupuesto).
+
+        Raises:
+            Las excepciones de fitz al abrir o leer el documento.
+        """
+        import fitz  # PyMuPDF
+        budget = self._budget_in_chars(max_chars, max_tokens)
+        used = 0
+        with fitz.open(pdf_path) as doc:
+            print(f"El documento tiene {len(doc)} páginas.")
+            boilerplate = self._detect_boilerplate(doc)
+            for page in doc:
+                if budget is not None and used >= budget:
+                    print("Presupuesto de texto alcanzado. Se detiene la extracción.")
+                    break
+                text = page_text(page, boilerplate)
+                if not text:
+                    continue
+                if used:
+                    used += 1  # El espacio que separa esta página de la anterior
+                if budget is not None and used + len(text) > budget:
+                    text = text[:budget - used].rstrip()
+                    if not text:
+                        break
+                used += len(text)
+                yield text
+
+    def iter_pages_parallel(self, pdf_path: str, workers: int = None):
+        """
+        Extrae todas las páginas repartiéndolas en bloques contiguos entre
+        un pool de procesos, y produce el texto normalizado de cada página
+        no vacía en el orden original del documento.
+
+        Si el documento tiene menos de PARALLEL_MIN_PAGES páginas (o solo
+        hay un núcleo disponible) se recurre a la extracción en serie.
+
+        Args:
+            pdf_path: La ruta al archivo PDF.
+            workers: Número de procesos (None = número de CPUs).
+        """
+        import fitz  # PyMuPDF
+        workers = workers or os.cpu_count() or 1
+        with _fitz_lock, fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+            if workers < 2 or page_count < PARALLEL_MIN_PAGES:
+                boilerplate = None
+            else:
+                # Se detecta una vez aquí y se pasa a todos los procesos
+                boilerplate = self._detect_boilerplate(doc)
+
+        if boilerplate is None:
+            # En serie, en este proceso: con el cerrojo (pero sin retenerlo
+            # mientras quien consume el generador hace otras cosas)
+            with _fitz_lock:
+                textos = list(self.iter_pages(pdf_path))
+            yield from textos
+            return
+
+        print(f"El documento tiene {page_count} páginas. Extrayendo en paralelo con {workers} procesos...")
+        # Varios bloques por proceso para repartir mejor la carga
+        # (no todas las páginas cuestan lo mismo de extraer)
+        chunk_size = max(1, -(-page_count // (workers * 4)))
+        starts = list(range(0, page_count, chunk_size))
+        stops = [min(start + chunk_size, page_count) for start in starts]
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() devuelve los resultados en el orden de entrada
+            for texts in pool.map(_extract_page_range, [pdf_path] * len(starts), starts, stops,
+                                  [boilerplate] * len(starts)):
+                for text in texts:
+                    if text:
+                        yield text
+
+    def extract_text(self, pdf_path: str, max_chars: int = None, max_tokens: int = None,
+                     parallel: bool = False, workers: int = None) -> str:
+        """
+        Abre un archivo PDF y extrae el texto de sus páginas.
+
+        Args:
+            pdf_path: La ruta al archivo PDF.
+            max_chars: Máximo de caracteres a extraer (None = todo el documento).
+            max_tokens: Máximo aproximado de tokens (None = todo el documento).
+            parallel: Si es True y se extrae el documento completo, reparte
+                las páginas entre varios procesos (ver iter_pages_parallel).
+            workers: Número de procesos para el modo paralelo.
 
         Returns:
             Un string que contiene todo el texto extraído, o un string
             vacío si ocurre un error.
         """
+        import fitz  # PyMuPDF
         print(f"Iniciando extracción de texto desde: {pdf_path}")
-        full_text = ""
-        try:
-            # Abrir el documento PDF
+        with metrics.span("pdf.extract_text", parallel=parallel) as attrs:
+            try:
+                # Consultar la caché antes de abrir el documento con fitz
+                cache_key = None
+                if self.cache is not None:
+                    budget = self._budget_in_chars(max_chars, max_tokens)
+                    cache_key = make_key("pdf_text", EXTRACTOR_VERSION, file_hash(pdf_path), budget,
+                                     self.strip_boilerplate)
+                    cached_text = self.cache.get(cache_key)
+                    if cached_text is not None:
+                        print(f"Texto recuperado de la caché. Total de caracteres: {len(cached_text)}")
+                        attrs.update(cached=True, chars=len(cached_text))
+                        return cached_text
+
+                # Con presupuesto, la extracción en serie se detiene antes y
+                # el modo paralelo no aporta nada
+                # El modo paralelo toma el cerrojo solo para lo que hace en
+                # este proceso: mientras trabajan sus procesos, los demás
+                # trabajos pueden seguir usando fitz
+                if parallel and max_chars is None and max_tokens is None:
+                    textos = list(self.iter_pages_parallel(pdf_path, workers))
+                else:
+                    with _fitz_lock:
+                        textos = list(self.iter_pages(pdf_path, max_chars, max_tokens))
+                # Unimos al final (evita el coste cuadrático de concatenar con '+=')
+                full_text = ' '.join(textos)
+                print(f"Extracción completada. Total de caracteres: {len(full_text)}")
+                attrs.update(cached=False, pages=len(textos), chars=len(full_text))
+                metrics.count("pdf.pages_extracted", len(textos))
+
+                if cache_key is not None and full_text:
+                    self.cache.put(cache_key, full_text)
+                return full_text
+
+            except fitz.EmptyFileError:
+                print(f"Error: El archivo PDF en '{pdf_path}' está vacío.", file=sys.stderr)
+                attrs["error"] = "EmptyFileError"
+                return ""
+            except fitz.FileDataError:
+                 print(f"Error: El archivo PDF en '{pdf_path}' está dañado o mal formado.", file=sys.stderr)
+                 attrs["error"] = "FileDataError"
+                 return ""
+            except Exception as e:
+                # Capturar cualquier otro error inesperado
+                print(f"Error inesperado al procesar PDF: {e}", file=sys.stderr)
+                attrs["error"] = type(e).__name__
+                return ""
+
+    def extract_passages(self, pdf_path: str, max_pages: int = SALIENCE_MAX_PAGES) -> list:
+        """
+        Extrae el documento como lista de pasajes (texto, es_titulo) en su
+        orden original (ver split_passages), sin encabezados ni pies
+        repetidos si strip_boilerplate está activado.
+
+        Raises:
+            Las excepciones de fitz al abrir o leer el documento.
+        """
+        import fitz  # PyMuPDF
+        bloques = []
+        with fitz.open(pdf_path) as doc:
+            print(f"El documento tiene {len(doc)} páginas.")
+            boilerplate = self._detect_boilerplate(doc)
+            for page in doc.pages(0, min(len(doc), max_pages)):
+                bloques.extend(_page_lines(page, boilerplate))
+        return split_passages(bloques)
+
+    def extract_salient_text(self, pdf_path: str, max_chars: int = None, max_tokens: int = None) -> str:
+        """
+        Como extract_text con presupuesto, pero en lugar de quedarse con el
+        principio del documento elige los pasajes más relevantes de todo
+        él (títulos y frases centrales, ver salience.score_passages) hasta
+        llenar el presupuesto, y los une en el orden original.
+
+        Si el documento entero cabe en el presupuesto, se devuelve completo.
+
+        Returns:
+            El texto seleccionado, o un string vacío si ocurre un error.
+        """
+        budget = self._budget_in_chars(max_chars, max_tokens)
+        if budget is None:
+            return self.extract_text(pdf_path)
+
+        import fitz  # PyMuPDF
+        print(f"Iniciando extracción por relevancia desde: {pdf_path}")
+        with metrics.span("pdf.extract_salient_text", budget=budget) as attrs:
+            try:
+                cache_key = None
+                if self.cache is not None:
+                    cache_key = make_key("pdf_salient_text", EXTRACTOR_VERSION, file_hash(pdf_path), budget,
+                                         self.strip_boilerplate)
+                    cached_text = self.cache.get(cache_key)
+                    if cached_text is not None:
+                        print(f"Texto recuperado de la caché. Total de caracteres: {len(cached_text)}")
+                        attrs.update(cached=True, chars=len(cached_text))
+                        return cached_text
+
+                with _fitz_lock:
+                    pasajes = self.extract_passages(pdf_path)
+                texto = select_text(pasajes, budget)
+                total = sum(len(t) + 1 for t, _ in pasajes)
+                if total <= budget:
+                    print(f"Extracción completada. Total de caracteres: {len(texto)}")
+                else:
+                    print(f"Seleccionados los pasajes más relevantes: {len(texto)} de {total} caracteres.")
+                attrs.update(cached=False, passages=len(pasajes), document_chars=total, chars=len(texto),
+                             headings=sum(1 for _, h in pasajes if h))
+
+                if cache_key is not None and texto:
+                    self.cache.put(cache_key, texto)
+                return texto
+
+            except (fitz.EmptyFileError, fitz.FileDataError) as e:
+                print(f"Error: El archivo PDF en '{pdf_path}' está vacío o dañado: {e}", file=sys.stderr)
+                attrs["error"] = type(e).__name__
+                return ""
+            except Exception as e:
+                print(f"Error inesperado al procesar PDF: {e}", file=sys.stderr)
+                attrs["error"] = type(e).__name__
+                return ""
+
+    def page_fingerprints(self, pdf_path: str) -> list:
+        """
+        Huella de cada página del PDF (ver page_fingerprint), en orden.
+
+        Raises:
+            Las excepciones de fitz al abrir o leer el documento.
+        """
+        import fitz  # PyMuPDF
+        with metrics.span("pdf.page_fingerprints") as attrs, _fitz_lock:
             with fitz.open(pdf_path) as doc:
-                print(f"El documento tiene {len(doc)} páginas.")
-                # Iterar sobre cada página
-                for i, page in enumerate(doc):
-                    # Extraer texto de la página
-                    text = page.get_text()
-                    if text:
-                        full_text += text + "\n" # Añadir un salto de línea entre páginas
-                
-            print(f"Extracción completada. Total de caracteres: {len(full_text)}")
-            
-            # Opcional: Limpieza simple del texto
-            full_text = ' '.join(full_text.split()) # Normalizar espacios en blanco
-            
-            return full_text
-
-        except fitz.errors.EmptyFileError:
-            print(f"Error: El archivo PDF en '{pdf_path}' está vacío.", file=sys.stderr)
-            return ""
-        except fitz.errors.FileDataError:
-             print(f"Error: El archivo PDF en '{pdf_path}' está dañado o mal formado.", file=sys.stderr)
-             return ""
-        except Exception as e:
-            # Capturar cualquier otro error inesperado
-            print(f"Error inesperado al procesar PDF: {e}", file=sys.stderr)
-            return ""
\ No newline at end of file
+                huellas = [page_fingerprint(page) for page in doc]
+            attrs["pages"] = len(huellas)
+        return huellas
+
+    def read_page_states(self, pdf_path: str) -> tuple:
+        """
+        Huellas y bloques de líneas de todas las páginas (lo que guarda
+        incremental con cada presentación) en una sola pasada. Pensado para
+        hacerse en segundo plano: el cerrojo de fitz se suelta entre página
+        y página, así que no detiene las extracciones de otros trabajos.
+
+        Returns:
+            La tupla (huellas, boilerplate, {índice: bloques}), como
+            page_fingerprints y extract_page_blocks.
+
+        Raises:
+            Las excepciones de fitz al abrir o leer el documento.
+        """
+        import fitz  # PyMuPDF
+        with metrics.span("pdf.read_page_states") as attrs:
+            with _fitz_lock:
+                doc = fitz.open(pdf_path)
+            try:
+                with _fitz_lock:
+                    boilerplate = self._detect_boilerplate(doc)
+                    page_count = len(doc)
+                huellas, bloques = [], {}
+                for i in range(page_count):
+                    with _fitz_lock:
+                        page = doc[i]
+                        huellas.append(page_fingerprint(page))
+                        bloques[i] = _page_lines(page, boilerplate)
+            finally:
+                with _fitz_lock:
+                    doc.close()
+            attrs["pages"] = page_count
+        return huellas, boilerplate, bloques
+
+    def extract_page_blocks(self, pdf_path: str, pages=None) -> tuple:
+        """
+        Extrae solo las páginas indicadas como bloques de líneas (ver
+        _page_lines), para combinarlas con las de una extracción anterior.
+
+        Args:
+            pdf_path: La ruta al archivo PDF.
+            pages: Índices (desde 0) de las páginas a extraer (None = todas).
+
+        Returns:
+            La tupla (boilerplate, {índice: bloques}); 'boilerplate' son
+            las firmas descartadas, que deben coincidir con las de la
+            extracción anterior para poder mezclar páginas de ambas.
+
+        Raises:
+            Las excepciones de fitz al abrir o leer el documento.
+        """
+        import fitz  # PyMuPDF
+        with metrics.span("pdf.extract_page_blocks") as attrs, _fitz_lock:
+            with fitz.open(pdf_path) as doc:
+                boilerplate = self._detect_boilerplate(doc)
+                indices = range(len(doc)) if pages is None else pages
+                bloques = {i: _page_lines(doc[i], boilerplate) for i in indices}
+            attrs["pages"] = len(bloques)
+        metrics.count("pdf.pages_extracted", len(bloques))
+        return boilerplate, bloques
+
+    def extract_figures(self, pdf_path: str, max_figures: int = FIGURE_MAX_COUNT, workers: int = None) -> list:
+        """
+        Extrae las figuras del PDF (imágenes incrustadas, sin repetidas ni
+        logotipos; ver FIGURE_*), reducidas y recodificadas para ponerlas
+        en una diapositiva. Si hay más de 'max_figures', se quedan las más
+        grandes.
+
+        Args:
+            pdf_path: La ruta al archivo PDF.
+            max_figures: Máximo de figuras a devolver.
+            workers: Procesos para recodificar (None = número de CPUs).
+
+        Returns:
+            Lista de figuras en el orden del documento, cada una un
+            diccionario con "page" (índice desde 0), "xref", "hash" (del
+            contenido original), "width", "height", "mime" y "data" (los
+            bytes de la imagen). Lista vacía si no hay o si ocurre un error.
+        """
+        import fitz  # PyMuPDF
+        with metrics.span("pdf.extract_figures") as attrs:
+            try:
+                with _fitz_lock:
+                    candidatos, paginas = self._figure_candidates(pdf_path)
+                attrs.update(pages=paginas, candidates=len(candidatos))
+                if len(candidatos) > max_figures:
+                    grandes = sorted(candidatos, key=lambda c: c["width"] * c["height"], reverse=True)
+                    elegidos = {id(c) for c in grandes[:max_figures]}
+                    candidatos = [c for c in candidatos if id(c) in elegidos]
+
+                workers = min(workers or os.cpu_count() or 1, -(-len(candidatos) // FIGURE_BATCH_SIZE))
+                if workers < 2 or len(candidatos) < FIGURE_PARALLEL_MIN:
+                    with _fitz_lock:
+                        figuras = _encode_figures(pdf_path, candidatos)
+                else:
+                    lotes = [candidatos[i:i + FIGURE_BATCH_SIZE]
+                             for i in range(0, len(candidatos), FIGURE_BATCH_SIZE)]
+                    # Solo viajan entre procesos los candidatos y las imágenes ya reducidas
+                    with ProcessPoolExecutor(max_workers=workers) as pool:
+                        figuras = [f for lote in pool.map(_encode_figures, [pdf_path] * len(lotes), lotes)
+                                   for f in lote]
+                figuras = [f for f in figuras if f is not None]
+                attrs.update(figures=len(figuras), bytes=sum(len(f["data"]) for f in figuras))
+                metrics.count("pdf.figures", len(figuras))
+                print(f"Figuras extraídas: {len(figuras)}.")
+                return figuras
+
+            except (fitz.EmptyFileError, fitz.FileDataError) as e:
+                print(f"Error: El archivo PDF en '{pdf_path}' está vacío o dañado: {e}", file=sys.stderr)
+                attrs["error"] = type(e).__name__
+                return []
+            except Exception as e:
+                print(f"Error inesperado al extraer figuras: {e}", file=sys.stderr)
+                attrs["error"] = type(e).__name__
+                return []
+
+    def _figure_candidates(self, pdf_path: str) -> tuple:
+        """
+        Imágenes del PDF que pueden ser figuras, sin repetidas: una por
+        xref (con la primera página en que aparece) y una por contenido
+        (hash del stream sin decodificar). Devuelve (candidatos, páginas).
+        """
+        import fitz  # PyMuPDF
+        with fitz.open(pdf_path) as doc:
+            por_xref = {}
+            apariciones = Counter()
+            for numero, page in enumerate(doc):
+                for xref, smask, width, height, *_ in page.get_images(full=True):
+                    if width < FIGURE_MIN_SIDE or height < FIGURE_MIN_SIDE:
+                        continue
+                    apariciones[xref] += 1
+                    por_xref.setdefault(xref, {"xref": xref, "smask": smask, "page": numero,
+                                               "width": width, "height": height})
+
+            repetidas = set()
+            if self.strip_boilerplate:
+                minimo = max(BOILERPLATE_MIN_PAGES, BOILERPLATE_MIN_RATIO * len(doc))
+                repetidas = {xref for xref, n in apariciones.items() if n >= minimo}
+                if repetidas:
+                    print(f"Se omiten {len(repetidas)} imágenes repetidas en muchas páginas (logotipos).")
+
+            candidatos = []
+            vistos = set()
+            for xref, candidato in por_xref.items():
+                if xref in repetidas:
+                    continue
+                # El mismo contenido puede estar incrustado con varios xref
+                huella = hashlib.sha1(doc.xref_stream_raw(xref) or b"").hexdigest()
+                if huella in vistos:
+                    continue
+                vistos.add(huella)
+                candidatos.append(dict(candidato, hash=huella))
+            return candidatos, len(doc)
+
+    def _detect_boilerplate(self, doc) -> frozenset:
+        """detect_boilerplate si está activado (vacío si no), con su aviso y métrica."""
+        if not self.strip_boilerplate:
+            return frozenset()
+        boilerplate = detect_boilerplate(doc)
+        if boilerplate:
+            print(f"Se omiten {len(boilerplate)} encabezados/pies de página repetidos.")
+            metrics.count("pdf.boilerplate_blocks", len(boilerplate))
+        return boilerplate
+
+    def _budget_in_chars(self, max_chars, max_tokens):
+        """Combina los presupuestos de caracteres y tokens en uno solo (en caracteres)."""
+        limits = []
+        if max_chars is not None:
+            limits.append(max_chars)
+        if max_tokens is not None:
+            limits.append(max_tokens * CHARS_PER_TOKEN)
+        return min(limits) if limits else None
@@ -0,0 +1,358 @@
+"""
+Planificador de etapas con dependencias para el proceso PDF → presentación.
+
+Cada etapa es una función que recibe un diccionario con los resultados de
+las etapas de las que depende. En cuanto todas sus dependencias terminan,
+la etapa se lanza en un pool de hilos, así que las etapas independientes
+(p. ej. autenticar y extraer el texto) se solapan en el tiempo.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+import incremental
+import metrics
+import pptx_writer
+
+# Cada cuánto comprueba run() si se ha pedido cancelar
+CANCEL_POLL_SECONDS = 0.2
+
+# Etapas (y el aviso de cancelación, "pipeline") cuyo fallo deja a 'fill'
+# sin más eventos que esperar
+ETAPAS_DE_FILL = ("pipeline", "extract", "authenticate", "generate", "create_shell")
+
+
+class StageError(Exception):
+    """Error esperado en una etapa (p. ej. 'el PDF no tiene texto')."""
+
+
+class PipelineError(Exception):
+    """Se lanza desde Pipeline.run() cuando alguna etapa falla."""
+
+    def __init__(self, stage, error):
+        super().__init__(f"La etapa '{stage}' falló: {error}")
+        self.stage = stage
+        self.error = error
+
+
+class PipelineCancelled(PipelineError):
+    """Se lanza desde Pipeline.run() cuando se cancela la ejecución."""
+
+    def __init__(self):
+        Exception.__init__(self, "Proceso cancelado.")
+        self.stage = None
+        self.error = "Proceso cancelado."
+
+
+def _run_in_daemon_thread(func, *args):
+    """
+    Ejecuta func(*args) en un hilo 'daemon' propio y devuelve su Future.
+    (Los hilos de ThreadPoolExecutor se esperan al cerrar el programa, y
+    una etapa cancelada puede estar bloqueada en una llamada de red.)
+    """
+    futuro = Future()
+
+    def correr():
+        if not futuro.set_running_or_notify_cancel():
+            return
+        try:
+            futuro.set_result(func(*args))
+        except BaseException as e:
+            futuro.set_exception(e)
+
+    threading.Thread(target=correr, name="autoslides-stage", daemon=True).start()
+    return futuro
+
+
+class Pipeline:
+    """
+    Grafo de etapas con dependencias.
+
+    Uso:
+        p = Pipeline()
+        p.add_stage("a", lambda deps: 1)
+        p.add_stage("b", lambda deps: deps["a"] + 1, depends_on=["a"])
+        resultados = p.run()
+
+    Tras run(), 'timings' contiene para cada etapa ejecutada sus instantes
+    de inicio y fin (segundos desde el comienzo de run()), lo que permite
+    comprobar qué etapas se solaparon.
+    """
+
+    def __init__(self, on_event=None, should_cancel=None):
+        """
+        Args:
+            on_event: Función opcional llamada como on_event(etapa, evento,
+                segundos) con evento "start", "end" o "error". Si se cancela,
+                se emite on_event("pipeline", "cancel", segundos).
+            should_cancel: Función opcional sin argumentos; si devuelve True
+                no se lanzan más etapas y run() termina con PipelineCancelled
+                (las etapas en marcha deben comprobarla por su cuenta).
+        """
+        self.stages = {}
+        self.cleanups = {}
+        self.on_event = on_event
+        self.should_cancel = should_cancel
+        self.timings = {}
+
+    def add_stage(self, name, func, depends_on=(), cleanup=None):
+        """
+        Registra una etapa. Las dependencias deben estar ya registradas.
+
+        'cleanup', si se da, se llama como cleanup(resultado) cuando la
+        etapa terminó bien pero run() falla o se cancela (aunque la etapa
+        acabe después). Puede devolver un aviso, que se añade al mensaje
+        del error (o se imprime, si run() ya terminó).
+        """
+        for dep in depends_on:
+            if dep not in self.stages:
+                raise ValueError(f"La etapa '{name}' depende de '{dep}', que no existe.")
+        self.stages[name] = (func, tuple(depends_on))
+        if cleanup:
+            self.cleanups[name] = cleanup
+
+    def run(self):
+        """
+        Ejecuta todas las etapas respetando sus dependencias.
+
+        Returns:
+            Diccionario etapa → resultado.
+
+        Raises:
+            PipelineError: si una etapa lanza una excepción. Las etapas que
+                ya estaban en marcha terminan, pero no se lanzan más.
+            PipelineCancelled: si should_cancel() devuelve True. No se
+                espera a las etapas en marcha (cada una en su hilo
+                'daemon'): las que consultan should_cancel lo dejan solas,
+                y el resto no impide cerrar el programa.
+        """
+        self.timings = {}
+        inicio = time.perf_counter()
+        resultados = {}
+        pendientes = dict(self.stages)
+        en_marcha = {}
+        fallo = None
+
+        def ejecutar(name, func, deps):
+            self.timings[name] = {"start": round(time.perf_counter() - inicio, 4)}
+            self._emit(name, "start", self.timings[name]["start"])
+            try:
+                with metrics.span(f"stage.{name}"):
+                    return func({dep: resultados[dep] for dep in deps})
+            finally:
+                self.timings[name]["end"] = round(time.perf_counter() - inicio, 4)
+
+        # Cada etapa en su propio hilo (como un pool con un hilo por etapa)
+        while pendientes or en_marcha:
+            if fallo is None and self.should_cancel and self.should_cancel():
+                fallo = PipelineCancelled()
+                self._emit("pipeline", "cancel", round(time.perf_counter() - inicio, 4))
+            if isinstance(fallo, PipelineCancelled):
+                break
+            if fallo is None:
+                listas = [n for n, (_, deps) in pendientes.items() if all(d in resultados for d in deps)]
+                for name in listas:
+                    func, deps = pendientes.pop(name)
+                    # bind(): la etapa se registra en la ejecución de métricas en curso
+                    en_marcha[_run_in_daemon_thread(metrics.bind(ejecutar), name, func, deps)] = name
+            if not en_marcha:
+                break
+
+            # Con cancelación, despertar de vez en cuando para comprobarla
+            timeout = CANCEL_POLL_SECONDS if self.should_cancel and fallo is None else None
+            hechos, _ = wait(en_marcha, timeout=timeout, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                name = en_marcha.pop(futuro)
+                try:
+                    resultados[name] = futuro.result()
+                    self._emit(name, "end", self.timings[name]["end"])
+                except Exception as e:
+                    self._emit(name, "error", self.timings[name]["end"])
+                    if fallo is None:
+                        fallo = PipelineError(name, e)
+
+        if fallo is not None:
+            avisos = [self._cleanup(name, resultados[name]) for name in self.cleanups if name in resultados]
+            # Las etapas que siguen en marcha (tras cancelar) se limpian al acabar
+            for futuro, name in en_marcha.items():
+                if name in self.cleanups:
+                    futuro.add_done_callback(lambda f, n=name: self._cleanup_late(n, f))
+            avisos = [a for a in avisos if a]
+            if avisos:
+                fallo.error = f"{fallo.error} {' '.join(avisos)}"
+                fallo.args = (f"{fallo.args[0]} {' '.join(avisos)}",)
+            raise fallo
+        return resultados
+
+    def _cleanup(self, name, resultado):
+        """Llama al cleanup de la etapa 'name'; sus errores solo se avisan."""
+        try:
+            return self.cleanups[name](resultado)
+        except Exception as e:
+            print(f"Error al deshacer la etapa '{name}': {e}")
+            return None
+
+    def _cleanup_late(self, name, futuro):
+        if futuro.cancelled() or futuro.exception():
+            return
+        aviso = self._cleanup(name, futuro.result())
+        if aviso:
+            print(f"Aviso: {aviso}")
+
+    def _emit(self, name, evento, segundos):
+        if self.on_event:
+            self.on_event(name, evento, segundos)
+
+
+def build_autoslides_pipeline(pdf_processor, slide_generator, pdf_path, max_chars=None,
+                              use_cache=True, map_reduce=False, on_event=None, on_slide=None,
+                              should_cancel=None, pptx_path=None, figures=False, deck_store=None):
+    """
+    Construye el grafo del proceso completo de AutoSlides:
+
+        extract ─────────┐
+                         ├─> generate ──(eventos)──┐
+        authenticate ────┤                         ├─> fill
+                         └─> create_shell ─────────┘
+
+    - 'extract' y 'authenticate' (que incluye construir el servicio de
+      Slides) no dependen entre sí y se ejecutan a la vez.
+    - 'create_shell' crea la presentación vacía mientras 'generate' espera
+      a la IA.
+    - 'generate' lee la respuesta en streaming y reenvía cada evento a una
+      cola; 'fill' solo espera a la presentación y va añadiendo las
+      diapositivas desde esa cola según llegan.
+
+    El resultado de 'fill' es la tupla (presentation, ai_data).
+
+    Con 'pptx_path' no se usa Google Slides: en lugar de 'create_shell' y
+    'fill', la etapa 'write_pptx' escribe la presentación en ese archivo
+    en cuanto 'generate' termina, y su resultado es (ruta, ai_data).
+
+    Con figures=True (solo junto con 'pptx_path'), la etapa
+    'extract_figures' saca las figuras del PDF a la vez que las demás y
+    'write_pptx' las pone en las diapositivas. En Google Slides no se
+    pueden poner: createImage solo acepta URLs públicas, no bytes.
+
+    Con 'deck_store' (un incremental.DeckStore) y Google Slides, la etapa
+    'record_deck' lee las huellas y el texto de cada página cuando 'fill'
+    ya ha terminado (fuera del camino de la presentación) y guarda su
+    registro, para poder actualizarla después (ver incremental.update_deck).
+    No puede hacer fallar el proceso: si algo sale mal, solo se avisa en
+    la consola.
+
+    Con 'should_cancel', además de no lanzar más etapas, 'generate' deja de
+    leer la respuesta de la IA en cuanto se cancela.
+
+    Si el proceso falla o se cancela después de 'create_shell', la
+    presentación vacía (o a medias) no se borra, pero su URL se añade al
+    mensaje del error (o a la consola, si se creó tras cancelar).
+    """
+    eventos = queue.Queue()
+
+    def on_stage_event(name, evento, segundos):
+        if evento in ("error", "cancel") and name in ETAPAS_DE_FILL:
+            # Si falla o se cancela algo de lo que depende, 'fill' no debe
+            # quedarse esperando eventos (las etapas opcionales no cuentan)
+            eventos.put(("fin", None))
+        if on_event:
+            on_event(name, evento, segundos)
+
+    pipeline = Pipeline(on_event=on_stage_event, should_cancel=should_cancel)
+
+    def extract(_):
+        if max_chars is None:
+            texto_pdf = pdf_processor.extract_text(pdf_path, parallel=True)
+        else:
+            # Los pasajes más relevantes de todo el documento, no solo el principio
+            texto_pdf = pdf_processor.extract_salient_text(pdf_path, max_chars=max_chars)
+        if not texto_pdf or texto_pdf.isspace():
+            raise StageError("No se pudo extraer texto del PDF. ¿Está vacío o es una imagen?")
+        return texto_pdf
+
+    def authenticate(_):
+        if not slide_generator.authenticate():
+            raise StageError("Error de autenticación. Revisa la terminal.")
+        return True
+
+    def create_shell(_):
+        nombre = os.path.splitext(os.path.basename(pdf_path))[0]
+        presentacion = slide_generator.create_presentation_shell(nombre)
+        if not presentacion:
+            raise StageError("No se pudo crear la presentación en Google Slides.")
+        return presentacion
+
+    def discard_shell(presentacion):
+        # Borrarla necesitaría permisos de Drive (solo se pide el de Slides):
+        # al menos se dice dónde quedó
+        url = presentacion.get("presentationUrl") or presentacion.get("presentationId")
+        return f"La presentación quedó vacía o incompleta en {url} (puedes borrarla)."
+
+    def generate(deps):
+        ai_data = None
+        try:
+            for evento in slide_generator.stream_presentation_content(
+                deps["extract"], use_cache=use_cache, map_reduce=map_reduce
+            ):
+                if should_cancel and should_cancel():
+                    raise StageError("Proceso cancelado.")
+                eventos.put(evento)
+                if evento[0] == "fin":
+                    ai_data = evento[1]
+        finally:
+            if ai_data is None:
+                # Desbloquear a 'fill' aunque la generación falle
+                eventos.put(("fin", None))
+        if not ai_data:
+            raise StageError("La API de IA no devolvió contenido.")
+        return ai_data
+
+    def fill(deps):
+        presentacion = deps["create_shell"]
+        ai_data = slide_generator.append_slides_from_events(
+            presentacion, iter(eventos.get, None), on_slide
+        )
+        if not ai_data:
+            raise StageError("No se pudieron añadir las diapositivas.")
+        return presentacion, ai_data
+
+    def extract_figures(_):
+        return pdf_processor.extract_figures(pdf_path)
+
+    def write_pptx(deps):
+        ruta = pptx_writer.write_presentation(deps["generate"], pptx_path, deps.get("extract_figures"))
+        if not ruta:
+            raise StageError("No se pudo guardar el archivo .pptx.")
+        return ruta, deps["generate"]
+
+    def record_deck(deps):
+        presentacion, ai_data = deps["fill"]
+        try:
+            guardado = incremental.record_new_deck(pdf_path, pdf_processor, deck_store, presentacion, ai_data)
+        except Exception as e:
+            print(f"Error al guardar el estado de la presentación: {e}")
+            guardado = False
+        if not guardado:
+            print("Aviso: No se guardó el estado de la presentación; no se podrá actualizar.")
+        return guardado
+
+    if figures and not pptx_path:
+        raise ValueError("Las figuras solo se pueden incluir en el archivo .pptx.")
+
+    pipeline.add_stage("extract", extract)
+    pipeline.add_stage("authenticate", authenticate)
+    pipeline.add_stage("generate", generate, depends_on=["extract", "authenticate"])
+    if pptx_path:
+        figuras = []
+        if figures:
+            pipeline.add_stage("extract_figures", extract_figures)
+            figuras = ["extract_figures"]
+        pipeline.add_stage("write_pptx", write_pptx, depends_on=["generate"] + figuras)
+    else:
+        pipeline.add_stage("create_shell", create_shell, depends_on=["authenticate"], cleanup=discard_shell)
+        pipeline.add_stage("fill", fill, depends_on=["create_shell"])
+        if deck_store is not None:
+            pipeline.add_stage("record_deck", record_deck, depends_on=["fill"])
+    return pipeline
@@ -0,0 +1,106 @@
+"""
+Salida local: escribe la presentación en un archivo .pptx en disco.
+
+Alternativa a SlideGenerator.create_presentation para quien solo necesita
+descargar el archivo: usa la misma estructura de la IA
+(titulo_presentacion / puntos_clave) y los diseños equivalentes a los de
+Google Slides (TITLE_SLIDE y TITLE_AND_BODY), pero sin red, sin cuotas y
+en milisegundos.
+
+Necesita python-pptx, que se importa al escribir el primer archivo.
+"""
+import io
+import os
+import tempfile
+
+import metrics
+
+# Diseños de la plantilla por defecto de python-pptx equivalentes a los
+# 'predefinedLayout' que usamos en Google Slides
+LAYOUT_TITULO = 0              # "Title Slide"      ≈ TITLE_SLIDE
+LAYOUT_TITULO_Y_CUERPO = 1     # "Title and Content" ≈ TITLE_AND_BODY
+
+# Con figura, el cuerpo ocupa FIGURA_ANCHO_TEXTO del ancho y la figura se
+# ajusta (sin deformarla) al hueco de la derecha
+FIGURA_ANCHO_TEXTO = 0.55
+FIGURA_MARGEN = 0.04           # Fracción del ancho de la diapositiva
+
+
+def default_output_path(pdf_path, output_dir=None):
+    """Ruta del .pptx de un PDF: mismo nombre, junto al PDF o en 'output_dir'."""
+    nombre = os.path.splitext(os.path.basename(pdf_path))[0] + ".pptx"
+    return os.path.join(output_dir or os.path.dirname(os.path.abspath(pdf_path)), nombre)
+
+
+def _place_figure(slide, cuerpo, figura, ancho, alto):
+    """Estrecha el cuerpo de la diapositiva y pone 'figura' a su derecha."""
+    margen = int(ancho * FIGURA_MARGEN)
+    # El cuerpo hereda su posición del diseño: al cambiar el ancho hay que
+    # fijar también el resto, o quedarían a 0
+    izquierda, arriba, alto_cuerpo = cuerpo.left, cuerpo.top, cuerpo.height
+    cuerpo.left, cuerpo.top, cuerpo.height = izquierda, arriba, alto_cuerpo
+    cuerpo.width = int(ancho * FIGURA_ANCHO_TEXTO) - izquierda
+    izquierda = int(ancho * FIGURA_ANCHO_TEXTO) + margen
+    hueco_ancho = ancho - izquierda - margen
+    hueco_alto = alto - cuerpo.top - margen
+    escala = min(hueco_ancho / figura["width"], hueco_alto / figura["height"])
+    w, h = int(figura["width"] * escala), int(figura["height"] * escala)
+    slide.shapes.add_picture(io.BytesIO(figura["data"]), izquierda + (hueco_ancho - w) // 2,
+                             cuerpo.top + (hueco_alto - h) // 2, w, h)
+
+
+def write_presentation(ai_data, output_path, figures=None):
+    """
+    Escribe la presentación de 'ai_data' en 'output_path'. Si se pasan
+    'figures' (ver PDFProcessor.extract_figures), la primera va en la
+    primera diapositiva de contenido, la segunda en la segunda, etc.
+
+    Returns:
+        La ruta absoluta del archivo escrito, o None si falla (el detalle
+        se imprime en la consola).
+    """
+    try:
+        from pptx import Presentation
+    except ImportError:
+        print("Error: Para guardar en .pptx hace falta instalar python-pptx.")
+        return None
+
+    try:
+        with metrics.span("pptx.write", slides=len(ai_data["puntos_clave"]) + 1) as attrs:
+            prs = Presentation()
+
+            # Diapositiva de título (el subtítulo queda vacío, como en Slides)
+            slide = prs.slides.add_slide(prs.slide_layouts[LAYOUT_TITULO])
+            slide.shapes.title.text = ai_data["titulo_presentacion"]
+
+            # Una diapositiva de título y cuerpo por cada punto clave
+            figuras = list(figures or [])
+            for i, punto in enumerate(ai_data["puntos_clave"]):
+                slide = prs.slides.add_slide(prs.slide_layouts[LAYOUT_TITULO_Y_CUERPO])
+                slide.shapes.title.text = punto["titulo_diapositiva"]
+                slide.placeholders[1].text = punto["contenido_diapositiva"]
+                if i < len(figuras):
+                    _place_figure(slide, slide.placeholders[1], figuras[i], prs.slide_width, prs.slide_height)
+            attrs["figures"] = min(len(figuras), len(ai_data["puntos_clave"]))
+
+            output_path = os.path.abspath(output_path)
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            # Escritura atómica: un .pptx a medias no sustituye al anterior
+            # (temporal único: puede haber varios hilos escribiendo el mismo archivo)
+            fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(output_path))
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    prs.save(f)
+                os.replace(tmp_path, output_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            attrs["bytes"] = os.path.getsize(output_path)
+        print(f"Presentación guardada en: {output_path}")
+        return output_path
+    except (KeyError, TypeError) as e:
+        print(f"Error: el contenido de la IA no tiene el formato esperado: {e}")
+        return None
+    except OSError as e:
+        print(f"Error al guardar el archivo .pptx: {e}")
+        return None
@@ -0,0 +1,52 @@
+"""
+Canal de progreso entre los hilos de trabajo y la interfaz.
+
+Los hilos publican actualizaciones con publish(clave, valor) tantas veces
+como quieran; la interfaz llama a drain() a intervalos fijos (un "tic")
+y recibe solo el último valor de cada clave. Las actualizaciones que otra
+más reciente deja obsoletas (el progreso de un trabajo, el texto de la
+barra de estado...) se descartan sin llegar nunca al bucle de Tk, así que
+miles de eventos por segundo se quedan en unas pocas decenas de cambios
+en pantalla.
+
+No depende de Tk: cualquier consumidor que sondee periódicamente sirve.
+"""
+import threading
+
+
+class ProgressChannel:
+    """Últimas actualizaciones pendientes por clave, protegidas por un cerrojo."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.delivered = 0
+
+    def publish(self, key, value):
+        """Publica 'value' para 'key' (sustituye a lo pendiente para esa clave). Seguro entre hilos."""
+        with self._lock:
+            # Se saca y se vuelve a meter para que el orden de entrega
+            # sea el de la última publicación de cada clave
+            self._pending.pop(key, None)
+            self._pending[key] = value
+            self.published += 1
+
+    def drain(self):
+        """Devuelve (y vacía) las actualizaciones pendientes como lista de (clave, valor)."""
+        with self._lock:
+            if not self._pending:
+                return []
+            pendientes, self._pending = self._pending, {}
+            self.delivered += len(pendientes)
+        return list(pendientes.items())
+
+    def stats(self):
+        """Publicadas, entregadas y descartadas por obsoletas (para las métricas)."""
+        with self._lock:
+            pendientes = len(self._pending)
+            return {
+                "published": self.published,
+                "delivered": self.delivered,
+                "coalesced": self.published - self.delivered - pendientes,
+            }
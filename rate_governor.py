@@ -0,0 +1,199 @@
+"""
+Control de ritmo compartido para las llamadas a una API con cuota.
+
+Cada API (Vertex AI, Google Slides) tiene un ApiGovernor con dos partes:
+
+- Un TokenBucket: como mucho 'requests_per_minute' peticiones por minuto
+  (con ráfagas de hasta 'burst'). Cuando la API responde 429 con
+  Retry-After, se espera ese tiempo en TODOS los hilos, en lugar de que
+  cada uno reintente por su cuenta y provoque una tormenta de 429.
+- Un AdaptiveConcurrency (AIMD): el número de peticiones simultáneas
+  permitido sube poco a poco mientras todo va bien (+1 por cada 'límite'
+  peticiones correctas) y se reduce a la mitad ante un 429.
+
+Uso:
+    with governor.slot() as slot:
+        response = hacer_peticion()
+        if response.status_code == 429:
+            slot.throttled(retry_after)
+
+snapshot() devuelve los límites actuales, para inspeccionarlos.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+# Factor por el que se multiplica el límite de concurrencia ante un 429
+AIMD_BACKOFF_FACTOR = 0.5
+# Varios 429 seguidos (de peticiones que ya estaban en vuelo) cuentan como
+# una sola señal: tras reducir, no se vuelve a reducir durante este tiempo
+AIMD_DECREASE_INTERVAL = 2.0  # segundos
+
+
+class TokenBucket:
+    """
+    Cubo de fichas: 'rate' fichas por segundo hasta un máximo de 'capacity'.
+    reserve() aparta las fichas y dice cuánto hay que esperar para usarlas
+    (las fichas pueden quedar 'en deuda', así que las esperas se reparten
+    en orden de llegada).
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, ahora):
+        self.tokens = min(self.capacity, self.tokens + (ahora - self._updated) * self.rate)
+        self._updated = ahora
+
+    def reserve(self, n=1):
+        """Reserva 'n' fichas y devuelve los segundos que hay que esperar para usarlas."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._refill(ahora)
+            self.tokens -= n
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def drain(self):
+        """Vacía el cubo: tras un 429, lo acumulado no sirve (la cuota ya está agotada)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0)
+
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class AdaptiveConcurrency:
+    """Límite de peticiones simultáneas con aumento aditivo y reducción multiplicativa (AIMD)."""
+
+    def __init__(self, maximum, minimum=1, initial=None):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial or maximum)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= max(self.minimum, int(self.limit)):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if not throttled:
+                # +1 por cada 'limit' peticiones correctas (una "ventana")
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+    def decrease(self):
+        """Reduce el límite ante un 429 (como mucho una vez cada AIMD_DECREASE_INTERVAL)."""
+        with self._cond:
+            ahora = time.monotonic()
+            if ahora - self._last_decrease >= AIMD_DECREASE_INTERVAL:
+                self.limit = max(self.minimum, self.limit * AIMD_BACKOFF_FACTOR)
+                self._last_decrease = ahora
+
+
+class _Slot:
+    """Permiso para una petición; se marca con throttled() si la API respondió 429."""
+
+    def __init__(self):
+        self.was_throttled = False
+        self.retry_after = None
+
+    def throttled(self, retry_after=None):
+        self.was_throttled = True
+        self.retry_after = retry_after
+
+
+class ApiGovernor:
+    """Cubo de fichas + concurrencia adaptativa para una API (ver el docstring del módulo)."""
+
+    def __init__(self, name, requests_per_minute=None, burst=None, max_concurrency=16, min_concurrency=1):
+        """
+        Args:
+            name: Nombre de la API (para las métricas y snapshot()).
+            requests_per_minute: Cuota de peticiones por minuto (None = sin
+                límite fijo; solo se adapta la concurrencia).
+            burst: Peticiones que se pueden hacer de golpe (por defecto,
+                las de un minuto).
+            max_concurrency: Techo del límite de peticiones simultáneas.
+        """
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.bucket = None
+        if requests_per_minute:
+            self.bucket = TokenBucket(requests_per_minute / 60.0, burst or requests_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency)
+        self.throttled_count = 0
+        self.waited_seconds = 0.0
+        # Hasta cuándo no se hacen peticiones (Retry-After de un 429)
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, cost=1):
+        """
+        Espera turno (fichas y concurrencia) para una petición que cuenta
+        'cost' veces en la cuota (p. ej. una petición 'batch' con varias
+        llamadas). El límite se ajusta al salir según se marcara o no el
+        permiso con throttled().
+        """
+        inicio = time.monotonic()
+        self.concurrency.acquire()
+        permiso = _Slot()
+        try:
+            espera = self.bucket.reserve(cost) if self.bucket is not None else 0.0
+            espera = max(espera, self.paused_until - time.monotonic())
+            if espera > 0:
+                time.sleep(espera)
+            esperado = time.monotonic() - inicio
+            if esperado > 0.001:
+                with self._lock:
+                    self.waited_seconds += esperado
+                metrics.count(f"{self.name}.rate_wait_ms", round(esperado * 1000, 1))
+            yield permiso
+        finally:
+            # Primero la pausa y la reducción, para que nadie entre antes
+            if permiso.was_throttled:
+                self.on_throttled(permiso.retry_after)
+            self.concurrency.release(throttled=permiso.was_throttled)
+
+    def on_throttled(self, retry_after=None):
+        """Registra un 429 (también los que llegan dentro de una petición 'batch')."""
+        with self._lock:
+            self.throttled_count += 1
+        metrics.count(f"{self.name}.throttled")
+        self.concurrency.decrease()
+        if self.bucket is not None:
+            self.bucket.drain()
+        if retry_after:
+            with self._lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+
+    def snapshot(self):
+        """Límites y contadores actuales (serializable en JSON)."""
+        concurrencia = self.concurrency
+        datos = {
+            "requests_per_minute": self.requests_per_minute,
+            "concurrency_limit": round(concurrencia.limit, 2),
+            "max_concurrency": concurrencia.maximum,
+            "in_flight": concurrencia.in_flight,
+            "throttled": self.throttled_count,
+            "waited_seconds": round(self.waited_seconds, 3),
+        }
+        datos["paused_for"] = round(max(0.0, self.paused_until - time.monotonic()), 3)
+        if self.bucket is not None:
+            datos["tokens"] = round(self.bucket.available(), 2)
+        return datos
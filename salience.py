@@ -0,0 +1,172 @@
+"""
+Selección por relevancia del texto que cabe en el prompt.
+
+En lugar de quedarse con los primeros N caracteres del documento, se
+puntúa cada pasaje (frase o título) y se eligen los mejores hasta llenar
+el presupuesto, respetando después el orden original. Así una única
+petición de tamaño fijo cubre todo el documento.
+
+La puntuación es la centralidad de cada pasaje en un espacio TF-IDF: la
+suma de sus similitudes coseno con todos los demás pasajes. Con los
+vectores normalizados esa suma es el producto escalar con el vector suma
+del documento, así que se calcula en una sola pasada con NumPy
+(O(pasajes × vocabulario), sin la matriz de similitudes completa).
+
+Para no llenar el presupuesto con frases casi iguales sobre el tema
+dominante, la selección penaliza el parecido con lo ya elegido (MMR,
+Maximal Marginal Relevance), y los títulos tienen reservada una parte del
+presupuesto para que quede la estructura de todo el documento.
+"""
+import re
+
+# Tamaño máximo del vocabulario (los términos más frecuentes en pasajes):
+# acota la matriz TF-IDF (float32: ~8 KB por pasaje) en documentos muy largos
+MAX_VOCAB = 2000
+
+# Los términos que aparecen en más de esta fracción de pasajes no
+# distinguen nada y se ignoran
+MAX_DOC_FREQ = 0.5
+
+# Fracción del presupuesto reservada a los títulos (detectados por tamaño de letra)
+HEADINGS_BUDGET_RATIO = 0.15
+
+# Bonificación de los primeros pasajes (suelen resumir el documento)
+LEAD_PASSAGES = 5
+LEAD_BONUS = 1.2
+
+# Peso de la penalización por parecido con lo ya elegido (0 = sin MMR)
+MMR_LAMBDA = 0.7
+
+STOPWORDS = frozenset("""
+de la que el en y a los del se las por un para con no una su al lo como más
+pero sus le ya o este sí porque esta entre cuando muy sin sobre también me
+hasta hay donde quien desde todo nos durante todos uno les ni contra otros
+ese eso ante ellos e esto mí antes algunos qué unos yo otro otras otra él
+tanto esa estos mucho quienes nada muchos cual poco ella estar estas algunas
+algo nosotros son ser está han fue tiene puede cada así dos
+the of and to in is for on that with as are by this be from or at an it
+""".split())
+
+_WORD_RE = re.compile(r"[^\W\d_]{3,}")
+
+
+def tokenize(text):
+    """Palabras (de 3 letras o más, en minúsculas) sin palabras vacías."""
+    return [w for w in _WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+def tfidf_matrix(textos):
+    """
+    Matriz TF-IDF (pasajes × vocabulario) con las filas normalizadas
+    (norma L2 = 1, o 0 si el pasaje no tiene términos del vocabulario).
+    Devuelve None si no hay vocabulario útil.
+    """
+    import numpy as np
+    tokens = [tokenize(t) for t in textos]
+    # Frecuencia documental: en cuántos pasajes aparece cada término
+    df = {}
+    for palabras in tokens:
+        for w in set(palabras):
+            df[w] = df.get(w, 0) + 1
+    n = len(textos)
+    candidatos = [w for w, f in df.items() if 2 <= f <= MAX_DOC_FREQ * n]
+    candidatos.sort(key=lambda w: df[w], reverse=True)
+    vocab = {w: j for j, w in enumerate(candidatos[:MAX_VOCAB])}
+    if not vocab:
+        return None
+
+    # Matriz TF, rellenada de una vez a partir de los índices (fila, columna)
+    filas, columnas = [], []
+    for i, palabras in enumerate(tokens):
+        for w in palabras:
+            j = vocab.get(w)
+            if j is not None:
+                filas.append(i)
+                columnas.append(j)
+    tf = np.zeros((n, len(vocab)), dtype=np.float32)
+    np.add.at(tf, (np.array(filas, dtype=np.intp), np.array(columnas, dtype=np.intp)), 1.0)
+
+    idf = np.log(n / np.array(list(df[w] for w in vocab), dtype=np.float32)) + 1.0
+    matriz = np.log1p(tf) * idf
+    matriz /= np.maximum(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-9)
+    return matriz
+
+
+def centrality(matriz):
+    """Similitud coseno media de cada pasaje con todos los demás."""
+    import numpy as np
+    n = matriz.shape[0]
+    propia = (matriz * matriz).sum(axis=1)  # 1, o 0 para filas vacías
+    return np.maximum(matriz @ matriz.sum(axis=0) - propia, 0.0) / max(n - 1, 1)
+
+
+def render_passage(texto, titulo):
+    """Cómo aparece un pasaje en el prompt (los títulos, en su propia línea)."""
+    return f"\n## {texto}\n" if titulo else texto
+
+
+def select_passages(pasajes, budget):
+    """
+    Elige los pasajes más relevantes que caben en 'budget' caracteres y
+    los une en el orden del documento.
+
+    Args:
+        pasajes: Lista de tuplas (texto, es_titulo), en orden.
+        budget: Máximo de caracteres del resultado.
+
+    Returns:
+        El texto resultante. Sin NumPy (o sin vocabulario útil) se toman
+        los pasajes desde el principio, como hasta ahora.
+    """
+    costes = [len(render_passage(*p)) + 1 for p in pasajes]  # +1: el espacio que los separa
+    try:
+        import numpy as np
+    except ImportError:
+        print("Aviso: NumPy no está instalado; se usa el principio del documento.")
+        matriz = None
+    else:
+        matriz = tfidf_matrix([t for t, _ in pasajes])
+
+    if matriz is None:
+        elegidos, usados = [], 0
+        for i, coste in enumerate(costes):
+            if usados + coste > budget:
+                break
+            elegidos.append(i)
+            usados += coste
+        return _join(pasajes, elegidos, budget)
+
+    relevancia = centrality(matriz)
+    relevancia[:LEAD_PASSAGES] *= LEAD_BONUS
+    relevancia /= max(float(relevancia.max()), 1e-9)
+    coste = np.array(costes)
+    disponible = np.ones(len(pasajes), dtype=bool)
+    elegidos, usados = [], 0
+
+    # 1. Títulos (los más centrales primero) hasta su parte del presupuesto
+    titulos = [i for i, (_, es_titulo) in enumerate(pasajes) if es_titulo]
+    for i in sorted(titulos, key=lambda i: relevancia[i], reverse=True):
+        if usados + costes[i] <= budget * HEADINGS_BUDGET_RATIO:
+            elegidos.append(i)
+            usados += costes[i]
+    disponible[titulos] = False
+
+    # 2. Frases por MMR: relevancia menos el parecido con las frases ya elegidas
+    parecido = np.zeros(len(pasajes), dtype=np.float32)
+    while True:
+        disponible &= coste <= budget - usados
+        if not disponible.any():
+            break
+        puntuacion = np.where(disponible, relevancia - MMR_LAMBDA * parecido, -np.inf)
+        i = int(np.argmax(puntuacion))
+        elegidos.append(i)
+        usados += costes[i]
+        disponible[i] = False
+        parecido = np.maximum(parecido, matriz @ matriz[i])
+
+    return _join(pasajes, sorted(elegidos), budget)
+
+
+def _join(pasajes, elegidos, budget):
+    texto = " ".join(render_passage(*pasajes[i]) for i in elegidos)
+    return texto.strip()[:budget]
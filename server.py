@@ -0,0 +1,437 @@
+"""
+Modo servicio: un único proceso de AutoSlides, ya autenticado, compartido
+por un equipo a través de una API HTTP local.
+
+Uso:
+    python server.py --port 8765 --workers 4 --pdf-root /srv/documentos
+    python server.py --fake-google          # Contra servidores falsos (pruebas)
+
+API (JSON):
+    POST   /jobs                 Nuevo trabajo. Cuerpo JSON {"path": "...",
+                                 "map_reduce": false, "use_cache": true,
+                                 "output": "slides" | "pptx"} (las rutas deben
+                                 estar dentro de --pdf-root), o el PDF subido
+                                 tal cual (Content-Type: application/pdf) con
+                                 las opciones en la URL: /jobs?name=doc.pdf&output=pptx
+                                 → 202 {"id": ..., "status_url": ..., "result_url": ...}
+    GET    /jobs                 Todos los trabajos con su estado
+    GET    /jobs/<id>            Estado, etapa y progreso de un trabajo
+    GET    /jobs/<id>/result     Resultado (409 si aún no ha terminado)
+    GET    /jobs/<id>/file       El .pptx generado (solo con output=pptx)
+    DELETE /jobs/<id>            Cancela el trabajo
+    GET    /health               Estado del servicio (incluye 'job_retention_seconds')
+
+Todos los trabajos comparten el mismo PDFProcessor y el mismo
+SlideGenerator: una sola autenticación (con el token refrescado en
+segundo plano), una sola sesión HTTP con Vertex AI y las mismas cachés.
+Los trabajos se ejecutan en una JobQueue con un número acotado de hilos;
+el bucle asyncio solo atiende las peticiones HTTP.
+
+Para que el servicio no crezca sin límite, cada PDF subido se borra en
+cuanto su trabajo termina, y los trabajos terminados hace más de
+--retention segundos (JOB_RETENTION_SECONDS por defecto) se olvidan junto
+con su .pptx: después, sus URLs responden 404.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import uuid
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import incremental
+import metrics
+from disk_cache import CACHE_ROOT
+from job_queue import JobQueue, JobCancelled, COMPLETADO, ERROR, ESTADOS_FINALES
+from pdf_processor import PDFProcessor
+from pipeline import build_autoslides_pipeline, PipelineError, PipelineCancelled
+from slide_generator import SlideGenerator, MAX_PROMPT_CHARS
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 4
+
+# PDFs subidos y presentaciones .pptx generadas por el servicio
+UPLOAD_DIR = os.path.join(CACHE_ROOT, "uploads")
+OUTPUT_DIR = os.path.join(CACHE_ROOT, "output")
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+# Tiempo que se guardan los trabajos terminados (su estado, resultado y .pptx)
+JOB_RETENTION_SECONDS = 24 * 60 * 60
+
+PPTX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+_JOB_PATH_RE = re.compile(r"^/jobs/(\d+)(/result|/file)?$")
+
+
+class HTTPError(Exception):
+    """Error de la API: se responde con 'status' y {"error": mensaje}."""
+
+    def __init__(self, status, mensaje):
+        super().__init__(mensaje)
+        self.status = status
+        self.mensaje = mensaje
+
+
+def _flag(valor, defecto=False):
+    """Interpreta una opción booleana llegada en JSON o en la URL."""
+    if valor is None:
+        return defecto
+    if isinstance(valor, bool):
+        return valor
+    return str(valor).strip().lower() in ("1", "true", "yes", "si", "sí")
+
+
+def _nombre_seguro(nombre):
+    """Nombre de archivo sin carpetas ni caracteres raros (para guardar subidas)."""
+    nombre = re.sub(r"[^\w.\-]+", "_", os.path.basename(nombre or "")).strip("._")
+    return nombre or "documento.pdf"
+
+
+class AutoSlidesServer:
+    """Servicio HTTP (asyncio) que encola PDFs y ejecuta el pipeline con un pool acotado."""
+
+    def __init__(self, pdf_processor, slide_generator, workers=DEFAULT_WORKERS, pdf_root=None,
+                 upload_dir=UPLOAD_DIR, output_dir=OUTPUT_DIR, retention=JOB_RETENTION_SECONDS,
+                 record_decks=False):
+        """
+        Args:
+            pdf_root: Carpeta desde la que se aceptan PDFs por ruta. Sin
+                ella, solo se aceptan PDFs subidos.
+            retention: Segundos que se guarda un trabajo terminado (y su
+                .pptx) antes de olvidarlo.
+            record_decks: Guardar el estado de las presentaciones creadas a
+                partir de PDFs de pdf_root, para que la interfaz o el modo
+                lote puedan actualizarlas después.
+        """
+        self.pdf_processor = pdf_processor
+        self.slide_generator = slide_generator
+        self.pdf_root = os.path.realpath(pdf_root) if pdf_root else None
+        self.upload_dir = upload_dir
+        self.output_dir = output_dir
+        self.deck_store = incremental.DeckStore() if record_decks else None
+        self.job_queue = JobQueue(self.ejecutar_trabajo, workers=workers, on_update=self._on_trabajo_actualizado,
+                                  retention=retention, on_evict=self._olvidar_trabajo)
+        self._server = None
+
+    # --- Servidor HTTP ---
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        """Empieza a aceptar conexiones. Devuelve la URL base del servicio."""
+        self._server = await asyncio.start_server(self._atender_conexion, host, port)
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        """Deja de aceptar conexiones y cancela los trabajos pendientes."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        self.job_queue.shutdown(cancel_pending=True)
+
+    async def _atender_conexion(self, reader, writer):
+        """Atiende las peticiones de una conexión (HTTP/1.1 con keep-alive)."""
+        try:
+            while True:
+                linea = await reader.readline()
+                if not linea.strip():
+                    break
+                try:
+                    metodo, destino, _ = linea.decode("latin-1").split()
+                except ValueError:
+                    await self._responder(writer, HTTPStatus.BAD_REQUEST, {"error": "Petición mal formada."})
+                    break
+                cabeceras = {}
+                while True:
+                    linea = await reader.readline()
+                    if linea in (b"\r\n", b"\n", b""):
+                        break
+                    nombre, _, valor = linea.decode("latin-1").partition(":")
+                    cabeceras[nombre.strip().lower()] = valor.strip()
+
+                longitud = int(cabeceras.get("content-length") or 0)
+                if longitud > MAX_UPLOAD_BYTES:
+                    await self._responder(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                          {"error": f"El límite es {MAX_UPLOAD_BYTES} bytes."})
+                    break
+                cuerpo = await reader.readexactly(longitud) if longitud else b""
+
+                try:
+                    status, datos = await self.dispatch(metodo, destino, cabeceras, cuerpo)
+                except HTTPError as e:
+                    status, datos = e.status, {"error": e.mensaje}
+                except Exception as e:
+                    print(f"Error inesperado atendiendo {metodo} {destino}: {e}", file=sys.stderr)
+                    status, datos = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Error interno."}
+                await self._responder(writer, status, datos)
+                if cabeceras.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # El cliente cerró la conexión
+        except ValueError:
+            pass  # Cabeceras mal formadas (p. ej. Content-Length): se cierra la conexión
+        finally:
+            writer.close()
+
+    async def _responder(self, writer, status, datos):
+        """Envía la respuesta: 'datos' es un diccionario (JSON) o (bytes, content_type)."""
+        if isinstance(datos, tuple):
+            cuerpo, tipo = datos
+        else:
+            cuerpo, tipo = json.dumps(datos, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        status = HTTPStatus(status)
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(cuerpo)}\r\n"
+            "\r\n".encode("latin-1") + cuerpo
+        )
+        await writer.drain()
+
+    # --- API ---
+
+    async def dispatch(self, metodo, destino, cabeceras, cuerpo):
+        """Encamina una petición. Devuelve (status, datos) o lanza HTTPError."""
+        url = urlsplit(destino)
+        ruta = url.path.rstrip("/") or "/"
+        consulta = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if ruta == "/health" and metodo == "GET":
+            trabajos = list(self.job_queue.jobs.values())
+            return HTTPStatus.OK, {
+                "status": "ok",
+                "authenticated": bool(self.slide_generator.auth_headers),
+                "jobs": len(trabajos),
+                "active": sum(1 for j in trabajos if j.state not in ESTADOS_FINALES),
+                "rate_limits": self.slide_generator.rate_limits(),
+                "job_retention_seconds": self.job_queue.retention,
+            }
+        if ruta == "/jobs":
+            if metodo == "GET":
+                return HTTPStatus.OK, {"jobs": [j.to_dict() for j in self.job_queue.jobs.values()]}
+            if metodo == "POST":
+                return await self._crear_trabajo(cabeceras, cuerpo, consulta)
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Método no permitido.")
+
+        m = _JOB_PATH_RE.match(ruta)
+        if not m:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Ruta desconocida.")
+        job = self.job_queue.jobs.get(int(m.group(1)))
+        if job is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No existe ese trabajo.")
+        sufijo = m.group(2)
+
+        if sufijo is None and metodo == "GET":
+            return HTTPStatus.OK, job.to_dict()
+        if sufijo is None and metodo == "DELETE":
+            cancelado = self.job_queue.cancel(job.id)
+            return HTTPStatus.OK, dict(job.to_dict(), cancel_requested=cancelado)
+        if metodo != "GET":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Método no permitido.")
+        if job.state not in ESTADOS_FINALES:
+            raise HTTPError(HTTPStatus.CONFLICT, f"El trabajo aún no ha terminado ({job.state}).")
+        if sufijo == "/result":
+            if job.state == ERROR:
+                return HTTPStatus.OK, {"id": job.id, "state": job.state, "error": job.error}
+            return HTTPStatus.OK, {"id": job.id, "state": job.state, "result": job.result}
+
+        # /file: el .pptx generado
+        ruta_pptx = (job.result or {}).get("pptx_path") if job.state == COMPLETADO else None
+        if not ruta_pptx:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Este trabajo no generó un archivo .pptx.")
+        datos = await asyncio.get_running_loop().run_in_executor(None, _leer_archivo, ruta_pptx)
+        return HTTPStatus.OK, (datos, PPTX_CONTENT_TYPE)
+
+    async def _crear_trabajo(self, cabeceras, cuerpo, consulta):
+        tipo = cabeceras.get("content-type", "").split(";")[0].strip().lower()
+        if tipo == "application/json":
+            try:
+                opciones = json.loads(cuerpo or b"{}")
+            except json.JSONDecodeError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "El cuerpo no es JSON válido.")
+            if not isinstance(opciones, dict) or not opciones.get("path"):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Falta 'path' (o sube el PDF como application/pdf).")
+            pdf_path = self._ruta_permitida(opciones["path"])
+        elif tipo in ("application/pdf", "application/octet-stream"):
+            if not cuerpo.startswith(b"%PDF"):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "El cuerpo no es un PDF.")
+            opciones = consulta
+            nombre = f"{uuid.uuid4().hex[:12]}_{_nombre_seguro(consulta.get('name'))}"
+            pdf_path = os.path.abspath(os.path.join(self.upload_dir, nombre))
+            await asyncio.get_running_loop().run_in_executor(None, _guardar_archivo, pdf_path, cuerpo)
+        else:
+            raise HTTPError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                            "Usa application/json (con 'path') o application/pdf (el archivo).")
+
+        salida = opciones.get("output", "slides")
+        if salida not in ("slides", "pptx"):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'output' debe ser 'slides' o 'pptx'.")
+        job = self.job_queue.submit(
+            pdf_path,
+            use_cache=_flag(opciones.get("use_cache"), True),
+            map_reduce=_flag(opciones.get("map_reduce")),
+            output=salida,
+            upload=tipo != "application/json",
+        )
+        return HTTPStatus.ACCEPTED, {
+            "id": job.id,
+            "state": job.state,
+            "status_url": f"/jobs/{job.id}",
+            "result_url": f"/jobs/{job.id}/result",
+        }
+
+    def _ruta_permitida(self, path):
+        """La ruta real de un PDF pedido por ruta, si está dentro de pdf_root."""
+        if self.pdf_root is None:
+            raise HTTPError(HTTPStatus.FORBIDDEN, "Este servicio solo acepta PDFs subidos (sin --pdf-root).")
+        ruta = os.path.realpath(os.path.join(self.pdf_root, path))
+        if os.path.commonpath([ruta, self.pdf_root]) != self.pdf_root:
+            raise HTTPError(HTTPStatus.FORBIDDEN, "La ruta está fuera de la carpeta permitida.")
+        if not ruta.lower().endswith(".pdf") or not os.path.isfile(ruta):
+            raise HTTPError(HTTPStatus.NOT_FOUND, "No existe ese PDF.")
+        return ruta
+
+    # --- Trabajos (en los hilos de la cola) ---
+
+    def _on_trabajo_actualizado(self, job):
+        """Al terminar un trabajo, su PDF subido ya no hace falta."""
+        if job.state in ESTADOS_FINALES and job.options.get("upload"):
+            _borrar_archivo(job.pdf_path)
+
+    def _olvidar_trabajo(self, job):
+        """Borra los archivos de un trabajo que la cola ha olvidado (ver JobQueue.prune)."""
+        if job.options.get("upload"):
+            _borrar_archivo(job.pdf_path)
+        if isinstance(job.result, dict) and job.result.get("pptx_path"):
+            _borrar_archivo(job.result["pptx_path"])
+
+    def ejecutar_trabajo(self, job):
+        """Ejecuta el pipeline para un trabajo y devuelve su resultado (diccionario)."""
+        def on_etapa(etapa, evento, segundos):
+            if evento == "start":
+                self.job_queue.update(job, stage=etapa)
+
+        map_reduce = job.options.get("map_reduce", False)
+        pptx_path = None
+        if job.options.get("output") == "pptx":
+            nombre = f"{job.id}-{os.path.splitext(os.path.basename(job.pdf_path))[0]}.pptx"
+            pptx_path = os.path.join(self.output_dir, nombre)
+        pipeline = build_autoslides_pipeline(
+            self.pdf_processor, self.slide_generator, job.pdf_path,
+            max_chars=None if map_reduce else MAX_PROMPT_CHARS,
+            use_cache=job.options.get("use_cache", True), map_reduce=map_reduce,
+            on_event=on_etapa, should_cancel=lambda: job.cancelled, pptx_path=pptx_path,
+            # Los PDFs subidos se borran al terminar: no tiene sentido guardar su estado
+            deck_store=None if job.options.get("upload") else self.deck_store
+        )
+        try:
+            with metrics.run(os.path.basename(job.pdf_path), job=job.id) as run_metrics:
+                resultados = pipeline.run()
+        except PipelineCancelled:
+            raise JobCancelled()
+        except PipelineError as e:
+            raise RuntimeError(e.error)
+
+        if pptx_path:
+            ruta, ai_data = resultados["write_pptx"]
+            resultado = {"pptx_path": ruta, "file_url": f"/jobs/{job.id}/file"}
+        else:
+            presentacion, ai_data = resultados["fill"]
+            resultado = {"presentation_id": presentacion.get("presentationId"),
+                         "presentation_url": presentacion.get("presentationUrl")}
+        resultado.update(title=ai_data.get("titulo_presentacion"), slides=len(ai_data["puntos_clave"]) + 1,
+                         timings=pipeline.timings, metrics=run_metrics.summary())
+        return resultado
+
+
+def _guardar_archivo(path, datos):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(datos)
+
+
+def _borrar_archivo(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Aviso: no se pudo borrar '{path}': {e}", file=sys.stderr)
+
+
+def _leer_archivo(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+async def _servir(args):
+    fake = None
+    if args.fake_google:
+        # Servidores falsos de Vertex AI y Slides (ver bench_pipeline)
+        from bench_pipeline import FakeGoogleServer, crear_slide_generator
+        fake = FakeGoogleServer(vertex_latency=0.5, slides_latency=0.1)
+        fake.start()
+        slide_generator = crear_slide_generator(fake.url)
+        print(f"Usando los servidores falsos de Google en {fake.url}")
+    else:
+        slide_generator = SlideGenerator(response_cache=SlideGenerator.default_response_cache())
+
+    # Una sola autenticación para todo el servicio (puede abrir el navegador la primera vez)
+    loop = asyncio.get_running_loop()
+    if not await loop.run_in_executor(None, slide_generator.authenticate):
+        print("Error de autenticación. El servicio no se inicia.", file=sys.stderr)
+        return 1
+
+    servicio = AutoSlidesServer(PDFProcessor(cache=PDFProcessor.default_text_cache()), slide_generator,
+                                workers=args.workers, pdf_root=args.pdf_root, retention=args.retention,
+                                record_decks=args.record_decks)
+    url = await servicio.start(args.host, args.port)
+    print(f"AutoSlides escuchando en {url} con {args.workers} trabajos a la vez.")
+    try:
+        await servicio.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await servicio.stop()
+        if fake:
+            fake.stop()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servicio HTTP de AutoSlides (trabajos asíncronos).")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Interfaz de escucha (por defecto {DEFAULT_HOST}).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Puerto (por defecto {DEFAULT_PORT}).")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"PDFs procesados a la vez (por defecto {DEFAULT_WORKERS}).")
+    parser.add_argument("--pdf-root", metavar="CARPETA",
+                        help="Aceptar también PDFs por ruta, solo dentro de esta carpeta.")
+    parser.add_argument("--retention", type=int, default=JOB_RETENTION_SECONDS, metavar="SEGUNDOS",
+                        help="Tiempo que se guardan los trabajos terminados y sus .pptx "
+                             f"(por defecto {JOB_RETENTION_SECONDS}).")
+    parser.add_argument("--record-decks", action="store_true",
+                        help="Guardar el estado de las presentaciones de PDFs de --pdf-root para poder "
+                             "actualizarlas después (interfaz o batch_cli --incremental).")
+    parser.add_argument("--fake-google", action="store_true",
+                        help="Usar servidores falsos de Vertex AI y Slides (pruebas locales, sin cuenta).")
+    parser.add_argument("--metrics", metavar="ARCHIVO",
+                        help="Añadir las métricas (spans y contadores) a este archivo JSON lines.")
+    args = parser.parse_args(argv)
+
+    if args.metrics:
+        metrics.add_sink(metrics.JsonLinesSink(args.metrics))
+    try:
+        return asyncio.run(_servir(args))
+    except KeyboardInterrupt:
+        print("Servicio detenido.")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
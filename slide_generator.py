@@ -1,12 +1,20 @@
 # --- Importaciones necesarias ---
 import os.path
 import json
-import requests
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+# Las bibliotecas pesadas (requests, httplib2 y las de Google) se importan
+# dentro de los métodos que las usan: así la ventana aparece sin esperar
+# a cargarlas, y solo se pagan la primera vez que hacen falta.
+
+import metrics
+from credential_manager import CredentialManager, save_token
+from disk_cache import CACHE_ROOT, DiskCache, make_key
+from json_stream import IncrementalSlidesParser, load_presentation, salvage_points, salvage_presentation
+from rate_governor import ApiGovernor
 
 # --- NUEVAS LÍNEAS PARA LEER EL .env ---
 from dotenv import load_dotenv
@@ -28,8 +36,264 @@ TOKEN_FILE = "token.json"  # Este archivo se CREARÁ automáticamente
 
 # 4. Configuración de la IA
 # ¡¡LA SOLUCIÓN QUE TÚ ENCONTRASTE!!
-# Región "global" y modelo "gemini-2.5-pro"
-API_ENDPOINT = f"https://aiplatform.googleapis.com/v1/projects/{TU_PROJECT_ID}/locations/global/publishers/google/models/gemini-2.5-pro:generateContent"
+# Región "global" y modelo "gemini-2.5-pro" (el modelo de cada petición se
+# elige con MODEL_TIERS; ver model_endpoint)
+VERTEX_MODELS_URL = f"https://aiplatform.googleapis.com/v1/projects/{TU_PROJECT_ID}/locations/global/publishers/google/models"
+DEFAULT_MODEL = "gemini-2.5-pro"
+
+# 5. Máximo de caracteres del PDF que se envían a la IA en el prompt.
+# PDFProcessor puede detener la extracción al llegar a este límite.
+MAX_PROMPT_CHARS = 8000
+
+# 6. Caché persistente de respuestas de la IA (clave: modelo + prompt +
+# generationConfig). Una petición idéntica dentro del TTL no vuelve a
+# llamar a Vertex AI.
+RESPONSE_CACHE_DIR = os.path.join(CACHE_ROOT, "responses")
+RESPONSE_CACHE_MAX_BYTES = 50 * 1024 * 1024
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # 7 días
+
+# 7. Conexiones HTTP con Vertex AI: una sesión compartida con keep-alive
+# (tantas conexiones abiertas como llamadas concurrentes esperemos) y
+# reintentos con backoff exponencial + jitter ante 429/5xx y fallos de red.
+HTTP_POOL_SIZE = 16
+HTTP_MAX_RETRIES = 4
+HTTP_BACKOFF_BASE = 1.0   # segundos
+HTTP_BACKOFF_MAX = 60.0   # segundos
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# 8. Caché local del documento de descubrimiento de la API de Slides, que
+# build() tendría que descargar (o leer y analizar) cada vez. La versión de
+# google-api-python-client forma parte del nombre del archivo, así que al
+# actualizar la biblioteca se vuelve a obtener.
+DISCOVERY_CACHE_DIR = os.path.join(CACHE_ROOT, "discovery")
+SLIDES_DISCOVERY_URL = "https://slides.googleapis.com/$discovery/rest?version=v1"
+
+# 9. Configuración de generación para las diapositivas (respuesta JSON)
+SLIDES_GENERATION_CONFIG = {
+    "responseMimeType": "application/json", # ¡Le pedimos JSON directamente!
+    "temperature": 0.5,
+    # Aumentamos el límite de tokens para que la IA no se corte
+    "maxOutputTokens": 8192
+}
+
+# 10. Modo map-reduce para documentos largos: el texto se parte en bloques
+# de al menos MAP_CHUNK_CHARS caracteres (y como mucho MAX_MAP_CHUNKS
+# bloques), que se resumen en paralelo antes de generar las diapositivas.
+MAP_CHUNK_CHARS = 30000
+MAX_MAP_CHUNKS = 16
+MAP_REDUCE_WORKERS = MAX_MAP_CHUNKS  # Todos los bloques a la vez
+MAX_REDUCE_CHARS = 64000
+MAP_GENERATION_CONFIG = {
+    "responseMimeType": "text/plain",
+    "temperature": 0.3,
+    "maxOutputTokens": 1024
+}
+
+# 11. Peticiones a Slides en lote. Un batchUpdate lleva como mucho
+# SLIDES_MAX_REQUESTS_PER_UPDATE peticiones: las listas más largas se
+# parten (siempre entre diapositivas) en varios batchUpdate seguidos. En
+# modo lote (create_presentations_batch) se agrupan hasta
+# SLIDES_BATCH_MAX_CALLS llamadas de distintas presentaciones en cada
+# petición HTTP 'batch' de Google.
+SLIDES_MAX_REQUESTS_PER_UPDATE = 400
+SLIDES_BATCH_MAX_CALLS = 50
+
+# 12. Ritmo de las llamadas (ver rate_governor): un cubo de fichas con la
+# cuota por minuto de cada API y un límite de llamadas simultáneas que se
+# reduce a la mitad ante un 429 y vuelve a subir mientras todo va bien.
+# Slides permite 60 escrituras por minuto y usuario; Vertex AI no tiene
+# una cuota fija por minuto para este modelo (se puede fijar con la
+# variable de entorno AUTOSLIDES_VERTEX_RPM).
+VERTEX_REQUESTS_PER_MINUTE = int(os.getenv("AUTOSLIDES_VERTEX_RPM", "0")) or None
+VERTEX_MAX_CONCURRENCY = HTTP_POOL_SIZE
+SLIDES_WRITE_REQUESTS_PER_MINUTE = 60
+SLIDES_MAX_CONCURRENCY = 8
+
+# 13. Recuperación de respuestas JSON cortadas (límite de tokens) o mal
+# formadas: se aprovechan el título y los puntos clave completos y, si la
+# respuesta se cortó, se pide a la IA solo el resto de los puntos (hasta
+# MAX_PUNTOS_CLAVE en total), en lugar de repetir toda la generación.
+MAX_PUNTOS_CLAVE = 5
+JSON_TAIL_RECOVERY = True
+
+# 14. Elección del modelo según el tamaño de la entrada (ver route_model).
+# Cada petición va a la primera categoría cuyo 'max_input_chars' admite su
+# prompt (None = sin límite): los documentos cortos van a un modelo 'flash'
+# sin razonamiento ('thinking'), que responde en segundos, y el resto a
+# DEFAULT_MODEL. Con 7000 caracteres (~1300 de instrucciones) entran en
+# 'flash' los documentos de 2-3 páginas; los que llenan MAX_PROMPT_CHARS,
+# los resúmenes del modo map-reduce y sus bloques van a DEFAULT_MODEL. Para el
+# JSON de las diapositivas, maxOutputTokens se calcula con el número de
+# diapositivas pedidas; en las demás peticiones, el de la configuración es
+# lo que ocupa la respuesta. En ambos casos se suma el presupuesto de
+# razonamiento del modelo (en 2.5 cuenta dentro de maxOutputTokens), con
+# 'max_output_tokens' como techo.
+# En cada despliegue se puede cambiar con las variables de entorno
+# AUTOSLIDES_FLASH_MODEL, AUTOSLIDES_FLASH_MAX_CHARS (0 = todo a
+# DEFAULT_MODEL) y AUTOSLIDES_MODEL, o pasando 'model_tiers' a SlideGenerator.
+MODEL_TIERS = (
+    {"tier": "flash", "model": os.getenv("AUTOSLIDES_FLASH_MODEL", "gemini-2.5-flash"),
+     "max_input_chars": int(os.getenv("AUTOSLIDES_FLASH_MAX_CHARS", "7000")),
+     "thinking_budget": 0, "max_output_tokens": 8192},
+    {"tier": "pro", "model": os.getenv("AUTOSLIDES_MODEL", DEFAULT_MODEL),
+     "max_input_chars": None, "thinking_budget": None, "max_output_tokens": 8192},
+)
+OUTPUT_TOKENS_BASE = 300        # Título de la presentación y estructura del JSON
+OUTPUT_TOKENS_PER_SLIDE = 350   # Un párrafo de 3-4 frases, con margen
+# Reserva para el razonamiento de los modelos sin 'thinking_budget' fijo
+DYNAMIC_THINKING_TOKENS = 6144
+
+
+_discovery_lock = threading.Lock()
+_slides_discovery_doc = None
+
+
+def load_slides_discovery_document():
+    """
+    Devuelve el documento de descubrimiento de Slides v1 (ya analizado).
+
+    Orden de búsqueda: memoria del proceso → caché en disco versionada →
+    copia incluida en google-api-python-client → descarga por HTTP. Lo
+    obtenido se guarda en disco para los siguientes arranques.
+    """
+    global _slides_discovery_doc
+    with _discovery_lock:
+        if _slides_discovery_doc is not None:
+            return _slides_discovery_doc
+
+        from googleapiclient.version import __version__ as client_version
+        path = os.path.join(DISCOVERY_CACHE_DIR, f"slides_v1_{client_version}.json")
+        try:
+            with open(path, encoding="utf-8") as f:
+                _slides_discovery_doc = json.load(f)
+            return _slides_discovery_doc
+        except (OSError, ValueError):
+            pass
+
+        contenido = None
+        try:
+            from googleapiclient.discovery_cache import get_static_doc
+            contenido = get_static_doc("slides", "v1")
+        except ImportError:
+            pass
+        if contenido is None:
+            import requests
+            print("Descargando el documento de descubrimiento de Google Slides...")
+            response = requests.get(SLIDES_DISCOVERY_URL, timeout=30)
+            response.raise_for_status()
+            contenido = response.text
+        _slides_discovery_doc = json.loads(contenido)
+
+        try:
+            os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(contenido)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Aviso: no se pudo guardar el documento de descubrimiento: {e}")
+        return _slides_discovery_doc
+
+
+def parse_summary(texto):
+    """'parse' de los resúmenes de la fase 'map': lanza ValueError si la respuesta está vacía."""
+    resumen = texto.strip()
+    if not resumen:
+        raise ValueError("la IA devolvió un resumen vacío")
+    return resumen
+
+
+def model_endpoint(model, stream=False):
+    """URL de 'generateContent' (o de su variante en streaming, con Server-Sent Events) de un modelo."""
+    if stream:
+        return f"{VERTEX_MODELS_URL}/{model}:streamGenerateContent?alt=sse"
+    return f"{VERTEX_MODELS_URL}/{model}:generateContent"
+
+
+def route_model(prompt_chars, generation_config, slides=None, tiers=MODEL_TIERS):
+    """
+    Elige la categoría de modelo para un prompt de 'prompt_chars'
+    caracteres (ver MODEL_TIERS) y ajusta la configuración de generación:
+    con 'slides' (número de diapositivas pedidas), maxOutputTokens se
+    calcula para ellas; sin 'slides', el de 'generation_config' es para la
+    respuesta. En los dos casos se le suma la reserva para el razonamiento
+    del modelo, que si no se comería la respuesta (finishReason MAX_TOKENS).
+
+    Returns:
+        (categoria, generation_config): la entrada de 'tiers' elegida y
+        una copia ajustada de 'generation_config'.
+    """
+    categoria = next(
+        (t for t in tiers if t["max_input_chars"] is None or prompt_chars <= t["max_input_chars"]),
+        tiers[-1]
+    )
+    config = dict(generation_config)
+    presupuesto = categoria.get("thinking_budget")
+    if presupuesto is not None:
+        config["thinkingConfig"] = {"thinkingBudget": presupuesto}
+    razonamiento = DYNAMIC_THINKING_TOKENS if presupuesto is None else presupuesto
+    if slides:
+        necesarios = OUTPUT_TOKENS_BASE + slides * OUTPUT_TOKENS_PER_SLIDE + razonamiento
+        config["maxOutputTokens"] = min(categoria["max_output_tokens"], necesarios)
+    elif razonamiento and "maxOutputTokens" in config:
+        necesarios = config["maxOutputTokens"] + razonamiento
+        config["maxOutputTokens"] = min(categoria["max_output_tokens"], necesarios)
+    return categoria, config
+
+
+def split_slide_requests(requests_batch, max_requests=SLIDES_MAX_REQUESTS_PER_UPDATE):
+    """
+    Parte una lista de peticiones de batchUpdate en trozos de como mucho
+    'max_requests', cortando preferentemente delante de un 'createSlide':
+    las peticiones que rellenan una diapositiva van en el mismo trozo que
+    la que la crea. Solo un grupo más largo que el límite (una diapositiva
+    enorme, o una lista sin 'createSlide' como las de deck_diff_requests)
+    se parte por número de peticiones. Los trozos deben enviarse en orden.
+    """
+    grupos = []
+    for peticion in requests_batch:
+        if "createSlide" in peticion or not grupos:
+            grupos.append([])
+        grupos[-1].append(peticion)
+
+    trozos = []
+    for grupo in grupos:
+        if trozos and len(trozos[-1]) + len(grupo) <= max_requests:
+            trozos[-1].extend(grupo)
+        else:
+            trozos.extend(grupo[i:i + max_requests] for i in range(0, len(grupo), max_requests))
+    return trozos
+
+
+def _replace_text_requests(object_id, old_text, new_text):
+    """Peticiones que cambian el texto de una forma (ninguna si no cambia)."""
+    if old_text == new_text:
+        return []
+    requests_batch = []
+    # deleteText falla sobre una forma vacía, e insertText con texto vacío
+    if old_text:
+        requests_batch.append({"deleteText": {"objectId": object_id, "textRange": {"type": "ALL"}}})
+    if new_text:
+        requests_batch.append({"insertText": {"objectId": object_id, "text": new_text}})
+    return requests_batch
+
+
+def split_into_chunks(text, chunk_chars):
+    """
+    Divide un texto en bloques de como mucho 'chunk_chars' caracteres,
+    cortando en el último espacio para no partir palabras.
+    """
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        if end < len(text):
+            corte = text.rfind(" ", start, end)
+            if corte > start:
+                end = corte
+        chunks.append(text[start:end].strip())
+        start = end
+    return [c for c in chunks if c]
 
 
 class SlideGenerator:
@@ -37,31 +301,105 @@ class SlideGenerator:
     Clase que maneja la autenticación y generación de slides.
     """
 
-    def __init__(self):
+    def __init__(self, response_cache: DiskCache = None, http_pool_size: int = HTTP_POOL_SIZE,
+                 max_retries: int = HTTP_MAX_RETRIES, vertex_rpm: int = VERTEX_REQUESTS_PER_MINUTE,
+                 slides_rpm: int = SLIDES_WRITE_REQUESTS_PER_MINUTE, model_tiers=None):
         """
         El constructor ahora es 'ligero'. No se autentica al iniciar.
+
+        Args:
+            response_cache: Caché opcional de respuestas de la IA
+                (ver default_response_cache).
+            http_pool_size: Conexiones keep-alive que se mantienen abiertas
+                con Vertex AI (debe cubrir las llamadas concurrentes).
+            max_retries: Reintentos ante 429/5xx o errores de red.
+            vertex_rpm, slides_rpm: Cuota de llamadas por minuto a cada
+                API (None = sin límite fijo; ver rate_governor).
+            model_tiers: Categorías de modelo por tamaño de la entrada
+                (por defecto MODEL_TIERS; ver route_model).
         """
         self.creds = None
         self.slides_service = None
-        self.auth_headers = None
+        # Mantiene el token vigente en segundo plano (ver auth_headers)
+        self.credential_manager = None
+        self.response_cache = response_cache
+        self.max_retries = max_retries
+        # Sesión HTTP compartida para Vertex AI (se crea en el primer uso)
+        self.http_pool_size = http_pool_size
+        self._http_session = None
+        self._http_session_lock = threading.Lock()
+        self._auth_lock = threading.Lock()
+        # Cliente HTTP de Slides por hilo (ver _slides_http)
+        self._thread_local = threading.local()
+        # Ritmo compartido por todos los hilos que usan este SlideGenerator
+        self.vertex_governor = ApiGovernor("vertex", vertex_rpm, max_concurrency=VERTEX_MAX_CONCURRENCY)
+        self.slides_governor = ApiGovernor("slides", slides_rpm, max_concurrency=SLIDES_MAX_CONCURRENCY)
+        self.model_tiers = model_tiers or MODEL_TIERS
         print("SlideGenerator inicializado (sin autenticar).")
 
+    @property
+    def http_session(self):
+        """Sesión HTTP compartida para Vertex AI (reutiliza conexiones TLS)."""
+        if self._http_session is None:
+            with self._http_session_lock:
+                if self._http_session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.http_pool_size)
+                    session.mount("https://", adapter)
+                    self._http_session = session
+        return self._http_session
+
+    @http_session.setter
+    def http_session(self, session):
+        self._http_session = session
+
+    @property
+    def auth_headers(self):
+        """
+        Cabeceras (con el token vigente) para la API de Gemini, o None si
+        no se ha autenticado. Se leen en cada llamada, así que un proceso
+        que sigue abierto más allá de la vida del token no falla con 401.
+        """
+        if not self.credential_manager:
+            return None
+        return self.credential_manager.headers()
+
+    def _start_credential_manager(self):
+        """Arranca el refresco en segundo plano para las credenciales actuales."""
+        if self.credential_manager and self.credential_manager.creds is self.creds:
+            return
+        if self.credential_manager:
+            self.credential_manager.stop()
+        self.credential_manager = CredentialManager(self.creds, TOKEN_FILE)
+        self.credential_manager.start()
+
     def authenticate(self):
         """
         Maneja el flujo de autenticación OAuth 2.0 bajo demanda.
         Crea 'token.json' si no existe.
         Devuelve True si la autenticación es exitosa, False si no.
+
+        Es seguro llamarlo desde varios hilos a la vez: solo uno autentica
+        (y abre, si hace falta, el navegador); el resto espera su resultado.
         """
+        with metrics.span("auth.authenticate") as attrs, self._auth_lock:
+            attrs["ok"] = self._authenticate()
+            return attrs["ok"]
+
+    def _authenticate(self):
+        """Implementación de authenticate (se llama con _auth_lock tomado)."""
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from googleapiclient.errors import HttpError
+
         # Si ya tenemos credenciales válidas, no hacemos nada
         if self.creds and self.creds.valid:
             # Re-construir servicios si no existen (necesario si la app sigue abierta)
-            if not self.auth_headers:
-                self.auth_headers = {
-                    "Authorization": f"Bearer {self.creds.token}",
-                    "Content-Type": "application/json"
-                }
+            self._start_credential_manager()
             if not self.slides_service:
-                 self.slides_service = build("slides", "v1", credentials=self.creds)
+                 self.slides_service = self._build_slides_service()
             return True
             
         print("Iniciando autenticación...")
@@ -84,8 +422,9 @@ class SlideGenerator:
                     self.creds = self._run_oauth_flow()
                 
                 # Guarda las credenciales para la próxima ejecución
-                with open(TOKEN_FILE, "w") as token:
-                    token.write(self.creds.to_json())
+                # (escritura atómica: nunca deja un token.json a medias)
+                if self.creds:
+                    save_token(self.creds, TOKEN_FILE)
                     print(f"Token guardado en {TOKEN_FILE}")
 
             if not self.creds:
@@ -95,13 +434,11 @@ class SlideGenerator:
             # --- Construir los servicios DESPUÉS de autenticar ---
             print("Construyendo servicios de Google...")
             # 1. El servicio para la API de Google Slides
-            self.slides_service = build("slides", "v1", credentials=self.creds)
+            self.slides_service = self._build_slides_service()
             
-            # 2. La cabecera (header) para la API de Gemini
-            self.auth_headers = {
-                "Authorization": f"Bearer {self.creds.token}",
-                "Content-Type": "application/json"
-            }
+            # 2. La cabecera (header) para la API de Gemini, que se
+            # mantiene al día refrescando el token en segundo plano
+            self._start_credential_manager()
             print("Autenticación exitosa. Servicios listos.")
             return True
             
@@ -112,6 +449,11 @@ class SlideGenerator:
             print(f"Error inesperado durante la autenticación: {e}")
             return False
 
+    def _build_slides_service(self):
+        """Construye el servicio de Slides a partir del documento de descubrimiento en caché."""
+        from googleapiclient.discovery import build_from_document
+        return build_from_document(load_slides_discovery_document(), credentials=self.creds)
+
     def _run_oauth_flow(self):
         """
         Ejecuta el flujo de OAuth de aplicación de escritorio.
@@ -122,26 +464,313 @@ class SlideGenerator:
             print("Por favor, sigue la Fase 2 de la guía para descargarlo.")
             return None
             
+        from google_auth_oauthlib.flow import InstalledAppFlow
         flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
         # Esto abrirá el navegador y pedirá al usuario que inicie sesión
         # y conceda permisos.
         creds = flow.run_local_server(port=0, prompt='consent')
         return creds
 
-    def get_presentation_content(self, pdf_text):
+    def _slides_http(self):
+        """
+        Devuelve el cliente HTTP autorizado del hilo actual para las
+        llamadas a Slides. httplib2 no es seguro entre hilos, así que cada
+        hilo que use el mismo SlideGenerator (p. ej. en modo lote) tiene
+        el suyo, atado a las credenciales actuales.
+        """
+        local = self._thread_local
+        if getattr(local, "http", None) is None or local.creds is not self.creds:
+            import httplib2
+            from google_auth_httplib2 import AuthorizedHttp
+            local.http = AuthorizedHttp(self.creds, http=httplib2.Http())
+            local.creds = self.creds
+        return local.http
+
+    def rate_limits(self):
+        """Límites actuales de ritmo y concurrencia de cada API (ver rate_governor)."""
+        return {"vertex": self.vertex_governor.snapshot(), "slides": self.slides_governor.snapshot()}
+
+    def _post_with_retries(self, url, payload, timeout=90, stream=False):
+        """
+        Hace un POST con la sesión compartida, respetando el ritmo de
+        vertex_governor. Ante un 429/5xx o un error de red reintenta hasta
+        'max_retries' veces, esperando lo que indique la cabecera
+        Retry-After o, si no la hay, un backoff exponencial con jitter (un
+        429 hace esperar también a los demás hilos). Devuelve la última
+        respuesta (o relanza el último error de red).
+
+        En streaming, el turno de concurrencia se libera al recibir las
+        cabeceras de la respuesta, no al terminar de leerla.
+        """
+        import requests
+        with metrics.span("vertex.http", stream=stream) as attrs:
+            for intento in range(self.max_retries + 1):
+                attrs["attempts"] = intento + 1
+                if intento:
+                    metrics.count("vertex.retries")
+                espera = 0.0
+                with self.vertex_governor.slot() as slot:
+                    try:
+                        response = self.http_session.post(url, headers=self.auth_headers, json=payload,
+                                                          timeout=timeout, stream=stream)
+                    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                        if intento == self.max_retries:
+                            raise
+                        espera = self._backoff_delay(intento)
+                        print(f"Error de red al llamar a la API de IA ({e}). Reintentando en {espera:.1f} s...")
+                    else:
+                        attrs["status"] = response.status_code
+                        # Token rechazado (p. ej. revocado): forzar un refresco y reintentar una vez
+                        if response.status_code == 401 and intento == 0 < self.max_retries and self.credential_manager:
+                            if self.credential_manager.refresh(force=True):
+                                response.close()
+                                continue
+                        if response.status_code == 429:
+                            # Cuota agotada: el governor hace esperar a todos los hilos
+                            slot.throttled(self._retry_after(response) or self._backoff_delay(intento))
+                        if response.status_code not in RETRYABLE_STATUS or intento == self.max_retries:
+                            return response
+                        # La respuesta descartada devuelve su conexión al pool
+                        # (en streaming no se libera hasta cerrarla)
+                        response.close()
+                        if response.status_code == 429:
+                            print(f"La API de IA respondió 429 (cuota). Reintentando en {slot.retry_after:.1f} s...")
+                        else:
+                            espera = self._retry_after(response) or self._backoff_delay(intento)
+                            print(f"La API de IA respondió {response.status_code}. Reintentando en {espera:.1f} s...")
+                if espera:
+                    time.sleep(espera)
+
+    def _slides_execute(self, request):
+        """
+        Ejecuta una llamada a la API de Slides respetando el ritmo de
+        slides_governor. Ante un 429 (cuota de escrituras por minuto)
+        espera, junto con los demás hilos, y reintenta hasta 'max_retries'
+        veces; cualquier otro error se relanza.
+        """
+        from googleapiclient.errors import HttpError
+        for intento in range(self.max_retries + 1):
+            with self.slides_governor.slot() as slot:
+                try:
+                    return request.execute(http=self._slides_http())
+                except HttpError as err:
+                    if err.resp.status != 429:
+                        raise
+                    slot.throttled(self._retry_after(err.resp) or self._backoff_delay(intento))
+                    if intento == self.max_retries:
+                        raise
+                    print(f"Google Slides respondió 429 (cuota). Reintentando en {slot.retry_after:.1f} s...")
+                    metrics.count("slides.retries")
+
+    def _backoff_delay(self, intento):
+        """Backoff exponencial con 'full jitter': aleatorio entre 0 y base * 2^intento."""
+        return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** intento)))
+
+    def _retry_after(self, response):
+        """Segundos indicados por la cabecera Retry-After (número o fecha HTTP), o None."""
+        # 'response' es de requests o un httplib2.Response (un dict con las cabeceras)
+        valor = getattr(response, "headers", response).get("retry-after")
+        if not valor:
+            return None
+        try:
+            segundos = float(valor)
+        except ValueError:
+            try:
+                segundos = parsedate_to_datetime(valor).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(HTTP_BACKOFF_MAX, max(0.0, segundos))
+
+    @staticmethod
+    def default_response_cache() -> DiskCache:
+        """Crea la caché de respuestas en disco con la configuración por defecto."""
+        return DiskCache(RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL)
+
+    def get_presentation_content(self, pdf_text, use_cache=True, map_reduce=False):
         """
         Envía el texto extraído del PDF a la API de Gemini (Vertex AI).
+
+        Si hay caché de respuestas y 'use_cache' es True, una petición
+        idéntica a una anterior (mismo modelo, prompt y configuración) se
+        responde desde disco. Con use_cache=False se fuerza una generación
+        nueva (que sí se guarda en la caché).
+
+        Con map_reduce=True y un texto más largo que MAX_PROMPT_CHARS, en
+        lugar de recortarlo se resume por bloques en paralelo (fase 'map')
+        y las diapositivas se generan a partir de esos resúmenes ('reduce').
+        """
+        if not self.auth_headers or TU_PROJECT_ID is None:
+            print("Error: El PROJECT_ID no está configurado (revisa tu .env) o la autenticación falló.")
+            return None
+
+        prompt = self._prepare_slides_prompt(pdf_text, use_cache, map_reduce)
+        if prompt is None:
+            return None
+
+        print("Enviando texto a la IA para análisis (Vertex AI)...")
+        return self._generate(prompt, SLIDES_GENERATION_CONFIG, use_cache, parse=load_presentation,
+                              recover=self._recover_presentation, slides=MAX_PUNTOS_CLAVE)
+
+    def stream_presentation_content(self, pdf_text, use_cache=True, map_reduce=False):
+        """
+        Versión en streaming de get_presentation_content: usa
+        'streamGenerateContent' y produce eventos en cuanto cada parte del
+        JSON está completa:
+
+            ("titulo", "Título de la presentación")
+            ("punto", {"titulo_diapositiva": ..., "contenido_diapositiva": ...})
+            ("fin", ai_data)   # Siempre el último; ai_data es None si falló
+
+        Si la respuesta está en la caché, los eventos salen de ella al momento.
+        """
+        import requests
+        if not self.auth_headers or TU_PROJECT_ID is None:
+            print("Error: El PROJECT_ID no está configurado (revisa tu .env) o la autenticación falló.")
+            yield ("fin", None)
+            return
+
+        prompt = self._prepare_slides_prompt(pdf_text, use_cache, map_reduce)
+        if prompt is None:
+            yield ("fin", None)
+            return
+
+        categoria, generation_config = route_model(len(prompt), SLIDES_GENERATION_CONFIG, MAX_PUNTOS_CLAVE,
+                                                   self.model_tiers)
+        with metrics.span("vertex.stream_generate", prompt_chars=len(prompt),
+                          model=categoria["model"], tier=categoria["tier"]) as attrs:
+            payload = {
+                "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                "generationConfig": generation_config
+            }
+            metrics.count("vertex.prompt_chars", len(prompt))
+            metrics.count(f"vertex.tier.{categoria['tier']}")
+            # Misma clave que _generate: las respuestas completas son intercambiables
+            cache_key = None
+            if self.response_cache is not None:
+                cache_key = make_key("gemini", model_endpoint(categoria["model"]), payload["contents"],
+                                     payload["generationConfig"])
+                cached_content = self.response_cache.get(cache_key) if use_cache else None
+                if cached_content is not None:
+                    print("Respuesta de la IA recuperada de la caché.")
+                    attrs.update(cached=True, response_chars=len(cached_content))
+                    parser = IncrementalSlidesParser()
+                    yield from parser.feed(cached_content)
+                    yield ("fin", parser.result())
+                    return
+
+            print("Enviando texto a la IA en streaming (Vertex AI)...")
+            parser = IncrementalSlidesParser()
+            attrs["cached"] = False
+            uso = None
+            finish_reason = None
+            interrumpida = False
+            inicio = time.perf_counter()
+            try:
+                response = self._post_with_retries(model_endpoint(categoria["model"], stream=True), payload,
+                                                   stream=True)
+                with response:
+                    attrs["status"] = response.status_code
+                    if response.status_code != 200:
+                        print(f"Error de la API de IA (Código: {response.status_code}): {response.text}")
+                        yield ("fin", None)
+                        return
+
+                    # Server-Sent Events: cada línea "data: {...}" trae un trozo de texto
+                    for line in response.iter_lines(decode_unicode=True):
+                        if not line or not line.startswith("data:"):
+                            continue
+                        evento = json.loads(line[len("data:"):])
+                        attrs.setdefault("first_chunk_ms", round((time.perf_counter() - inicio) * 1000, 1))
+                        # El último evento trae el recuento de tokens definitivo
+                        uso = evento.get("usageMetadata") or uso
+                        for candidate in evento.get("candidates", [])[:1]:
+                            finish_reason = candidate.get("finishReason") or finish_reason
+                            for part in candidate.get("content", {}).get("parts", []):
+                                yield from parser.feed(part.get("text", ""))
+
+            except requests.exceptions.RequestException as e:
+                print(f"Error de conexión en el streaming de la IA: {e}")
+                interrumpida = True
+            except Exception as e:
+                print(f"Error inesperado en stream_presentation_content: {e}")
+                interrumpida = True
+
+            attrs.update(response_chars=len(parser.buffer), finish_reason=finish_reason)
+            self._record_usage(attrs, uso)
+            ai_data = parser.result()
+            completa = parser.complete()
+            # Lo recuperado solo se guarda si tiene todas las diapositivas
+            # (o la petición de los puntos que faltaban funcionó)
+            recuperada_completa = False
+            if not completa and ai_data is not None:
+                # Respuesta cortada o mal formada: se completa con los puntos que faltan
+                print(f"La respuesta de la IA no está completa: se recuperaron "
+                      f"{len(ai_data['puntos_clave'])} diapositivas.")
+                metrics.count("vertex.json_recovered")
+                attrs["recovered"] = True
+                if parser.titulo is None:
+                    yield ("titulo", ai_data["titulo_presentacion"])
+                if parser.truncated or finish_reason == "MAX_TOKENS":
+                    antes = len(ai_data["puntos_clave"])
+                    ai_data, recuperada_completa = self._complete_truncated(
+                        payload["contents"], parser.buffer, ai_data, use_cache
+                    )
+                    for punto in ai_data["puntos_clave"][antes:]:
+                        yield ("punto", punto)
+                else:
+                    recuperada_completa = len(ai_data["puntos_clave"]) >= MAX_PUNTOS_CLAVE
+            # Solo se guardan en caché respuestas válidas (y no las de un
+            # streaming interrumpido por un error, que puede no repetirse)
+            if cache_key is not None and ai_data is not None and ai_data["puntos_clave"]:
+                if completa:
+                    self.response_cache.put(cache_key, parser.buffer)
+                elif recuperada_completa and not interrumpida:
+                    self.response_cache.put(cache_key, json.dumps(ai_data, ensure_ascii=False))
+            yield ("fin", ai_data)
+
+    def _prepare_slides_prompt(self, pdf_text, use_cache=True, map_reduce=False):
+        """
+        Construye el prompt de las diapositivas: con el texto recortado a
+        MAX_PROMPT_CHARS o, en modo map-reduce con textos largos, con los
+        resúmenes por bloques. Devuelve None si la fase 'map' falla.
+        """
+        if map_reduce and len(pdf_text) > MAX_PROMPT_CHARS:
+            resumenes = self._summarize_chunks(pdf_text, use_cache)
+            if not resumenes:
+                return None
+            return self._reduce_prompt(resumenes)
+        return self._build_slides_prompt(pdf_text[:MAX_PROMPT_CHARS])
+
+    def _reduce_prompt(self, resumenes):
+        """Prompt de la fase 'reduce': las diapositivas a partir de los resúmenes por bloques."""
+        return self._build_slides_prompt(
+            resumenes[:MAX_REDUCE_CHARS],
+            intro="He resumido por secciones un documento PDF largo. Estos son los resúmenes, en orden."
+        )
+
+    def get_content_from_summaries(self, resumenes, use_cache=True):
+        """
+        Fase 'reduce' sola: genera el contenido de la presentación a partir
+        de resúmenes ya hechos (p. ej. los de summarize_sections, guardados
+        de una ejecución anterior). Devuelve ai_data, o None si falla.
         """
         if not self.auth_headers or TU_PROJECT_ID is None:
             print("Error: El PROJECT_ID no está configurado (revisa tu .env) o la autenticación falló.")
             return None
+        texto = "\n\n".join(f"[Parte {i}] {r}" for i, r in enumerate(resumenes, start=1) if r)
+        print("Enviando resúmenes a la IA para análisis (Vertex AI)...")
+        return self._generate(self._reduce_prompt(texto), SLIDES_GENERATION_CONFIG, use_cache,
+                              parse=load_presentation, recover=self._recover_presentation,
+                              slides=MAX_PUNTOS_CLAVE)
 
+    def _build_slides_prompt(self, text, intro="He extraído el siguiente texto de un documento PDF."):
+        """Construye el prompt que pide a la IA el JSON de la presentación."""
         # --- El "Prompt" para la IA ---
         # Esta es la parte más importante. Le decimos a la IA CÓMO
         # queremos la respuesta. Le pedimos formato JSON.
-        prompt = f"""
+        return f"""
         Eres un asistente experto en crear presentaciones profesionales.
-        He extraído el siguiente texto de un documento PDF.
+        {intro}
         Por favor, analiza el texto y genera un resumen optimizado para Google Slides.
 
         Tu respuesta DEBE ser únicamente un objeto JSON válido, con la siguiente estructura:
@@ -167,67 +796,288 @@ class SlideGenerator:
         Genera entre 3 y 5 puntos clave, dependiendo del contenido.
 
         --- TEXTO DEL PDF ---
-        {pdf_text[:8000]}
+        {text}
         --- FIN DEL TEXTO ---
         """
 
+    def _summarize_chunks(self, pdf_text, use_cache=True):
+        """
+        Fase 'map': divide el texto en bloques y los resume en paralelo
+        (un hilo por bloque, como mucho MAP_REDUCE_WORKERS a la vez).
+
+        Devuelve los resúmenes unidos en el orden del documento, o None si
+        no se pudo resumir ningún bloque.
+        """
+        # Margen de 200 caracteres por bloque: al cortar en espacios los
+        # bloques salen algo más cortos y no queremos pasar de MAX_MAP_CHUNKS
+        chunk_chars = max(MAP_CHUNK_CHARS, -(-len(pdf_text) // MAX_MAP_CHUNKS) + 200)
+        chunks = split_into_chunks(pdf_text, chunk_chars)
+        total = len(chunks)
+        print(f"Texto largo ({len(pdf_text)} caracteres): resumiendo {total} bloques en paralelo...")
+        resumenes = self.summarize_sections(chunks, use_cache)
+
+        fallidos = sum(1 for r in resumenes if not r)
+        if fallidos == total:
+            print("Error: No se pudo resumir ningún bloque del documento.")
+            return None
+        if fallidos:
+            print(f"Aviso: {fallidos} de {total} bloques no se pudieron resumir y se omiten.")
+
+        return "\n\n".join(
+            f"[Parte {i}] {r}" for i, r in enumerate(resumenes, start=1) if r
+        )
+
+    def summarize_sections(self, chunks, use_cache=True, numbers=None, total=None):
+        """
+        Resume en paralelo (como mucho MAP_REDUCE_WORKERS a la vez) los
+        bloques de texto 'chunks'. Para resumir solo algunas partes de un
+        documento, 'numbers' indica el número de cada bloque (desde 1) y
+        'total' cuántas partes tiene el documento entero.
+
+        Returns:
+            Lista paralela a 'chunks' con el resumen de cada bloque, o None
+            en los que fallaron.
+        """
+        if not chunks:
+            return []
+        numbers = numbers or range(1, len(chunks) + 1)
+        total = total or len(chunks)
+
+        def resumir(numero, chunk):
+            prompt = f"""
+        Eres un asistente que prepara material para una presentación.
+        A continuación tienes la parte {numero} de {total} de un documento PDF.
+        Resúmela en notas concisas en texto plano (como máximo unas 300 palabras),
+        conservando los conceptos, cifras y conclusiones más importantes.
+
+        --- TEXTO DEL PDF ---
+        {chunk}
+        --- FIN DEL TEXTO ---
+        """
+            # Un resumen vacío o cortado no se guarda en la caché ni llega al 'reduce'
+            return self._generate(prompt, MAP_GENERATION_CONFIG, use_cache, parse=parse_summary,
+                                  allow_truncated=False)
+
+        with ThreadPoolExecutor(max_workers=min(MAP_REDUCE_WORKERS, len(chunks))) as pool:
+            return list(pool.map(metrics.bind(resumir), numbers, chunks))
+
+    def _generate(self, prompt, generation_config, use_cache=True, parse=json.loads, history=None,
+                  recover=None, slides=None, allow_truncated=True):
+        """
+        Hace una llamada 'generateContent' a Vertex AI y devuelve el texto
+        generado, convertido con 'parse'. Usa la caché de respuestas si
+        está disponible (solo se guardan respuestas que 'parse' acepta).
+
+        Args:
+            history: Turnos anteriores de la conversación ('contents' de
+                Vertex AI) que van antes de 'prompt'.
+            recover: Función opcional recover(contents, texto, finish_reason,
+                use_cache) a la que se pasa una respuesta que 'parse' no
+                acepta. Devuelve (resultado, completo): si el resultado no
+                es None se usa, y solo si está completo se guarda en la
+                caché como JSON (lo incompleto se vuelve a generar la
+                próxima vez).
+            slides: Número de diapositivas pedidas, para ajustar
+                maxOutputTokens (ver route_model).
+            allow_truncated: Con False, una respuesta cortada por el límite
+                de tokens (finishReason MAX_TOKENS) se trata como una que
+                'parse' no acepta.
+
+        Devuelve None si ocurre cualquier error.
+        """
+        import requests
+        contents = list(history or []) + [
+            # Añadimos "role": "user" para el modelo gemini-2.5-pro
+            {"role": "user", "parts": [{"text": prompt}]}
+        ]
+        # El modelo se elige por el tamaño del documento (el primer turno), así
+        # que las continuaciones de una conversación van al mismo modelo
+        categoria, generation_config = route_model(
+            len(contents[0]["parts"][0]["text"]), generation_config, slides, self.model_tiers
+        )
+        endpoint = model_endpoint(categoria["model"])
         # Preparamos el "payload" para la API de Gemini
-        payload = {
-            "contents": [
-                # Añadimos "role": "user" para el modelo gemini-2.5-pro
-                {"role": "user", "parts": [{"text": prompt}]}
-            ],
-            "generationConfig": {
-                "responseMimeType": "application/json", # ¡Le pedimos JSON directamente!
-                "temperature": 0.5,
-                # Aumentamos el límite de tokens para que la IA no se corte
-                "maxOutputTokens": 8192
-            }
-        }
+        payload = {"contents": contents, "generationConfig": generation_config}
+        generated_content = None
 
-        print("Enviando texto a la IA para análisis (Vertex AI)...")
-        
-        try:
-            # Hacemos la llamada POST a la API de Vertex AI
-            response = requests.post(API_ENDPOINT, headers=self.auth_headers, json=payload, timeout=90)
+        with metrics.span("vertex.generate", prompt_chars=len(prompt),
+                          mime_type=generation_config.get("responseMimeType"),
+                          model=categoria["model"], tier=categoria["tier"]) as attrs:
+            metrics.count("vertex.prompt_chars", len(prompt))
+            metrics.count(f"vertex.tier.{categoria['tier']}")
+            cache_key = None
+            if self.response_cache is not None:
+                cache_key = make_key("gemini", endpoint, payload["contents"], payload["generationConfig"])
+                if use_cache:
+                    cached_content = self.response_cache.get(cache_key)
+                    if cached_content is not None:
+                        try:
+                            resultado = parse(cached_content)
+                        except ValueError:
+                            # Guardada por una versión anterior que la aceptaba: se regenera
+                            print("Aviso: La respuesta de la caché no es válida; se vuelve a generar.")
+                        else:
+                            print("Respuesta de la IA recuperada de la caché.")
+                            attrs.update(cached=True, response_chars=len(cached_content))
+                            return resultado
+
+            try:
+                # Hacemos la llamada POST a la API de Vertex AI
+                attrs["cached"] = False
+                response = self._post_with_retries(endpoint, payload)
+                attrs["status"] = response.status_code
             
-            # Manejar errores de la API
-            if response.status_code != 200:
-                print(f"Error de la API de IA (Código: {response.status_code}): {response.text}")
-                return None
+                # Manejar errores de la API
+                if response.status_code != 200:
+                    print(f"Error de la API de IA (Código: {response.status_code}): {response.text}")
+                    return None
 
-            response_json = response.json()
+                response_json = response.json()
+                self._record_usage(attrs, response_json.get("usageMetadata"))
             
-            # Extraer el contenido JSON generado
-            # La estructura de respuesta de Gemini es un poco anidada
-            if "candidates" in response_json and len(response_json["candidates"]) > 0:
-                generated_content = response_json["candidates"][0]["content"]["parts"][0]["text"]
+                # Extraer el contenido JSON generado
+                # La estructura de respuesta de Gemini es un poco anidada
+                if "candidates" in response_json and len(response_json["candidates"]) > 0:
+                    candidate = response_json["candidates"][0]
+                    # Una respuesta cortada por el límite de tokens puede no traer 'parts'
+                    generated_content = "".join(
+                        part.get("text", "") for part in candidate.get("content", {}).get("parts", [])
+                    )
+                    finish_reason = candidate.get("finishReason")
+                    attrs.update(response_chars=len(generated_content), finish_reason=finish_reason)
                 
-                # Convertir la *cadena* JSON generada en un *objeto* Python
-                print("Análisis de IA recibido. Decodificando JSON...")
-                return json.loads(generated_content)
-            else:
-                print("La respuesta de la IA no tuvo el formato esperado.")
-                print(response_json)
+                    # Convertir la *cadena* generada (JSON o texto) con 'parse'
+                    print("Respuesta de la IA recibida. Procesando...")
+                    try:
+                        if finish_reason == "MAX_TOKENS" and not allow_truncated:
+                            raise ValueError("la respuesta se cortó por el límite de tokens")
+                        ai_data = parse(generated_content)
+                    except ValueError:
+                        ai_data, completo = None, False
+                        if recover is not None:
+                            ai_data, completo = recover(payload["contents"], generated_content,
+                                                        finish_reason, use_cache)
+                        if ai_data is None:
+                            raise
+                        attrs["recovered"] = True
+                        if not completo:
+                            print("Aviso: La presentación recuperada está incompleta; no se guarda en la caché.")
+                            return ai_data
+                        # En la caché va lo recuperado, que 'parse' sí acepta
+                        generated_content = json.dumps(ai_data, ensure_ascii=False)
+                    # Solo se guardan respuestas que se han podido decodificar
+                    if cache_key is not None:
+                        self.response_cache.put(cache_key, generated_content)
+                    return ai_data
+                else:
+                    print("La respuesta de la IA no tuvo el formato esperado.")
+                    print(response_json)
+                    return None
+
+            except requests.exceptions.RequestException as e:
+                print(f"Error de conexión al llamar a la API de IA: {e}")
+                return None
+            except ValueError as e:
+                print(f"Error al decodificar la respuesta JSON de la IA: {e}")
+                if generated_content is not None:
+                    print(f"Respuesta recibida: {generated_content}")
+                return None
+            except Exception as e:
+                print(f"Error inesperado en _get_ai_summary: {e}")
                 return None
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error de conexión al llamar a la API de IA: {e}")
-            return None
-        except json.JSONDecodeError as e:
-            print(f"Error al decodificar la respuesta JSON de la IA: {e}")
-            print(f"Respuesta recibida: {generated_content}")
-            return None
-        except Exception as e:
-            print(f"Error inesperado en _get_ai_summary: {e}")
+    def _recover_presentation(self, contents, texto, finish_reason, use_cache=True):
+        """
+        'recover' de _generate para el JSON de la presentación: aprovecha
+        el título y los puntos clave completos de una respuesta cortada o
+        mal formada y, si se cortó, pide a la IA solo los puntos que faltan
+        (ver _request_missing_points).
+
+        Returns:
+            (ai_data, completo): ai_data (None si no se pudo recuperar
+            ninguna diapositiva) y si se puede guardar en la caché (ver
+            _complete_truncated).
+        """
+        ai_data, cortada = salvage_presentation(texto)
+        if ai_data is None:
+            print("No se pudo recuperar nada de la respuesta de la IA.")
+            return None, False
+        cortada = cortada or finish_reason == "MAX_TOKENS"
+        motivo = "se cortó" if cortada else "no tenía el formato esperado"
+        print(f"La respuesta de la IA {motivo}: se recuperaron {len(ai_data['puntos_clave'])} diapositivas.")
+        metrics.count("vertex.json_recovered")
+        if cortada:
+            ai_data, completo = self._complete_truncated(contents, texto, ai_data, use_cache)
+        else:
+            completo = len(ai_data["puntos_clave"]) >= MAX_PUNTOS_CLAVE
+        if not ai_data["puntos_clave"]:
+            return None, False
+        return ai_data, completo
+
+    def _complete_truncated(self, contents, texto, ai_data, use_cache=True):
+        """
+        Añade a ai_data los puntos que faltan (si JSON_TAIL_RECOVERY lo
+        permite y falta alguno). Devuelve (ai_data, completo): completo es
+        False si siguen faltando puntos porque no se pidieron o porque la
+        petición falló; un resultado así no debe guardarse en la caché.
+        """
+        faltan = MAX_PUNTOS_CLAVE - len(ai_data["puntos_clave"])
+        if faltan <= 0:
+            return ai_data, True
+        if not JSON_TAIL_RECOVERY:
+            return ai_data, False
+        nuevos = self._request_missing_points(contents, texto, ai_data, faltan, use_cache)
+        if nuevos is None:
+            return ai_data, False
+        return dict(ai_data, puntos_clave=ai_data["puntos_clave"] + nuevos[:faltan]), True
+
+    def _request_missing_points(self, contents, texto, ai_data, faltan, use_cache=True):
+        """
+        Continúa la conversación de una respuesta cortada pidiendo solo los
+        puntos clave que faltan (como mucho 'faltan'), sin repetir el resto:
+        la respuesta es mucho más corta que una generación completa.
+
+        Returns:
+            La lista de puntos clave nuevos (vacía si no faltaba ninguno), o
+            None si la petición falla.
+        """
+        titulos = "\n".join(f"- {p['titulo_diapositiva']}" for p in ai_data["puntos_clave"]) or "(ninguna)"
+        prompt = f"""
+        Tu respuesta anterior se cortó antes de terminar. Ya tengo estas diapositivas:
+        {titulos}
+
+        Devuelve ÚNICAMENTE un objeto JSON válido con la forma {{"puntos_clave": [...]}} que contenga
+        los puntos clave que faltan (como mucho {faltan}), con la misma estructura que antes
+        ("titulo_diapositiva" y "contenido_diapositiva") y sin repetir ninguno de los anteriores.
+        Si no falta ninguno, devuelve {{"puntos_clave": []}}.
+        """
+        print(f"Pidiendo a la IA solo los puntos clave que faltan (como mucho {faltan})...")
+        metrics.count("vertex.tail_requests")
+        historial = contents + [{"role": "model", "parts": [{"text": texto}]}]
+        nuevos = self._generate(prompt, SLIDES_GENERATION_CONFIG, use_cache, parse=salvage_points,
+                                history=historial, slides=faltan)
+        if nuevos is None:
+            print("Aviso: No se pudieron obtener los puntos que faltaban; se usa lo recuperado.")
             return None
+        vistos = {p["titulo_diapositiva"] for p in ai_data["puntos_clave"]}
+        return [p for p in nuevos if p["titulo_diapositiva"] not in vistos]
 
+    @staticmethod
+    def _record_usage(attrs, usage):
+        """Añade al span el recuento de tokens ('usageMetadata') de una respuesta de Vertex AI."""
+        if not usage:
+            return
+        attrs["prompt_tokens"] = usage.get("promptTokenCount")
+        if "candidatesTokenCount" in usage:
+            attrs["response_tokens"] = usage["candidatesTokenCount"]
+            metrics.count("vertex.response_tokens", usage["candidatesTokenCount"])
 
     def create_presentation(self, ai_data):
         """
         Usa la API de Google Slides para crear la presentación
         basada en los datos estructurados de la IA.
         """
+        from googleapiclient.errors import HttpError
         if not self.slides_service:
             print("Error: El servicio de Google Slides no está inicializado.")
             return None
@@ -235,104 +1085,437 @@ class SlideGenerator:
         try:
             # 1. Crear la presentación en blanco
             print(f"Creando nueva presentación titulada: {ai_data['titulo_presentacion']}")
-            presentation = self.slides_service.presentations().create(
-                body={"title": ai_data["titulo_presentacion"]}
-            ).execute()
+            with metrics.span("slides.create"):
+                presentation = self._slides_execute(self.slides_service.presentations().create(
+                    body={"title": ai_data["titulo_presentacion"]}
+                ))
 
             presentation_id = presentation.get("presentationId")
-            presentation_url = presentation.get("presentationUrl")
             print(f"Presentación creada con ID: {presentation_id}")
 
             # 2. Preparar la lista de "requests" para la API
             # La API de Slides funciona por lotes (batch)
-            requests_batch = []
+            requests_batch = self._deck_requests(ai_data)
+
+            # 3. Ejecutar todas las peticiones en lote (en varios
+            # batchUpdate seguidos si la lista es muy larga)
+            print(f"Enviando {len(requests_batch)} peticiones en lote a Google Slides...")
+            for trozo in split_slide_requests(requests_batch):
+                with metrics.span("slides.batch_update", requests=len(trozo)):
+                    self._slides_execute(self.slides_service.presentations().batchUpdate(
+                        presentationId=presentation_id,
+                        body={"requests": trozo}
+                    ))
+                metrics.count("slides.batch_requests", len(trozo))
+
+            print("¡Presentación creada exitosamente!")
+            # Devolvemos el objeto 'presentation' completo
+            return presentation
+
+        except HttpError as err:
+            print(f"Error al crear las diapositivas (HttpError): {err}")
+            return None
+        except Exception as e:
+            print(f"Error inesperado en _create_slides: {e}")
+            return None
+
+    def create_presentations_batch(self, decks):
+        """
+        Crea muchas presentaciones a la vez agrupando las llamadas de
+        todas ellas en peticiones HTTP 'batch' de Google (BatchHttpRequest),
+        en lugar de hacer dos o más viajes de ida y vuelta por presentación.
+
+        Primero se envían todos los 'create' (en lotes de
+        SLIDES_BATCH_MAX_CALLS) y después los batchUpdate por rondas: en
+        cada ronda va el siguiente trozo (ver split_slide_requests) de cada
+        presentación, así los trozos de una misma presentación se aplican
+        en orden.
+
+        Args:
+            decks: Lista de ai_data (como los de get_presentation_content).
+
+        Returns:
+            Lista paralela a 'decks' de tuplas (presentation, error). Si la
+            presentación se creó pero falló al añadir diapositivas, vienen
+            ambas cosas; si todo fue bien, error es None.
+        """
+        if not self.slides_service:
+            print("Error: El servicio de Google Slides no está inicializado.")
+            return [(None, "El servicio de Google Slides no está inicializado.")] * len(decks)
+
+        presentaciones = [None] * len(decks)
+        errores = [None] * len(decks)
+
+        def on_create(request_id, response, exception):
+            i = int(request_id)
+            if exception is not None:
+                errores[i] = f"Error al crear la presentación: {exception}"
+            else:
+                presentaciones[i] = response
+
+        print(f"Creando {len(decks)} presentaciones en lote...")
+        service = self.slides_service.presentations()
+        self._execute_batch(
+            [(str(i), service.create(body={"title": ai_data["titulo_presentacion"]}))
+             for i, ai_data in enumerate(decks)],
+            on_create
+        )
+
+        def on_update(request_id, response, exception):
+            if exception is not None:
+                errores[int(request_id)] = f"Error al añadir diapositivas: {exception}"
+
+        trozos = {
+            i: split_slide_requests(self._deck_requests(ai_data))
+            for i, ai_data in enumerate(decks) if presentaciones[i] is not None
+        }
+        ronda = 0
+        while True:
+            llamadas = [
+                (str(i), service.batchUpdate(
+                    presentationId=presentaciones[i]["presentationId"],
+                    body={"requests": partes[ronda]}
+                ))
+                for i, partes in trozos.items() if ronda < len(partes) and errores[i] is None
+            ]
+            if not llamadas:
+                break
+            self._execute_batch(llamadas, on_update)
+            metrics.count("slides.batch_requests", sum(len(trozos[int(i)][ronda]) for i, _ in llamadas))
+            ronda += 1
+
+        fallidas = sum(1 for e in errores if e)
+        print(f"Presentaciones en lote: {len(decks) - fallidas} creadas, {fallidas} con errores.")
+        return list(zip(presentaciones, errores))
+
+    def _execute_batch(self, llamadas, callback):
+        """
+        Ejecuta una lista de (request_id, HttpRequest) en peticiones HTTP
+        'batch' de como mucho SLIDES_BATCH_MAX_CALLS llamadas. El resultado
+        de cada llamada llega a callback(request_id, response, exception);
+        si falla la petición batch entera, todas sus llamadas reciben el error.
+        Las llamadas que reciben un 429 se reenvían en otra petición batch
+        (tras la espera de slides_governor) hasta 'max_retries' veces.
+        """
+        from googleapiclient.errors import HttpError
+
+        for inicio in range(0, len(llamadas), SLIDES_BATCH_MAX_CALLS):
+            grupo = llamadas[inicio:inicio + SLIDES_BATCH_MAX_CALLS]
+            for intento in range(self.max_retries + 1):
+                peticiones = dict(grupo)
+                limitadas = []
+
+                def on_respuesta(request_id, response, exception):
+                    if isinstance(exception, HttpError) and exception.resp.status == 429:
+                        self.slides_governor.on_throttled(self._retry_after(exception.resp))
+                        if intento < self.max_retries:
+                            limitadas.append((request_id, peticiones[request_id]))
+                            return
+                    callback(request_id, response, exception)
+
+                batch = self.slides_service.new_batch_http_request(callback=on_respuesta)
+                for request_id, peticion in grupo:
+                    batch.add(peticion, request_id=request_id)
+                try:
+                    # Cada llamada del lote cuenta en la cuota por minuto
+                    with metrics.span("slides.http_batch", calls=len(grupo)), \
+                            self.slides_governor.slot(cost=len(grupo)):
+                        batch.execute(http=self._slides_http())
+                except Exception as e:
+                    print(f"Error en la petición en lote a Google Slides: {e}")
+                    for request_id, _ in grupo:
+                        callback(request_id, None, e)
+                    break
+                if not limitadas:
+                    break
+                print(f"Google Slides respondió 429 (cuota) a {len(limitadas)} llamadas del lote. Reintentando...")
+                metrics.count("slides.retries", len(limitadas))
+                grupo = limitadas
+
+    def _deck_requests(self, ai_data):
+        """Todas las peticiones de batchUpdate que rellenan una presentación nueva."""
+        # Diapositiva de título y una por cada punto clave
+        requests_batch = self._title_slide_requests(ai_data["titulo_presentacion"])
+        for slide_count, punto in enumerate(ai_data["puntos_clave"], start=1):
+            requests_batch.extend(self._content_slide_requests(slide_count, punto))
+
+        # Borrar la diapositiva en blanco inicial (creada por defecto)
+        # La primera diapositiva por defecto se llama 'p'
+        requests_batch.append({
+            "deleteObject": {
+                "objectId": "p" 
+            }
+        })
+        return requests_batch
+
+    def update_presentation(self, presentation_id, old_ai_data, new_ai_data):
+        """
+        Actualiza en su sitio una presentación creada a partir de
+        'old_ai_data' para que refleje 'new_ai_data', enviando solo las
+        peticiones de deck_diff_requests.
 
-            # 3. Crear la diapositiva de Título
-            title_slide_id = "title_slide_01"
-            requests_batch.append({
+        Returns:
+            El número de peticiones enviadas, o None si falla.
+        """
+        from googleapiclient.errors import HttpError
+        if not self.slides_service:
+            print("Error: El servicio de Google Slides no está inicializado.")
+            return None
+
+        requests_batch = self.deck_diff_requests(old_ai_data, new_ai_data)
+        if not requests_batch:
+            print("La presentación ya está al día.")
+            return 0
+        try:
+            print(f"Actualizando la presentación con {len(requests_batch)} peticiones...")
+            for trozo in split_slide_requests(requests_batch):
+                with metrics.span("slides.batch_update", requests=len(trozo), incremental=True):
+                    self._slides_execute(self.slides_service.presentations().batchUpdate(
+                        presentationId=presentation_id,
+                        body={"requests": trozo}
+                    ))
+                metrics.count("slides.batch_requests", len(trozo))
+            print("¡Presentación actualizada!")
+            return len(requests_batch)
+        except HttpError as err:
+            print(f"Error al actualizar la presentación (HttpError): {err}")
+            return None
+        except Exception as e:
+            print(f"Error inesperado en update_presentation: {e}")
+            return None
+
+    def deck_diff_requests(self, old_ai_data, new_ai_data):
+        """
+        Peticiones mínimas de batchUpdate para pasar de la presentación de
+        'old_ai_data' a la de 'new_ai_data', usando los IDs fijos que
+        asignan _title_slide_requests y _content_slide_requests: se
+        reemplaza el texto que cambió, se añaden al final las diapositivas
+        nuevas y se borran las que sobran.
+        """
+        requests_batch = _replace_text_requests(
+            "title_slide_title", old_ai_data["titulo_presentacion"], new_ai_data["titulo_presentacion"]
+        )
+        antiguos, nuevos = old_ai_data["puntos_clave"], new_ai_data["puntos_clave"]
+        for slide_count in range(1, max(len(antiguos), len(nuevos)) + 1):
+            if slide_count > len(antiguos):
+                requests_batch.extend(self._content_slide_requests(slide_count, nuevos[slide_count - 1]))
+            elif slide_count > len(nuevos):
+                requests_batch.append({"deleteObject": {"objectId": f"content_slide_{slide_count:02d}"}})
+            else:
+                antes, ahora = antiguos[slide_count - 1], nuevos[slide_count - 1]
+                requests_batch.extend(_replace_text_requests(
+                    f"title_placeholder_{slide_count:02d}",
+                    antes["titulo_diapositiva"], ahora["titulo_diapositiva"]
+                ))
+                requests_batch.extend(_replace_text_requests(
+                    f"body_placeholder_{slide_count:02d}",
+                    antes["contenido_diapositiva"], ahora["contenido_diapositiva"]
+                ))
+        return requests_batch
+
+    def _title_slide_requests(self, titulo, insertion_index=None):
+        """Peticiones que crean la diapositiva de título con su texto."""
+        create_slide = {
+            "objectId": "title_slide_01",
+            "slideLayoutReference": {
+                "predefinedLayout": "TITLE_SLIDE"
+            },
+            # --- ¡¡AQUÍ ESTÁ LA CORRECCIÓN!! ---
+            # El layout TITLE_SLIDE requiere mapear AMBOS placeholders
+            # (el título y el subtítulo) aunque no usemos el subtítulo.
+            "placeholderIdMappings": [
+                {"layoutPlaceholder": {"type": "CENTERED_TITLE"}, "objectId": "title_slide_title"},
+                {"layoutPlaceholder": {"type": "SUBTITLE"}, "objectId": "title_slide_subtitle"}
+            ]
+        }
+        if insertion_index is not None:
+            create_slide["insertionIndex"] = insertion_index
+        return [
+            {"createSlide": create_slide},
+            # Insertar el texto del título
+            # (No insertamos texto en "title_slide_subtitle", pero ya está mapeado)
+            {
+                "insertText": {
+                    "objectId": "title_slide_title",
+                    "text": titulo
+                }
+            },
+        ]
+
+    def _content_slide_requests(self, slide_count, punto):
+        """Peticiones que crean la diapositiva de contenido número 'slide_count'."""
+        slide_id = f"content_slide_{slide_count:02d}"
+        title_placeholder_id = f"title_placeholder_{slide_count:02d}"
+        body_placeholder_id = f"body_placeholder_{slide_count:02d}"
+        return [
+            # Crear la diapositiva (layout "TITLE_AND_BODY")
+            {
                 "createSlide": {
-                    "objectId": title_slide_id,
+                    "objectId": slide_id,
                     "slideLayoutReference": {
-                        "predefinedLayout": "TITLE_SLIDE"
+                        "predefinedLayout": "TITLE_AND_BODY"
                     },
-                    # --- ¡¡AQUÍ ESTÁ LA CORRECCIÓN!! ---
-                    # El layout TITLE_SLIDE requiere mapear AMBOS placeholders
-                    # (el título y el subtítulo) aunque no usemos el subtítulo.
                     "placeholderIdMappings": [
-                        {"layoutPlaceholder": {"type": "CENTERED_TITLE"}, "objectId": "title_slide_title"},
-                        {"layoutPlaceholder": {"type": "SUBTITLE"}, "objectId": "title_slide_subtitle"}
+                        {"layoutPlaceholder": {"type": "TITLE"}, "objectId": title_placeholder_id},
+                        {"layoutPlaceholder": {"type": "BODY"}, "objectId": body_placeholder_id},
                     ]
                 }
-            })
-            # Insertar el texto del título
-            requests_batch.append({
+            },
+            # Insertar el título de la diapositiva
+            {
                 "insertText": {
-                    "objectId": "title_slide_title",
-                    "text": ai_data["titulo_presentacion"]
+                    "objectId": title_placeholder_id,
+                    "text": punto["titulo_diapositiva"]
                 }
-            })
-            # (No insertamos texto en "title_slide_subtitle", pero ya está mapeado)
-
-            # 4. Iterar y crear las diapositivas de Puntos Clave
-            slide_count = 1
-            for punto in ai_data["puntos_clave"]:
-                slide_id = f"content_slide_{slide_count:02d}"
-                title_placeholder_id = f"title_placeholder_{slide_count:02d}"
-                body_placeholder_id = f"body_placeholder_{slide_count:02d}"
-                
-                # Crear la diapositiva (layout "TITLE_AND_BODY")
-                requests_batch.append({
-                    "createSlide": {
-                        "objectId": slide_id,
-                        "slideLayoutReference": {
-                            "predefinedLayout": "TITLE_AND_BODY"
-                        },
-                        "placeholderIdMappings": [
-                            {"layoutPlaceholder": {"type": "TITLE"}, "objectId": title_placeholder_id},
-                            {"layoutPlaceholder": {"type": "BODY"}, "objectId": body_placeholder_id},
-                        ]
-                    }
-                })
-                # Insertar el título de la diapositiva
-                requests_batch.append({
-                    "insertText": {
-                        "objectId": title_placeholder_id,
-                        "text": punto["titulo_diapositiva"]
-                    }
-                })
-                # Insertar el contenido de la diapositiva
-                requests_batch.append({
-                    "insertText": {
-                        "objectId": body_placeholder_id,
-                        "text": punto["contenido_diapositiva"]
-                    }
-                })
-                slide_count += 1
-            
-            # 5. Borrar la diapositiva en blanco inicial (creada por defecto)
-            # La primera diapositiva por defecto se llama 'p'
-            requests_batch.append({
-                "deleteObject": {
-                    "objectId": "p" 
+            },
+            # Insertar el contenido de la diapositiva
+            {
+                "insertText": {
+                    "objectId": body_placeholder_id,
+                    "text": punto["contenido_diapositiva"]
                 }
-            })
+            },
+        ]
 
-            # 6. Ejecutar todas las peticiones en un solo lote
-            print(f"Enviando {len(requests_batch)} peticiones en lote a Google Slides...")
-            self.slides_service.presentations().batchUpdate(
-                presentationId=presentation_id,
-                body={"requests": requests_batch}
-            ).execute()
+    def create_presentation_streaming(self, pdf_text, deck_title, use_cache=True, map_reduce=False,
+                                      on_slide=None):
+        """
+        Genera el contenido en streaming y va construyendo la presentación
+        a la vez: la presentación (vacía) se crea antes de lanzar la IA, y
+        cada diapositiva se añade en cuanto su punto clave está completo.
 
-            print("¡Presentación creada exitosamente!")
-            # Devolvemos el objeto 'presentation' completo
+        Como la API de Slides no permite renombrar la presentación, el
+        archivo se llama 'deck_title' (p. ej. el nombre del PDF); el título
+        generado por la IA va en la diapositiva de título.
+
+        Args:
+            on_slide: Función opcional llamada con el número de diapositivas
+                añadidas hasta el momento (para mostrar progreso).
+
+        Returns:
+            La tupla (presentation, ai_data), o (None, None) si falla.
+        """
+        presentation = self.create_presentation_shell(deck_title)
+        if not presentation:
+            return None, None
+
+        eventos = self.stream_presentation_content(pdf_text, use_cache, map_reduce)
+        ai_data = self.append_slides_from_events(presentation, eventos, on_slide)
+        if not ai_data:
+            return None, None
+        return presentation, ai_data
+
+    def create_presentation_shell(self, deck_title):
+        """
+        Crea una presentación vacía (solo con la diapositiva inicial 'p')
+        a la que luego se añaden diapositivas con append_slides_from_events.
+        Devuelve el objeto 'presentation', o None si falla.
+        """
+        from googleapiclient.errors import HttpError
+        if not self.slides_service:
+            print("Error: El servicio de Google Slides no está inicializado.")
+            return None
+
+        try:
+            print(f"Creando nueva presentación titulada: {deck_title}")
+            with metrics.span("slides.create"):
+                presentation = self._slides_execute(self.slides_service.presentations().create(
+                    body={"title": deck_title}
+                ))
+            print(f"Presentación creada con ID: {presentation.get('presentationId')}")
             return presentation
+        except HttpError as err:
+            print(f"Error al crear la presentación (HttpError): {err}")
+            return None
+        except Exception as e:
+            print(f"Error inesperado en create_presentation_shell: {e}")
+            return None
 
+    def append_slides_from_events(self, presentation, eventos, on_slide=None):
+        """
+        Consume eventos ("titulo" / "punto" / "fin", como los de
+        stream_presentation_content) y añade cada diapositiva a la
+        presentación en cuanto llega.
+
+        Args:
+            presentation: Presentación creada con create_presentation_shell.
+            eventos: Iterable de tuplas (tipo, valor); termina con "fin".
+            on_slide: Función opcional llamada con el número de diapositivas
+                añadidas hasta el momento (para mostrar progreso).
+
+        Returns:
+            El ai_data del evento "fin", o None si algo falla.
+        """
+        from googleapiclient.errors import HttpError
+        presentation_id = presentation.get("presentationId")
+
+        # En cuanto un lote falla no se envía ninguno más: los siguientes
+        # darían una presentación con huecos (o fallarían también)
+        fallo = threading.Event()
+
+        def enviar(requests_batch):
+            if fallo.is_set():
+                return False
+            try:
+                with metrics.span("slides.batch_update", requests=len(requests_batch)):
+                    self._slides_execute(self.slides_service.presentations().batchUpdate(
+                        presentationId=presentation_id,
+                        body={"requests": requests_batch}
+                    ))
+            except Exception:
+                fallo.set()
+                raise
+            metrics.count("slides.batch_requests", len(requests_batch))
+            return True
+
+        def avisar(futuro, n):
+            if not futuro.exception() and futuro.result():
+                on_slide(n)
+
+        # Las diapositivas se envían desde un único hilo aparte (en orden),
+        # para no dejar de leer el streaming mientras Slides responde
+        ai_data = None
+        pendientes = []
+        slide_count = 0
+        borrada_inicial = False
+        with ThreadPoolExecutor(max_workers=1) as slides_pool:
+            for tipo, valor in eventos:
+                if tipo == "fin":
+                    ai_data = valor
+                    break
+                if fallo.is_set():
+                    break
+                if tipo == "titulo":
+                    # Siempre la primera, aunque llegue después de algún punto
+                    requests_batch = self._title_slide_requests(valor, insertion_index=0)
+                else:
+                    slide_count += 1
+                    requests_batch = self._content_slide_requests(slide_count, valor)
+                if not borrada_inicial:
+                    # La primera diapositiva por defecto se llama 'p'
+                    requests_batch.append({"deleteObject": {"objectId": "p"}})
+                    borrada_inicial = True
+                pendientes.append(slides_pool.submit(metrics.bind(enviar), requests_batch))
+                if on_slide:
+                    pendientes[-1].add_done_callback(lambda f, n=len(pendientes): avisar(f, n))
+
+        try:
+            # result() relanza el error del primer lote que falló (los
+            # siguientes ya no se enviaron)
+            for futuro in pendientes:
+                futuro.result()
         except HttpError as err:
-            print(f"Error al crear las diapositivas (HttpError): {err}")
+            print(f"Error al añadir diapositivas (HttpError): {err}")
             return None
         except Exception as e:
-            print(f"Error inesperado en _create_slides: {e}")
+            print(f"Error inesperado en append_slides_from_events: {e}")
+            return None
+
+        if not ai_data or not pendientes:
+            print("Error: La IA no devolvió contenido.")
             return None
 
+        print("¡Presentación creada exitosamente!")
+        return ai_data
+
 # --- Fin de la clase SlideGenerator ---
\ No newline at end of file
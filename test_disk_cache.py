@@ -0,0 +1,82 @@
+# Pruebas de la caché en disco (DiskCache): caducidad y desalojo LRU.
+# Se pueden ejecutar con pytest o directamente: python test_disk_cache.py
+import os
+import tempfile
+import time
+
+from disk_cache import DiskCache, make_key
+
+
+def texto_aleatorio():
+    # Hexadecimal aleatorio: zlib apenas lo comprime, así que el tamaño en disco es predecible
+    return os.urandom(2000).hex()
+
+
+def envejecer(cache, key, segundos):
+    """Marca la entrada 'key' como usada por última vez hace 'segundos'."""
+    instante = time.time() - segundos
+    os.utime(cache._path(key), (instante, instante))
+
+
+def test_guardar_y_recuperar():
+    cache = DiskCache(tempfile.mkdtemp(), max_bytes=10**6)
+    key = make_key("pdf_text", 1, "abc", None, True)
+    assert cache.get(key) is None
+    cache.put(key, "Texto con acentos: áéíóú ñ\nsegunda línea")
+    assert cache.get(key) == "Texto con acentos: áéíóú ñ\nsegunda línea"
+
+
+def test_make_key_es_estable():
+    assert make_key("a", {"x": 1, "y": 2}) == make_key("a", {"y": 2, "x": 1})
+    assert make_key("a", 1) != make_key("a", "1")
+
+
+def test_las_entradas_caducan():
+    cache = DiskCache(tempfile.mkdtemp(), max_bytes=10**6, ttl=0.05)
+    cache.put("clave", "valor")
+    assert cache.get("clave") == "valor"
+    time.sleep(0.1)
+    assert cache.get("clave") is None
+    # La entrada caducada se borra del disco
+    assert not os.path.exists(cache._path("clave"))
+
+
+def test_sin_ttl_no_caducan():
+    cache = DiskCache(tempfile.mkdtemp(), max_bytes=10**6)
+    cache.put("clave", "valor")
+    envejecer(cache, "clave", 10 * 365 * 24 * 3600)
+    assert cache.get("clave") == "valor"
+
+
+def test_desaloja_la_menos_usada():
+    carpeta = tempfile.mkdtemp()
+    cache = DiskCache(carpeta, max_bytes=10**6)
+    cache.put("a", texto_aleatorio())
+    tamano = os.path.getsize(cache._path("a"))
+    # Caben dos entradas, no tres
+    cache.max_bytes = int(tamano * 2.5)
+    cache.put("b", texto_aleatorio())
+    envejecer(cache, "a", 200)
+    envejecer(cache, "b", 100)
+    # Leer 'a' la convierte en la más reciente: al añadir 'c' sale 'b'
+    assert cache.get("a") is not None
+    cache.put("c", texto_aleatorio())
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert sum(e.stat().st_size for e in os.scandir(carpeta)) <= cache.max_bytes
+
+
+def test_entrada_corrupta_es_un_fallo_de_cache():
+    cache = DiskCache(tempfile.mkdtemp(), max_bytes=10**6)
+    cache.put("clave", "valor")
+    with open(cache._path("clave"), "wb") as f:
+        f.write(b"no es zlib")
+    assert cache.get("clave") is None
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
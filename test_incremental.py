@@ -0,0 +1,143 @@
+# Pruebas de la regeneración incremental (incremental y deck_diff_requests).
+# Se pueden ejecutar con pytest o directamente: python test_incremental.py
+import tempfile
+
+from disk_cache import DiskCache
+from incremental import DeckStore, changed_pages, record_new_deck, update_deck
+from pdf_processor import PDFProcessor
+from slide_generator import SlideGenerator
+from test_pdf_processor import PAGINAS, crear_pdf
+
+
+def presentacion(titulo, *puntos):
+    return {"titulo_presentacion": titulo,
+            "puntos_clave": [{"titulo_diapositiva": t, "contenido_diapositiva": c} for t, c in puntos]}
+
+
+def objetos(peticiones):
+    """(tipo de petición, objectId) de cada petición."""
+    return [(tipo, cuerpo["objectId"]) for p in peticiones for tipo, cuerpo in p.items()]
+
+
+class GeneradorFalso(SlideGenerator):
+    """SlideGenerator sin Google: la 'IA' hace una diapositiva por frase del texto."""
+
+    def __init__(self):
+        super().__init__()
+        self.creadas = 0
+        self.enviadas = []
+
+    def get_presentation_content(self, texto, use_cache=True, map_reduce=False):
+        frases = [f for f in texto.split(".") if f.strip()]
+        return presentacion("Informe", *[(f"Punto {n}", f.strip()) for n, f in enumerate(frases, 1)])
+
+    def create_presentation(self, ai_data):
+        self.creadas += 1
+        return {"presentationId": f"deck{self.creadas}", "presentationUrl": f"https://x/deck{self.creadas}"}
+
+    def update_presentation(self, presentation_id, old_ai_data, new_ai_data):
+        peticiones = self.deck_diff_requests(old_ai_data, new_ai_data)
+        self.enviadas.append((presentation_id, peticiones))
+        return len(peticiones)
+
+
+def test_diff_sin_cambios():
+    datos = presentacion("T", ("A", "texto a"), ("B", "texto b"))
+    assert SlideGenerator().deck_diff_requests(datos, datos) == []
+
+
+def test_diff_solo_lo_que_cambia():
+    antes = presentacion("T", ("A", "texto a"), ("B", "texto b"))
+    ahora = presentacion("T2", ("A", "texto a"), ("B", "texto b nuevo"))
+    assert objetos(SlideGenerator().deck_diff_requests(antes, ahora)) == [
+        ("deleteText", "title_slide_title"), ("insertText", "title_slide_title"),
+        ("deleteText", "body_placeholder_02"), ("insertText", "body_placeholder_02"),
+    ]
+
+
+def test_diff_anade_y_borra_diapositivas():
+    corta = presentacion("T", ("A", "a"))
+    larga = presentacion("T", ("A", "a"), ("B", "b"), ("C", "c"))
+    generador = SlideGenerator()
+    nuevas = generador.deck_diff_requests(corta, larga)
+    creadas = [p["createSlide"]["objectId"] for p in nuevas if "createSlide" in p]
+    assert creadas == ["content_slide_02", "content_slide_03"]
+    assert nuevas == generador._content_slide_requests(2, larga["puntos_clave"][1]) + \
+        generador._content_slide_requests(3, larga["puntos_clave"][2])
+    assert objetos(generador.deck_diff_requests(larga, corta)) == [
+        ("deleteObject", "content_slide_02"), ("deleteObject", "content_slide_03"),
+    ]
+
+
+def test_diff_texto_vacio():
+    # deleteText falla sobre una forma vacía, e insertText con texto vacío
+    antes = presentacion("T", ("A", ""))
+    ahora = presentacion("T", ("A", "ya tiene texto"))
+    assert objetos(SlideGenerator().deck_diff_requests(antes, ahora)) == [("insertText", "body_placeholder_01")]
+    assert objetos(SlideGenerator().deck_diff_requests(ahora, antes)) == [("deleteText", "body_placeholder_01")]
+
+
+def test_paginas_cambiadas():
+    assert changed_pages(["a", "b", "c"], ["a", "B", "c", "d"]) == [1, 3]
+    assert changed_pages(["a", "b", "c"], ["a", "b"]) == []
+
+
+def test_deck_store():
+    store = DeckStore(DiskCache(tempfile.mkdtemp(), max_bytes=10**6))
+    assert store.get("a.pdf") is None
+    store.put("a.pdf", {"fingerprints": ["x"], "ai_data": presentacion("Título ñ")})
+    assert store.get("a.pdf")["ai_data"]["titulo_presentacion"] == "Título ñ"
+    # Un registro de otra versión del formato no vale
+    store.put("b.pdf", {"fingerprints": []})
+    assert store.get("b.pdf") is not None
+    store.cache.put(store._key("b.pdf"), '{"version": -1, "fingerprints": []}')
+    assert store.get("b.pdf") is None
+    store.delete("a.pdf")
+    assert store.get("a.pdf") is None
+
+
+def test_update_deck_crea_y_despues_actualiza():
+    store = DeckStore(DiskCache(tempfile.mkdtemp(), max_bytes=10**7))
+    processor = PDFProcessor()
+    generador = GeneradorFalso()
+    ruta = crear_pdf(PAGINAS)
+
+    primera = update_deck(ruta, processor, generador, store, deck_key="informe")
+    assert primera["created"] and primera["changed_pages"] == len(PAGINAS)
+    assert generador.creadas == 1
+
+    # Sin cambios: no se toca la presentación
+    igual = update_deck(ruta, processor, generador, store, deck_key="informe")
+    assert igual["requests"] == 0 and igual["changed_pages"] == 0 and not igual["created"]
+    assert generador.enviadas == []
+
+    # Una página cambiada: se actualiza la misma presentación, solo esa diapositiva
+    paginas = list(PAGINAS)
+    paginas[4] = "Página de contenido número 5 revisada."
+    nueva = update_deck(crear_pdf(paginas), processor, generador, store, deck_key="informe")
+    assert not nueva["created"] and nueva["changed_pages"] == 1
+    assert nueva["presentation"]["presentationId"] == "deck1"
+    (deck, peticiones), = generador.enviadas
+    assert deck == "deck1"
+    assert {objeto for _, objeto in objetos(peticiones)} == {"body_placeholder_05"}
+
+
+def test_registro_de_presentacion_creada_sin_modo_incremental():
+    store = DeckStore(DiskCache(tempfile.mkdtemp(), max_bytes=10**7))
+    processor = PDFProcessor()
+    generador = GeneradorFalso()
+    ruta = crear_pdf(PAGINAS)
+    ai_data = generador.get_presentation_content(" ".join(PAGINAS))
+    assert record_new_deck(ruta, processor, store, {"presentationId": "deck9"}, ai_data)
+
+    # La siguiente ejecución incremental reconoce la presentación
+    resultado = update_deck(ruta, processor, generador, store)
+    assert resultado["presentation"]["presentationId"] == "deck9"
+    assert resultado["requests"] == 0 and generador.creadas == 0
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
@@ -0,0 +1,140 @@
+# Pruebas de la cola de trabajos (JobQueue): estados, cancelación y retención.
+# Se pueden ejecutar con pytest o directamente: python test_job_queue.py
+import threading
+import time
+
+from job_queue import CANCELADO, COMPLETADO, EN_COLA, EN_CURSO, ERROR, JobCancelled, JobQueue
+
+
+def esperar(condicion, timeout=2.0):
+    limite = time.monotonic() + timeout
+    while not condicion():
+        if time.monotonic() > limite:
+            raise AssertionError("La condición no se cumplió a tiempo")
+        time.sleep(0.005)
+
+
+def test_transiciones_de_un_trabajo_completado():
+    estados = []
+    cola = JobQueue(lambda job: f"hecho: {job.pdf_path}", workers=1,
+                    on_update=lambda job: estados.append(job.state))
+    job = cola.submit("a.pdf", pptx=True)
+    esperar(lambda: job.state == COMPLETADO)
+    assert job.result == "hecho: a.pdf"
+    assert job.options == {"pptx": True}
+    assert job.progress == 1.0
+    assert job.created_at <= job.started_at <= job.finished_at
+    # Estados por los que pasó (cada aviso de progreso repite el actual)
+    assert [e for i, e in enumerate(estados) if i == 0 or e != estados[i - 1]] == [EN_COLA, EN_CURSO, COMPLETADO]
+    cola.shutdown()
+
+
+def test_error_del_trabajo():
+    def falla(job):
+        raise RuntimeError("sin texto")
+    cola = JobQueue(falla, workers=1)
+    job = cola.submit("a.pdf")
+    esperar(lambda: job.state == ERROR)
+    assert job.error == "sin texto"
+    assert job.to_dict()["state"] == ERROR
+    cola.shutdown()
+
+
+def test_progreso_no_retrocede():
+    soltar = threading.Event()
+
+    def trabajo(job):
+        cola.update(job, stage="extract", progress=0.5)
+        cola.update(job, progress=0.2)
+        cola.update(job, progress=7)
+        soltar.wait(2)
+
+    cola = JobQueue(trabajo, workers=1)
+    job = cola.submit("a.pdf")
+    esperar(lambda: job.progress == 1.0)
+    assert job.stage == "extract" and job.state == EN_CURSO
+    soltar.set()
+    esperar(lambda: job.state == COMPLETADO)
+    cola.shutdown()
+
+
+def test_cancelar_en_cola_y_en_curso():
+    en_marcha = threading.Event()
+    ejecutados = []
+
+    def trabajo(job):
+        ejecutados.append(job.pdf_path)
+        en_marcha.set()
+        while not job.cancelled:
+            time.sleep(0.01)
+        raise JobCancelled()
+
+    cola = JobQueue(trabajo, workers=1)
+    primero = cola.submit("a.pdf")
+    segundo = cola.submit("b.pdf")
+    en_marcha.wait(2)
+    assert segundo.state == EN_COLA
+    assert cola.cancel(segundo.id)
+    assert segundo.state == CANCELADO
+    assert cola.cancel(primero.id)
+    esperar(lambda: primero.state == CANCELADO)
+    # Ya terminado: no se puede volver a cancelar
+    assert not cola.cancel(primero.id)
+    time.sleep(0.05)
+    assert ejecutados == ["a.pdf"]
+    cola.shutdown()
+
+
+def test_como_mucho_workers_a_la_vez():
+    activos = []
+    maximo = []
+    cerrojo = threading.Lock()
+
+    def trabajo(job):
+        with cerrojo:
+            activos.append(job.id)
+            maximo.append(len(activos))
+        time.sleep(0.05)
+        with cerrojo:
+            activos.remove(job.id)
+
+    cola = JobQueue(trabajo, workers=2)
+    jobs = [cola.submit(f"{n}.pdf") for n in range(6)]
+    esperar(lambda: all(job.state == COMPLETADO for job in jobs))
+    assert max(maximo) == 2
+    cola.shutdown()
+
+
+def test_retencion_olvida_los_terminados():
+    olvidados = []
+    cola = JobQueue(lambda job: None, workers=1, retention=0.05, on_evict=olvidados.append)
+    job = cola.submit("a.pdf")
+    esperar(lambda: job.state == COMPLETADO)
+    assert job.id in cola.jobs
+    time.sleep(0.1)
+    assert cola.prune() == 1
+    assert job.id not in cola.jobs and olvidados == [job]
+    cola.shutdown()
+
+
+def test_shutdown_cancela_y_no_espera():
+    def bloqueado(job):
+        time.sleep(30)
+
+    cola = JobQueue(bloqueado, workers=1)
+    en_curso = cola.submit("a.pdf")
+    en_cola = cola.submit("b.pdf")
+    esperar(lambda: en_curso.state == EN_CURSO)
+    inicio = time.monotonic()
+    cola.shutdown()
+    assert time.monotonic() - inicio < 0.5
+    assert en_curso.cancelled and en_cola.state == CANCELADO
+    # Los hilos son 'daemon': no impiden que el programa termine
+    assert all(hilo.daemon for hilo in cola._workers)
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
@@ -0,0 +1,40 @@
+# Pruebas de la recuperación de JSON mal formado de la IA (json_stream).
+# Se pueden ejecutar con pytest o directamente: python test_json_stream.py
+from json_stream import IncrementalSlidesParser, load_presentation, salvage_presentation
+
+PUNTO = '{"titulo_diapositiva": "Uno", "contenido_diapositiva": "Texto"}'
+
+
+def test_escape_invalido_en_el_titulo():
+    texto = '{"titulo_presentacion": "bad \\q", "puntos_clave": [' + PUNTO + ']}'
+    ai_data, cortada = salvage_presentation(texto)
+    assert not cortada
+    assert ai_data["titulo_presentacion"] == "bad \\q"
+    assert [p["titulo_diapositiva"] for p in ai_data["puntos_clave"]] == ["Uno"]
+    assert load_presentation(texto)["titulo_presentacion"] == "bad \\q"
+
+
+def test_escape_invalido_en_un_punto():
+    punto = '{"titulo_diapositiva": "Dos", "contenido_diapositiva": "C:\\datos \\\\q"}'
+    texto = '{"titulo_presentacion": "T", "puntos_clave": [' + PUNTO + ", " + punto + "]}"
+    ai_data = load_presentation(texto)
+    assert ai_data["puntos_clave"][1]["contenido_diapositiva"] == "C:\\datos \\q"
+    ai_data, _ = salvage_presentation(texto)
+    assert len(ai_data["puntos_clave"]) == 2
+
+
+def test_escape_invalido_en_streaming():
+    texto = '{"titulo_presentacion": "bad \\q", "puntos_clave": [' + PUNTO + ", "
+    parser = IncrementalSlidesParser()
+    eventos = []
+    for i in range(0, len(texto), 7):
+        eventos.extend(parser.feed(texto[i:i + 7]))
+    assert [tipo for tipo, _ in eventos] == ["titulo", "punto"]
+    assert parser.truncated
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
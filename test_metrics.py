@@ -0,0 +1,113 @@
+# Pruebas de la instrumentación (metrics): spans, contadores, ejecuciones y bind().
+# Se pueden ejecutar con pytest o directamente: python test_metrics.py
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+
+def capturar():
+    """Registra un sink que guarda los registros en una lista y la devuelve."""
+    registros = []
+    metrics.add_sink(registros.append)
+    return registros
+
+
+def test_span_y_contador_en_una_ejecucion():
+    registros = capturar()
+    try:
+        with metrics.run("doc.pdf", job=7) as ejecucion:
+            with metrics.span("pdf.extract_text", parallel=False) as attrs:
+                time.sleep(0.01)
+                attrs["chars"] = 120
+            metrics.count("pdf.pages_extracted", 3)
+            metrics.count("pdf.pages_extracted", 2)
+    finally:
+        metrics.remove_sink(registros.append)
+
+    span, *contadores, resumen = registros
+    assert span["type"] == "span" and span["name"] == "pdf.extract_text"
+    assert span["chars"] == 120 and span["parallel"] is False
+    assert span["duration_ms"] >= 10 and span["run"] == ejecucion.run_id
+    assert [c["value"] for c in contadores] == [3, 2]
+    assert resumen["type"] == "run" and resumen["job"] == 7
+    assert resumen["counters"] == {"pdf.pages_extracted": 5}
+    assert resumen["spans"]["pdf.extract_text"]["count"] == 1
+    assert ejecucion.seconds("pdf.extract_text") >= 0.01
+    assert metrics.current_run() is None
+
+
+def test_span_con_error():
+    registros = capturar()
+    try:
+        with metrics.span("slides.create"):
+            raise RuntimeError("HTTP 500")
+    except RuntimeError:
+        pass
+    finally:
+        metrics.remove_sink(registros.append)
+    assert registros[0]["error"] == "RuntimeError"
+
+
+def test_bind_lleva_la_ejecucion_a_otros_hilos():
+    def trabajo(n):
+        with metrics.span("map.summary"):
+            metrics.count("vertex.calls")
+        return n
+
+    with metrics.run("doc.pdf") as ejecucion:
+        # Sin bind(), los hilos del pool no ven la ejecución en curso
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            list(pool.map(trabajo, range(4)))
+        assert ejecucion.counters == {}
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            assert list(pool.map(metrics.bind(trabajo), range(4))) == [0, 1, 2, 3]
+    assert ejecucion.counters == {"vertex.calls": 4}
+    assert ejecucion.summary()["spans"]["map.summary"]["count"] == 4
+
+
+def test_ejecuciones_simultaneas_no_se_mezclan():
+    resultados = {}
+
+    def ejecutar(nombre, n):
+        with metrics.run(nombre) as ejecucion:
+            for _ in range(n):
+                metrics.count("slides.batch_requests")
+        resultados[nombre] = ejecucion.counters
+
+    hilos = [threading.Thread(target=ejecutar, args=(f"{n}.pdf", n)) for n in range(1, 5)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert resultados == {f"{n}.pdf": {"slides.batch_requests": n} for n in range(1, 5)}
+
+
+def test_sink_json_lines_y_sink_que_falla():
+    ruta = os.path.join(tempfile.mkdtemp(), "metrics.jsonl")
+    sink = metrics.add_sink(metrics.JsonLinesSink(ruta))
+
+    def roto(_):
+        raise ValueError("disco lleno")
+
+    metrics.add_sink(roto)
+    try:
+        # Un sink que falla no rompe el proceso ni impide escribir a los demás
+        metrics.count("cache.hits", origen="caché")
+    finally:
+        metrics.remove_sink(sink)
+        metrics.remove_sink(roto)
+    with open(ruta, encoding="utf-8") as f:
+        registro = json.loads(f.readline())
+    assert registro["name"] == "cache.hits" and registro["origen"] == "caché"
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
@@ -0,0 +1,132 @@
+# Pruebas de la extracción de texto de PDFProcessor (con PDFs generados al vuelo).
+# Se pueden ejecutar con pytest o directamente: python test_pdf_processor.py
+import os
+import tempfile
+
+import fitz
+
+from pdf_processor import (BOILERPLATE_MIN_PAGES, PARALLEL_MIN_PAGES, PDFProcessor, detect_boilerplate,
+                           page_text)
+
+
+def crear_pdf(paginas, encabezado=None, pie=None, aviso=None, paginas_aviso=None):
+    """
+    Escribe un PDF con una página por texto de 'paginas' y devuelve su ruta.
+    'aviso' es un bloque aparte en el cuerpo, en las páginas 'paginas_aviso'
+    (todas si es None). 'encabezado', 'pie' y 'aviso' se formatean con el
+    número de página ({n}).
+    """
+    ruta = os.path.join(tempfile.mkdtemp(), "prueba.pdf")
+    with fitz.open() as doc:
+        for n, texto in enumerate(paginas, start=1):
+            page = doc.new_page()
+            if encabezado:
+                page.insert_textbox(fitz.Rect(72, 30, 540, 60), encabezado.format(n=n), fontsize=9)
+            page.insert_textbox(fitz.Rect(72, 150, 540, 450), texto, fontsize=11)
+            if aviso and (paginas_aviso is None or n in paginas_aviso):
+                page.insert_textbox(fitz.Rect(72, 560, 540, 620), aviso.format(n=n), fontsize=8)
+            if pie:
+                page.insert_textbox(fitz.Rect(72, 740, 540, 770), pie.format(n=n), fontsize=9)
+        doc.save(ruta)
+    return ruta
+
+
+PAGINAS = [f"Página de contenido número {n} con algo de texto." for n in range(1, 11)]
+
+
+def test_iter_pages_sin_presupuesto():
+    textos = list(PDFProcessor(strip_boilerplate=False).iter_pages(crear_pdf(PAGINAS)))
+    assert textos == PAGINAS
+
+
+def test_iter_pages_respeta_el_presupuesto():
+    ruta = crear_pdf(PAGINAS)
+    for budget in (1, 30, len(PAGINAS[0]), len(PAGINAS[0]) + 1, 120, 10_000):
+        texto = " ".join(PDFProcessor(strip_boilerplate=False).iter_pages(ruta, max_chars=budget))
+        assert len(texto) <= budget
+        assert texto == " ".join(PAGINAS)[:budget].rstrip()
+
+
+def test_iter_pages_presupuesto_en_tokens():
+    ruta = crear_pdf(PAGINAS)
+    por_tokens = list(PDFProcessor(strip_boilerplate=False).iter_pages(ruta, max_tokens=25))
+    por_caracteres = list(PDFProcessor(strip_boilerplate=False).iter_pages(ruta, max_chars=100))
+    assert por_tokens == por_caracteres
+
+
+def test_iter_pages_es_perezoso():
+    # Solo se lee la página que se pide
+    paginas = PDFProcessor(strip_boilerplate=False).iter_pages(crear_pdf(PAGINAS))
+    assert next(paginas) == PAGINAS[0]
+    paginas.close()
+
+
+def test_extract_text_con_presupuesto():
+    texto = PDFProcessor(strip_boilerplate=False).extract_text(crear_pdf(PAGINAS), max_chars=100)
+    assert 0 < len(texto) <= 100
+
+
+def test_extraccion_paralela_igual_que_en_serie():
+    paginas = [f"Sección {n}. Texto propio de la página {n}." for n in range(PARALLEL_MIN_PAGES + 6)]
+    ruta = crear_pdf(paginas)
+    processor = PDFProcessor()
+    en_serie = list(processor.iter_pages(ruta))
+    assert list(processor.iter_pages_parallel(ruta, workers=2)) == en_serie
+    assert processor.extract_text(ruta, parallel=True, workers=2) == " ".join(en_serie)
+
+
+def test_extraccion_paralela_de_documento_corto_va_en_serie():
+    processor = PDFProcessor()
+    ruta = crear_pdf(PAGINAS)
+    assert list(processor.iter_pages_parallel(ruta, workers=4)) == list(processor.iter_pages(ruta))
+
+
+def test_detecta_encabezados_y_pies_repetidos():
+    ruta = crear_pdf(PAGINAS, encabezado="Informe anual 2024 · Confidencial", pie="Página {n} de 10")
+    with fitz.open(ruta) as doc:
+        firmas = detect_boilerplate(doc)
+        assert ("top", "informe anual # · confidencial") in firmas
+        assert ("bottom", "página # de #") in firmas
+        # El cuerpo, que cambia en cada página, se conserva
+        assert all(zona != "body" for zona, _ in firmas)
+        assert page_text(doc[3], firmas) == PAGINAS[3]
+    textos = list(PDFProcessor().iter_pages(ruta))
+    assert textos == PAGINAS
+    # Sin strip_boilerplate se dejan tal cual
+    assert "Página 4 de 10" in list(PDFProcessor(strip_boilerplate=False).iter_pages(ruta))[3]
+
+
+def test_aviso_legal_repetido_en_el_cuerpo():
+    aviso = "Este documento es confidencial y no puede distribuirse."
+    ruta = crear_pdf(PAGINAS, aviso=aviso)
+    with fitz.open(ruta) as doc:
+        assert detect_boilerplate(doc) == {("body", aviso.lower())}
+    assert list(PDFProcessor().iter_pages(ruta)) == PAGINAS
+
+
+def test_repetido_en_pocas_paginas_se_conserva():
+    aviso = "Nota: cifras provisionales."
+    ruta = crear_pdf(PAGINAS, aviso=aviso, paginas_aviso={2, 7})
+    with fitz.open(ruta) as doc:
+        assert detect_boilerplate(doc) == frozenset()
+    textos = list(PDFProcessor().iter_pages(ruta))
+    assert textos[1] == f"{PAGINAS[1]} {aviso}" and textos[0] == PAGINAS[0]
+
+
+def test_cifras_distintas_en_el_cuerpo_no_son_repeticiones():
+    # En encabezados y pies los números no cuentan; en el cuerpo sí
+    ruta = crear_pdf(PAGINAS, aviso="Ventas del trimestre: {n} millones.")
+    with fitz.open(ruta) as doc:
+        assert detect_boilerplate(doc) == frozenset()
+
+
+def test_documento_corto_no_tiene_boilerplate():
+    ruta = crear_pdf(PAGINAS[:BOILERPLATE_MIN_PAGES - 1], pie="Página {n}")
+    with fitz.open(ruta) as doc:
+        assert detect_boilerplate(doc) == frozenset()
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
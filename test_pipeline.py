@@ -0,0 +1,130 @@
+# Pruebas del grafo de etapas (Pipeline): solapamiento, errores y cancelación.
+# Se pueden ejecutar con pytest o directamente: python test_pipeline.py
+import threading
+import time
+
+from pipeline import Pipeline, PipelineCancelled, PipelineError, StageError
+
+
+def dormir(segundos, resultado=None):
+    def etapa(_):
+        time.sleep(segundos)
+        return resultado
+    return etapa
+
+
+def fallar(mensaje):
+    def etapa(_):
+        raise StageError(mensaje)
+    return etapa
+
+
+def test_dependencias_y_resultados():
+    pipeline = Pipeline()
+    pipeline.add_stage("a", lambda _: 1)
+    pipeline.add_stage("b", lambda deps: deps["a"] + 1, depends_on=["a"])
+    pipeline.add_stage("c", lambda deps: deps["a"] + deps["b"], depends_on=["a", "b"])
+    assert pipeline.run() == {"a": 1, "b": 2, "c": 3}
+
+
+def test_dependencia_inexistente():
+    pipeline = Pipeline()
+    try:
+        pipeline.add_stage("b", lambda _: None, depends_on=["a"])
+    except ValueError:
+        return
+    raise AssertionError("add_stage debería rechazar una dependencia que no existe")
+
+
+def test_etapas_independientes_se_solapan():
+    pipeline = Pipeline()
+    pipeline.add_stage("extract", dormir(0.2))
+    pipeline.add_stage("authenticate", dormir(0.2))
+    pipeline.add_stage("generate", dormir(0), depends_on=["extract", "authenticate"])
+    inicio = time.perf_counter()
+    pipeline.run()
+    assert time.perf_counter() - inicio < 0.35
+    t = pipeline.timings
+    assert t["extract"]["start"] < t["authenticate"]["end"]
+    assert t["authenticate"]["start"] < t["extract"]["end"]
+    assert t["generate"]["start"] >= max(t["extract"]["end"], t["authenticate"]["end"])
+
+
+def test_error_se_propaga_y_no_lanza_dependientes():
+    eventos = []
+    lanzada = []
+    pipeline = Pipeline(on_event=lambda etapa, evento, _: eventos.append((etapa, evento)))
+    pipeline.add_stage("extract", fallar("PDF vacío"))
+    pipeline.add_stage("authenticate", dormir(0.1, True))
+    pipeline.add_stage("generate", lambda _: lanzada.append(True), depends_on=["extract", "authenticate"])
+    try:
+        pipeline.run()
+    except PipelineError as e:
+        assert e.stage == "extract"
+        assert str(e.error) == "PDF vacío"
+    else:
+        raise AssertionError("run() debería fallar")
+    assert not lanzada
+    # La etapa que ya estaba en marcha termina
+    assert ("extract", "error") in eventos and ("authenticate", "end") in eventos
+
+
+def test_cancelar_no_espera_a_las_etapas_en_marcha():
+    cancelar = threading.Event()
+    eventos = []
+    pipeline = Pipeline(on_event=lambda etapa, evento, _: eventos.append((etapa, evento)),
+                        should_cancel=cancelar.is_set)
+    pipeline.add_stage("lenta", dormir(5))
+    pipeline.add_stage("siguiente", dormir(0), depends_on=["lenta"])
+    threading.Timer(0.1, cancelar.set).start()
+    inicio = time.perf_counter()
+    try:
+        pipeline.run()
+    except PipelineCancelled:
+        assert time.perf_counter() - inicio < 1
+        assert ("pipeline", "cancel") in eventos
+        assert ("siguiente", "start") not in eventos
+    else:
+        raise AssertionError("run() debería cancelarse")
+
+
+def test_cleanup_al_fallar():
+    deshechas = []
+    pipeline = Pipeline()
+    pipeline.add_stage("shell", lambda _: "deck", cleanup=lambda r: deshechas.append(r) or "Quedó 'deck'.")
+    pipeline.add_stage("fill", fallar("sin diapositivas"), depends_on=["shell"])
+    try:
+        pipeline.run()
+    except PipelineError as e:
+        assert e.error == "sin diapositivas Quedó 'deck'."
+    else:
+        raise AssertionError("run() debería fallar")
+    assert deshechas == ["deck"]
+
+    # Si todo va bien, no se deshace nada
+    pipeline = Pipeline()
+    pipeline.add_stage("shell", lambda _: "deck", cleanup=deshechas.append)
+    pipeline.run()
+    assert deshechas == ["deck"]
+
+
+def test_cleanup_de_etapa_que_termina_tras_cancelar():
+    cancelar = threading.Event()
+    deshechas = []
+    pipeline = Pipeline(should_cancel=cancelar.is_set)
+    pipeline.add_stage("shell", dormir(0.3, "deck"), cleanup=deshechas.append)
+    threading.Timer(0.05, cancelar.set).start()
+    try:
+        pipeline.run()
+    except PipelineCancelled:
+        pass
+    assert deshechas == []
+    time.sleep(0.5)
+    assert deshechas == ["deck"]
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
@@ -0,0 +1,73 @@
+# Pruebas del canal de progreso (ProgressChannel): fusión de actualizaciones por clave.
+# Se pueden ejecutar con pytest o directamente: python test_progress_channel.py
+import threading
+
+from progress_channel import ProgressChannel
+
+
+def test_solo_el_ultimo_valor_de_cada_clave():
+    canal = ProgressChannel()
+    canal.publish(("progreso", 1), 0.1)
+    canal.publish("estado", "Extrayendo...")
+    canal.publish(("progreso", 1), 0.5)
+    assert canal.drain() == [("estado", "Extrayendo..."), (("progreso", 1), 0.5)]
+    assert canal.drain() == []
+    assert canal.stats() == {"published": 3, "delivered": 2, "coalesced": 1}
+
+
+def test_orden_de_la_ultima_publicacion():
+    canal = ProgressChannel()
+    for clave in ("a", "b", "c", "a"):
+        canal.publish(clave, clave.upper())
+    assert [clave for clave, _ in canal.drain()] == ["b", "c", "a"]
+
+
+def test_pendientes_no_cuentan_como_descartadas():
+    canal = ProgressChannel()
+    canal.publish("a", 1)
+    canal.publish("a", 2)
+    canal.publish("b", 1)
+    assert canal.stats() == {"published": 3, "delivered": 0, "coalesced": 1}
+
+
+def test_muchos_hilos_publicando_mientras_se_vacia():
+    canal = ProgressChannel()
+    ultimos = {}
+    recibidos = []
+    terminado = threading.Event()
+
+    def trabajador(n):
+        for i in range(2000):
+            canal.publish(("progreso", n), i)
+
+    def interfaz():
+        while not terminado.is_set():
+            recibidos.extend(canal.drain())
+        recibidos.extend(canal.drain())
+
+    consumidor = threading.Thread(target=interfaz)
+    consumidor.start()
+    hilos = [threading.Thread(target=trabajador, args=(n,)) for n in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    terminado.set()
+    consumidor.join()
+
+    for clave, valor in recibidos:
+        # Para cada clave, los valores llegan en orden y nunca retroceden
+        assert valor >= ultimos.get(clave, -1)
+        ultimos[clave] = valor
+    assert ultimos == {("progreso", n): 1999 for n in range(4)}
+    stats = canal.stats()
+    assert stats["published"] == 8000
+    assert stats["delivered"] == len(recibidos)
+    assert stats["delivered"] + stats["coalesced"] == 8000
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
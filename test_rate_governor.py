@@ -0,0 +1,111 @@
+# Pruebas del control de ritmo (rate_governor): cubo de fichas, AIMD y pausas por 429.
+# Se pueden ejecutar con pytest o directamente: python test_rate_governor.py
+import threading
+import time
+
+import rate_governor
+from rate_governor import AdaptiveConcurrency, ApiGovernor, TokenBucket
+
+
+def test_cubo_permite_rafagas_y_despues_espera():
+    cubo = TokenBucket(rate=10, capacity=3)
+    assert [cubo.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Las siguientes quedan en deuda, en orden de llegada
+    esperas = [cubo.reserve() for _ in range(3)]
+    assert esperas == sorted(esperas)
+    assert abs(esperas[0] - 0.1) < 0.02 and abs(esperas[2] - 0.3) < 0.02
+
+
+def test_cubo_se_rellena_hasta_su_capacidad():
+    cubo = TokenBucket(rate=100, capacity=2)
+    cubo.reserve(2)
+    time.sleep(0.1)
+    assert cubo.available() == 2
+    cubo.drain()
+    assert cubo.available() < 0.5
+
+
+def test_aimd_sube_despacio_y_baja_a_la_mitad():
+    limite = AdaptiveConcurrency(maximum=16, minimum=1, initial=4)
+    # +1 por cada 'límite' peticiones correctas
+    for _ in range(4):
+        limite.acquire()
+        limite.release()
+    assert 4.9 < limite.limit < 5.0
+    limite.decrease()
+    assert 2.4 < limite.limit < 2.5
+    # Varios 429 seguidos cuentan como una sola señal
+    limite.decrease()
+    assert 2.4 < limite.limit < 2.5
+
+
+def test_aimd_respeta_minimo_y_maximo():
+    intervalo = rate_governor.AIMD_DECREASE_INTERVAL
+    rate_governor.AIMD_DECREASE_INTERVAL = 0
+    try:
+        limite = AdaptiveConcurrency(maximum=3, minimum=1)
+        for _ in range(20):
+            limite.acquire()
+            limite.release()
+        assert limite.limit == 3
+        for _ in range(10):
+            limite.decrease()
+        assert limite.limit == 1
+    finally:
+        rate_governor.AIMD_DECREASE_INTERVAL = intervalo
+
+
+def test_limite_de_peticiones_simultaneas():
+    limite = AdaptiveConcurrency(maximum=2)
+    maximo = []
+    activos = [0]
+    cerrojo = threading.Lock()
+
+    def peticion():
+        limite.acquire()
+        with cerrojo:
+            activos[0] += 1
+            maximo.append(activos[0])
+        time.sleep(0.02)
+        with cerrojo:
+            activos[0] -= 1
+        limite.release()
+
+    hilos = [threading.Thread(target=peticion) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert max(maximo) == 2 and limite.in_flight == 0
+
+
+def test_429_pausa_a_todos_y_reduce_la_concurrencia():
+    governor = ApiGovernor("prueba", max_concurrency=8)
+    with governor.slot() as permiso:
+        permiso.throttled(retry_after=0.2)
+    foto = governor.snapshot()
+    assert foto["throttled"] == 1 and foto["concurrency_limit"] == 4
+    assert 0.1 < foto["paused_for"] <= 0.2
+    # La siguiente petición espera al Retry-After
+    inicio = time.monotonic()
+    with governor.slot():
+        pass
+    assert time.monotonic() - inicio >= 0.15
+
+
+def test_cuota_por_minuto():
+    governor = ApiGovernor("prueba", requests_per_minute=600, burst=2)
+    inicio = time.monotonic()
+    for _ in range(4):
+        with governor.slot():
+            pass
+    # 2 de golpe y las otras 2 a 10 por segundo
+    assert 0.15 < time.monotonic() - inicio < 0.5
+    assert governor.snapshot()["waited_seconds"] > 0.15
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
@@ -0,0 +1,73 @@
+# Pruebas de la selección de pasajes por relevancia (salience y select_text).
+# Se pueden ejecutar con pytest o directamente: python test_salience.py
+import salience
+from pdf_processor import select_text
+from salience import render_passage, select_passages
+
+TEMAS = ["baterías", "eólica", "hidrógeno", "subvenciones", "demanda",
+         "redes", "almacenamiento", "hogares", "industria", "precios"]
+REPETIDA = "Los paneles fotovoltaicos en tejados abaratan la factura de los hogares."
+
+
+def documento():
+    """Frases variadas intercaladas con seis copias de una misma frase."""
+    variadas = [f"Punto {i + 1}: las {TEMAS[i % 10]} y la {TEMAS[(i + 3) % 10]} cambian el sector de la "
+                f"{TEMAS[(i + 6) % 10]}." for i in range(14)]
+    pasajes = []
+    for i, frase in enumerate(variadas):
+        pasajes.append((frase, False))
+        if i < 6:
+            pasajes.append((REPETIDA, False))
+    return pasajes
+
+
+def test_respeta_el_presupuesto_y_el_orden():
+    pasajes = documento()
+    for budget in (80, 200, 400, 700):
+        texto = select_passages(pasajes, budget)
+        assert 0 < len(texto) <= budget
+        # Cada pasaje elegido aparece en el orden del documento
+        posiciones = [texto.find(t) for t, _ in pasajes if t != REPETIDA and t in texto]
+        assert posiciones == sorted(posiciones)
+
+
+def test_mmr_evita_frases_repetidas():
+    pasajes = documento()
+    mmr = salience.MMR_LAMBDA
+    try:
+        salience.MMR_LAMBDA = 0
+        sin_mmr = select_passages(pasajes, 375).count(REPETIDA)
+    finally:
+        salience.MMR_LAMBDA = mmr
+    con_mmr = select_passages(pasajes, 375).count(REPETIDA)
+    assert con_mmr < sin_mmr
+
+
+def test_titulos_de_todo_el_documento():
+    pasajes = []
+    for seccion in range(3):
+        pasajes.append((f"Capítulo {seccion + 1}", True))
+        pasajes.extend(documento())
+    texto = select_passages(pasajes, 500)
+    for seccion in range(3):
+        assert render_passage(f"Capítulo {seccion + 1}", True).strip() in texto
+
+
+def test_sin_vocabulario_se_usa_el_principio():
+    pasajes = [("Alfa beta gamma.", False), ("Delta épsilon zeta.", False), ("Theta iota kappa.", False)]
+    assert select_passages(pasajes, 40) == "Alfa beta gamma. Delta épsilon zeta."
+
+
+def test_select_text_entero_si_cabe():
+    pasajes = documento()
+    total = sum(len(t) + 1 for t, _ in pasajes)
+    assert select_text(pasajes, total) == " ".join(t for t, _ in pasajes)
+    assert len(select_text(pasajes, total // 3)) <= total // 3
+    assert select_text([], 100) == ""
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")
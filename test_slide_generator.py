@@ -0,0 +1,144 @@
+# Pruebas de las funciones puras de slide_generator (sin llamadas a Google).
+# Se pueden ejecutar con pytest o directamente: python test_slide_generator.py
+import time
+
+from slide_generator import (DYNAMIC_THINKING_TOKENS, OUTPUT_TOKENS_BASE, OUTPUT_TOKENS_PER_SLIDE,
+                             SlideGenerator, route_model, split_slide_requests)
+
+CATEGORIAS = (
+    {"tier": "flash", "model": "modelo-rapido", "max_input_chars": 7000,
+     "thinking_budget": 0, "max_output_tokens": 8192},
+    {"tier": "pro", "model": "modelo-grande", "max_input_chars": None,
+     "thinking_budget": None, "max_output_tokens": 8192},
+)
+
+
+def diapositiva(n, rellenos=2):
+    """Un 'createSlide' seguido de las peticiones que la rellenan."""
+    return [{"createSlide": {"objectId": f"s{n}"}}] + [{"insertText": {"objectId": f"s{n}", "i": i}}
+                                                       for i in range(rellenos)]
+
+
+def test_corta_delante_de_create_slide():
+    peticiones = diapositiva(1) + diapositiva(2) + diapositiva(3)
+    trozos = split_slide_requests(peticiones, max_requests=7)
+    assert trozos == [diapositiva(1) + diapositiva(2), diapositiva(3)]
+
+
+def test_todo_en_un_trozo_si_cabe():
+    peticiones = diapositiva(1) + diapositiva(2)
+    assert split_slide_requests(peticiones, max_requests=400) == [peticiones]
+    assert split_slide_requests([], max_requests=5) == []
+
+
+def test_grupo_mas_largo_que_el_limite():
+    # Una diapositiva enorme se parte por número de peticiones
+    peticiones = diapositiva(1) + diapositiva(2, rellenos=11) + diapositiva(3)
+    trozos = split_slide_requests(peticiones, max_requests=5)
+    assert all(len(trozo) <= 5 for trozo in trozos)
+    assert [p for trozo in trozos for p in trozo] == peticiones
+    # Las diapositivas que caben no se parten
+    assert trozos[0] == diapositiva(1)
+
+
+def test_lista_sin_create_slide():
+    # Como las de deck_diff_requests: solo cambios de texto
+    peticiones = [{"insertText": {"objectId": "x", "i": i}} for i in range(12)]
+    trozos = split_slide_requests(peticiones, max_requests=5)
+    assert [len(trozo) for trozo in trozos] == [5, 5, 2]
+    assert [p for trozo in trozos for p in trozo] == peticiones
+
+
+def test_presentacion_completa_en_varios_batch_update():
+    ai_data = {"titulo_presentacion": "Informe",
+               "puntos_clave": [{"titulo_diapositiva": f"Punto {n}", "contenido_diapositiva": "Texto"}
+                                for n in range(1, 31)]}
+    peticiones = SlideGenerator()._deck_requests(ai_data)
+    trozos = split_slide_requests(peticiones, max_requests=20)
+    assert [p for trozo in trozos for p in trozo] == peticiones
+    for trozo in trozos:
+        assert len(trozo) <= 20
+        # Cada diapositiva va entera en el trozo que la crea: el texto se
+        # inserta en formas creadas (con su diapositiva) en el mismo trozo
+        formas = {m["objectId"] for p in trozo if "createSlide" in p
+                  for m in p["createSlide"]["placeholderIdMappings"]}
+        for peticion in trozo:
+            if "insertText" in peticion:
+                assert peticion["insertText"]["objectId"] in formas
+
+
+
+def test_route_model_umbral_de_caracteres():
+    assert route_model(7000, {}, tiers=CATEGORIAS)[0]["tier"] == "flash"
+    assert route_model(7001, {}, tiers=CATEGORIAS)[0]["tier"] == "pro"
+    # Con AUTOSLIDES_FLASH_MAX_CHARS=0 todo va al modelo grande
+    sin_flash = (dict(CATEGORIAS[0], max_input_chars=0), CATEGORIAS[1])
+    assert route_model(1, {}, tiers=sin_flash)[0]["tier"] == "pro"
+
+
+def test_route_model_tokens_de_salida_por_diapositiva():
+    base = {"temperature": 0.2, "maxOutputTokens": 1024}
+    _, config = route_model(100, base, slides=6, tiers=CATEGORIAS)
+    assert config["thinkingConfig"] == {"thinkingBudget": 0}
+    assert config["maxOutputTokens"] == OUTPUT_TOKENS_BASE + 6 * OUTPUT_TOKENS_PER_SLIDE
+    # El modelo sin presupuesto fijo reserva tokens para razonar, sin pasar del máximo
+    _, config = route_model(50_000, base, slides=6, tiers=CATEGORIAS)
+    assert "thinkingConfig" not in config
+    assert config["maxOutputTokens"] == min(
+        8192, OUTPUT_TOKENS_BASE + 6 * OUTPUT_TOKENS_PER_SLIDE + DYNAMIC_THINKING_TOKENS)
+    assert route_model(50_000, base, slides=40, tiers=CATEGORIAS)[1]["maxOutputTokens"] == 8192
+    # La configuración original no se modifica
+    assert base == {"temperature": 0.2, "maxOutputTokens": 1024}
+
+
+def test_route_model_sin_diapositivas():
+    base = {"maxOutputTokens": 1024}
+    assert route_model(100, base, tiers=CATEGORIAS)[1]["maxOutputTokens"] == 1024
+    assert route_model(50_000, base, tiers=CATEGORIAS)[1]["maxOutputTokens"] == min(
+        8192, 1024 + DYNAMIC_THINKING_TOKENS)
+
+
+
+class ServicioFalso:
+    """Lo mínimo de slides_service para construir peticiones batchUpdate."""
+
+    def presentations(self):
+        return self
+
+    def batchUpdate(self, presentationId, body):
+        return body["requests"]
+
+
+def test_append_slides_se_detiene_en_el_primer_fallo():
+    generador = SlideGenerator()
+    generador.slides_service = ServicioFalso()
+    enviados = []
+
+    def ejecutar(peticiones):
+        time.sleep(0.01)
+        if len(enviados) == 1:
+            enviados.append(None)
+            raise RuntimeError("HTTP 500")
+        enviados.append(peticiones)
+
+    generador._slides_execute = ejecutar
+
+    def eventos():
+        yield "titulo", "Informe"
+        for n in range(5):
+            time.sleep(0.02)
+            yield "punto", {"titulo_diapositiva": f"Punto {n}", "contenido_diapositiva": "Texto"}
+        yield "fin", {"titulo_presentacion": "Informe", "puntos_clave": []}
+
+    avisos = []
+    assert generador.append_slides_from_events({"presentationId": "p"}, eventos(), avisos.append) is None
+    # Tras el lote que falla no se envía ninguno más
+    assert len(enviados) == 2
+    assert avisos == [1]
+
+
+if __name__ == "__main__":
+    for nombre, prueba in list(globals().items()):
+        if nombre.startswith("test_"):
+            prueba()
+            print(f"OK  {nombre}")